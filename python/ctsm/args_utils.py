@@ -51,3 +51,24 @@ def plon_type(plon):
         )
     plon_out = lon_range_0_to_360(plon_float)
     return plon_out
+
+
+def positive_int_type(value):
+    """
+    Function to define a positive integer type for the parser and
+    raise error if the value is less than 1.
+
+    Args:
+        value (str): value given on the command line
+    Raises:
+        Error (ArgumentTypeError): when value is not an integer of at least 1.
+    Returns:
+        value_out (int): value as an integer
+    """
+    try:
+        value_out = int(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(f"ERROR: {value} is not an integer.") from err
+    if value_out < 1:
+        raise argparse.ArgumentTypeError(f"ERROR: {value} should be at least 1.")
+    return value_out
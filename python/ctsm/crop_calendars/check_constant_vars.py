@@ -1,346 +1,231 @@
 """
 For variables that should stay constant, make sure they are
+
+Each variable is checked for all patches at once: Each patch's first non-NaN value is compared to
+all its later values. Patches that vary are then joined against the prescribed-input grid (if any)
+through a precomputed index, since patches whose prescribed value was missing (-1) may vary.
 """
 
 import numpy as np
+import xarray as xr
 from ctsm.crop_calendars.cropcal_module import import_rx_dates
 
+# Value of missing prescribed inputs; patches with this prescribed value are allowed to vary
+MISSING_RX_VAL = -1
+
+# Maximum allowed distance (degrees) between a patch's lon/lat and the matching prescribed-input
+# gridcell's
+LONLAT_TOL = 1e-4
 
-def check_one_constant_var_setup(this_ds, case, var):
+
+def get_time_coord(this_da):
     """
-    Various setup steps for check_one_constant_var()
+    Get the name of the time coordinate of a DataArray
     """
-    if "gs" in this_ds[var].dims:
-        time_coord = "gs"
-    elif "time" in this_ds[var].dims:
-        time_coord = "time"
-    else:
-        raise RuntimeError(f"Which of these is the time coordinate? {this_ds[var].dims}")
-    i_time_coord = this_ds[var].dims.index(time_coord)
+    if "gs" in this_da.dims:
+        return "gs"
+    if "time" in this_da.dims:
+        return "time"
+    raise RuntimeError(f"Which of these is the time coordinate? {this_da.dims}")
 
-    this_da = this_ds[var]
-    ra_sp = np.moveaxis(this_da.copy().values, i_time_coord, 0)
-    incl_patches = []
-    bad_patches = np.array([])
-    str_list = []
-
-    # Read prescription file, if needed
-    rx_ds = None
-    if isinstance(case, dict):
-        if var == "GDDHARV" and "rx_gdds_file" in case:
-            rx_ds = import_rx_dates(
-                "gdd", case["rx_gdds_file"], this_ds, set_neg1_to_nan=False
-            ).squeeze()
 
-    return time_coord, this_da, ra_sp, incl_patches, str_list, rx_ds, bad_patches
-
-
-def loop_through_bad_patches(
-    verbose,
-    emojus,
-    var,
-    everything_ok,
-    str_list,
-    rx_ds,
-    time_1,
-    t1_yr,
-    t1_vals,
-    timestep,
-    t_yr,
-    t_vals,
-    bad_patches_this_time,
-    found_in_rx,
-    vary_patches,
-    vary_lons,
-    vary_lats,
-    vary_crops,
-    vary_crops_int,
-    any_bad,
-):
+def find_varying_patches(values_tp, ignore_nan):
     """
-    Loop through and check any patches that were "bad" according to check_constant_vars().
+    Given a (time, patch) array, find which patches vary over time.
 
-    This is pretty inefficient, but it works.
+    Each patch is compared to its first non-NaN value, ignoring the final timestep when finding
+    that value. (Patches that are all-NaN except possibly the final timestep aren't checked.) If
+    ignore_nan, NaN values never count as varying; this should only be used for runs where land use
+    varies over time.
+
+    Returns (for each patch) whether it varies, the timestep of its first value, and the first
+    timestep that doesn't match. The latter two are -1 for patches that aren't checked or don't
+    vary, respectively.
     """
-    patch = None  # In case bad_patches_this_time is empty
-    for i, patch in enumerate(bad_patches_this_time):
-        this_patch = vary_patches[i]
-        this_lon = vary_lons[i]
-        this_lat = vary_lats[i]
-        this_crop = vary_crops[i]
-        this_crop_int = vary_crops_int[i]
-
-        # If prescribed input had missing value (-1), it's fine for it to vary.
-        if rx_ds:
-            rx_var = f"gs1_{this_crop_int}"
-            if this_lon in rx_ds.lon.values and this_lat in rx_ds.lat.values:
-                rx_vals = rx_ds[rx_var].sel(lon=this_lon, lat=this_lat).values
-                n_unique = len(np.unique(rx_vals))
-                if n_unique == 1:
-                    found_in_rx[i] = True
-                    if rx_vals == -1:
-                        continue
-                elif n_unique > 1:
-                    raise RuntimeError(
-                        f"How does lon {this_lon} lat {this_lat} {this_crop} have "
-                        + f"time-varying {var}?"
-                    )
-            else:
-                raise RuntimeError(f"lon {this_lon} lat {this_lat} {this_crop} not in rx dataset?")
-
-        # Print info (or save to print later)
-        any_bad = True
-        if verbose:
-            this_str = (
-                f"   Patch {this_patch} (lon {this_lon} lat {this_lat}) "
-                + f"{this_crop} ({this_crop_int})"
-            )
-            if rx_ds and not found_in_rx[i]:
-                this_str = this_str.replace("(lon", "* (lon")
-            if not np.isnan(t1_vals[patch]):
-                t1_val_print = int(t1_vals[patch])
-            else:
-                t1_val_print = "NaN"
-            if not np.isnan(t_vals[patch]):
-                t_val_print = int(t_vals[patch])
-            else:
-                t_val_print = "NaN"
-            if var == "SDATES":
-                str_list.append(
-                    f"{this_str}: Sowing {t1_yr} jday {t1_val_print}, {t_yr} "
-                    + f"jday {t_val_print}"
-                )
-            else:
-                str_list.append(
-                    f"{this_str}: {t1_yr} {var} {t1_val_print}, {t_yr} {var} " + f"{t_val_print}"
-                )
-        else:
-            if everything_ok:
-                print(f"{emojus} CLM output {var} unexpectedly vary over time:")
-                everything_ok = False
-            print(f"{var} timestep {timestep} does not match timestep {time_1}")
-            break
-    return any_bad, patch
+    n_time, n_patch = values_tp.shape
+    is_nan_tp = np.isnan(values_tp)
+    checked_p = np.any(~is_nan_tp[:-1, :], axis=0)
+    time_1_p = np.where(checked_p, np.argmax(~is_nan_tp, axis=0), -1)
 
+    values_1_p = values_tp[np.maximum(time_1_p, 0), np.arange(n_patch)]
+    with np.errstate(invalid="ignore"):
+        mismatch_tp = values_tp != values_1_p
+    if ignore_nan:
+        mismatch_tp &= ~is_nan_tp
+    mismatch_tp &= np.arange(n_time)[:, None] > time_1_p[None, :]
+    mismatch_tp &= checked_p[None, :]
 
-def ensure_all_patches_checked(this_ds, this_da, ra_sp, incl_patches):
+    varies_p = np.any(mismatch_tp, axis=0)
+    time_2_p = np.where(varies_p, np.argmax(mismatch_tp, axis=0), -1)
+    return varies_p, time_1_p, time_2_p
+
+
+def get_rx_grid_indices(patches1d_coord, rx_coord, coord_name):
     """
-    In check_one_constant_var(), make sure every patch was checked once (or is all-NaN except
-    possibly final season)
+    Get the index of each patch's lon or lat in the prescribed-input grid
     """
-    incl_patches = np.sort(incl_patches)
-    if not np.array_equal(incl_patches, np.unique(incl_patches)):
-        raise RuntimeError("Patch(es) checked more than once!")
-    incl_patches = list(incl_patches)
-    incl_patches += list(
-        np.where(
-            np.all(
-                np.isnan(
-                    ra_sp[
-                        :-1,
-                    ]
-                ),
-                axis=0,
-            )
-        )[0]
+    rx_coord = np.asarray(rx_coord)
+    order = np.argsort(rx_coord)
+    sorted_coord = rx_coord[order]
+
+    # Nearest member of sorted_coord to each patch
+    right = np.clip(np.searchsorted(sorted_coord, patches1d_coord), 0, len(sorted_coord) - 1)
+    left = np.maximum(right - 1, 0)
+    use_left = np.abs(patches1d_coord - sorted_coord[left]) <= np.abs(
+        patches1d_coord - sorted_coord[right]
     )
-    incl_patches = np.sort(incl_patches)
-    if not np.array_equal(incl_patches, np.unique(incl_patches)):
-        raise RuntimeError("Patch(es) checked but also all-NaN??")
-    if not np.array_equal(incl_patches, np.arange(this_ds.dims["patch"])):
-        for patch in np.arange(this_ds.dims["patch"]):
-            if patch not in incl_patches:
-                raise RuntimeError(
-                    f"Not all patches checked! E.g., {patch}: {this_da.isel(patch=patch).values}"
-                )
-
-
-def check_one_constant_var_loop_through_timesteps(
-    this_ds,
-    ignore_nan,
-    verbose,
-    emojus,
-    var,
-    everything_ok,
-    time_coord,
-    this_da,
-    str_list,
-    rx_ds,
-    time_1,
-    these_patches,
-    t1_yr,
-    t1_vals,
-    any_bad,
-    any_bad_before_checking_rx,
-    bad_patches,
-):
+    nearest = np.where(use_left, left, right)
+
+    bad = np.abs(sorted_coord[nearest] - patches1d_coord) > LONLAT_TOL
+    if np.any(bad):
+        raise RuntimeError(f"{coord_name} {patches1d_coord[bad][0]} not in rx dataset?")
+    return order[nearest]
+
+
+def get_rx_values(this_ds, rx_ds, patches):
     """
-    In check_one_constant_var(), loop through timesteps
+    Get the prescribed value for each of a list of patches, based on its vegetation type and
+    location. Uses a (lon, lat) index into the prescribed-input grid that's computed once for all
+    patches.
     """
-    found_in_rx = None
-    for timestep in np.arange(time_1 + 1, this_ds.dims[time_coord]):
-        t_yr = this_ds[time_coord].values[timestep]
-        t_vals = np.squeeze(this_da.isel({time_coord: timestep, "patch": these_patches}).values)
-        ok_p = t1_vals == t_vals
-
-        # If allowed, ignore where either t or t1 is NaN. Should only be used for runs where
-        # land use varies over time.
-        if ignore_nan:
-            ok_p = np.squeeze(np.bitwise_or(ok_p, np.isnan(t1_vals + t_vals)))
-
-        if not np.all(ok_p):
-            any_bad_before_checking_rx = True
-            bad_patches_this_time = list(np.where(np.bitwise_not(ok_p))[0])
-            bad_patches = np.concatenate(
-                (bad_patches, np.array(these_patches)[bad_patches_this_time])
-            )
-            if rx_ds:
-                found_in_rx = np.array([False for x in bad_patches])
-            vary_patches = list(np.array(these_patches)[bad_patches_this_time])
-            vary_lons = this_ds.patches1d_lon.values[bad_patches_this_time]
-            vary_lats = this_ds.patches1d_lat.values[bad_patches_this_time]
-            vary_crops = this_ds.patches1d_itype_veg_str.values[bad_patches_this_time]
-            vary_crops_int = this_ds.patches1d_itype_veg.values[bad_patches_this_time]
-
-            any_bad_any_crop = False
-            for crop_int in np.unique(vary_crops_int):
-                rx_var = f"gs1_{crop_int}"
-                vary_lons_this_crop = vary_lons[np.where(vary_crops_int == crop_int)]
-                vary_lats_this_crop = vary_lats[np.where(vary_crops_int == crop_int)]
-                these_rx_vals = np.diag(
-                    rx_ds[rx_var].sel(lon=vary_lons_this_crop, lat=vary_lats_this_crop).values
-                )
-                if len(these_rx_vals) != len(vary_lats_this_crop):
-                    raise RuntimeError(
-                        f"Expected {len(vary_lats_this_crop)} rx values; got "
-                        + f"{len(these_rx_vals)}"
-                    )
-                if not np.any(these_rx_vals != -1):
-                    continue
-                any_bad_any_crop = True
-                break
-            if not any_bad_any_crop:
-                continue
-
-            # Loop through and check any patches that were "bad"
-            any_bad = loop_through_bad_patches(
-                verbose,
-                emojus,
-                var,
-                everything_ok,
-                str_list,
-                rx_ds,
-                time_1,
-                t1_yr,
-                t1_vals,
-                timestep,
-                t_yr,
-                t_vals,
-                bad_patches_this_time,
-                found_in_rx,
-                vary_patches,
-                vary_lons,
-                vary_lats,
-                vary_crops,
-                vary_crops_int,
-                any_bad,
-            )
+    patches1d_lon = this_ds.patches1d_lon.values[patches]
+    patches1d_lat = this_ds.patches1d_lat.values[patches]
+    crops_int = this_ds.patches1d_itype_veg.values[patches].astype(int)
+    ixy = get_rx_grid_indices(patches1d_lon, rx_ds.lon.values, "lon")
+    jxy = get_rx_grid_indices(patches1d_lat, rx_ds.lat.values, "lat")
+
+    rx_values = np.full(len(patches), np.nan)
+    for crop_int in np.unique(crops_int):
+        rx_da = rx_ds[f"gs1_{crop_int}"]
+        other_dims = [d for d in rx_da.dims if d not in ["lat", "lon"]]
+        rx_array = rx_da.transpose(*other_dims, "lat", "lon").values
+        rx_array = rx_array.reshape((-1,) + rx_array.shape[-2:])
+        is_this_crop = crops_int == crop_int
+        these_rx_values = rx_array[:, jxy[is_this_crop], ixy[is_this_crop]]
+        first_rx_values = these_rx_values[0, :]
+        # NaN counts as equal to NaN
+        is_same = (these_rx_values == first_rx_values) | (
+            np.isnan(these_rx_values) & np.isnan(first_rx_values)
+        )
+        if not np.all(is_same):
+            raise RuntimeError(f"How does gs1_{crop_int} have time-varying prescribed values?")
+        rx_values[is_this_crop] = these_rx_values[0, :]
+    return rx_values
 
-    return any_bad_before_checking_rx, bad_patches, found_in_rx, any_bad
 
+def get_report(this_ds, var, values_tp, time_coord, varies_p, time_1_p, time_2_p, rx_ds):
+    """
+    Get a table (Dataset along dimension "row") with one row per patch of var that varies
+    """
+    patches = np.where(varies_p)[0]
+    time_1 = time_1_p[patches]
+    time_2 = time_2_p[patches]
+    if rx_ds is not None:
+        rx_missing = get_rx_values(this_ds, rx_ds, patches) == MISSING_RX_VAL
+    else:
+        rx_missing = np.full(len(patches), False)
+    times = this_ds[time_coord].values
+    return xr.Dataset(
+        {
+            "var": ("row", np.full(len(patches), var)),
+            "patch": ("row", patches),
+            "lon": ("row", this_ds.patches1d_lon.values[patches]),
+            "lat": ("row", this_ds.patches1d_lat.values[patches]),
+            "vegtype_str": ("row", this_ds.patches1d_itype_veg_str.values[patches]),
+            "vegtype_int": ("row", this_ds.patches1d_itype_veg.values[patches].astype(int)),
+            "time_1": ("row", times[time_1]),
+            "value_1": ("row", values_tp[time_1, patches]),
+            "time_2": ("row", times[time_2]),
+            "value_2": ("row", values_tp[time_2, patches]),
+            "rx_missing": ("row", rx_missing),
+        }
+    )
 
-def check_one_constant_var(
-    this_ds, case, ignore_nan, verbose, emojus, var, any_bad, any_bad_before_checking_rx
-):
+
+def format_report_row(report, i):
     """
-    Ensure that a variable that should be constant actually is
+    Get a string describing one row of a check_constant_vars() report
     """
-    everything_ok = True
-
-    (
-        time_coord,
-        this_da,
-        ra_sp,
-        incl_patches,
-        str_list,
-        rx_ds,
-        bad_patches,
-    ) = check_one_constant_var_setup(this_ds, case, var)
-
-    for time_1 in np.arange(this_ds.dims[time_coord] - 1):
-        condn = ~np.isnan(ra_sp[time_1, ...])
-        if time_1 > 0:
-            condn = np.bitwise_and(condn, np.all(np.isnan(ra_sp[:time_1, ...]), axis=0))
-        these_patches = np.where(condn)[0]
-        if these_patches.size == 0:
-            continue
-        these_patches = list(np.where(condn)[0])
-        incl_patches += these_patches
-
-        t1_yr = this_ds[time_coord].values[time_1]
-        t1_vals = np.squeeze(this_da.isel({time_coord: time_1, "patch": these_patches}).values)
-
-        (
-            any_bad_before_checking_rx,
-            bad_patches,
-            found_in_rx,
-            any_bad,
-        ) = check_one_constant_var_loop_through_timesteps(
-            this_ds,
-            ignore_nan,
-            verbose,
-            emojus,
-            var,
-            everything_ok,
-            time_coord,
-            this_da,
-            str_list,
-            rx_ds,
-            time_1,
-            these_patches,
-            t1_yr,
-            t1_vals,
-            any_bad,
-            any_bad_before_checking_rx,
-            bad_patches,
+    row = report.isel(row=i)
+    var = str(row["var"].values)
+    values_print = []
+    for name in ["value_1", "value_2"]:
+        value = row[name].values
+        values_print.append("NaN" if np.isnan(value) else int(value))
+    this_str = (
+        f"   Patch {int(row['patch'])} (lon {float(row['lon'])} lat {float(row['lat'])}) "
+        + f"{row['vegtype_str'].values} ({int(row['vegtype_int'])})"
+    )
+    time_1 = row["time_1"].values
+    time_2 = row["time_2"].values
+    if var == "SDATES":
+        return (
+            f"{this_str}: Sowing {time_1} jday {values_print[0]}, {time_2} jday {values_print[1]}"
         )
+    return f"{this_str}: {time_1} {var} {values_print[0]}, {time_2} {var} {values_print[1]}"
+
+
+def check_one_constant_var(this_ds, case, ignore_nan, verbose, emojus, var):
+    """
+    Ensure that a variable that should be constant actually is.
+
+    Returns a report of varying patches (see get_report()).
+    """
+    this_da = this_ds[var]
+    time_coord = get_time_coord(this_da)
+    values_tp = this_da.transpose(time_coord, "patch").values.astype(float)
+
+    # Read prescription file, if needed
+    rx_ds = None
+    if isinstance(case, dict):
+        if var == "GDDHARV" and "rx_gdds_file" in case:
+            rx_ds = import_rx_dates(
+                "gdd", case["rx_gdds_file"], this_ds, set_neg1_to_nan=False
+            ).squeeze()
 
-    if verbose and any_bad:
+    varies_p, time_1_p, time_2_p = find_varying_patches(values_tp, ignore_nan)
+    report = get_report(this_ds, var, values_tp, time_coord, varies_p, time_1_p, time_2_p, rx_ds)
+    is_bad = ~report["rx_missing"].values
+
+    n_time = this_ds.sizes[time_coord]
+    if np.any(is_bad):
         print(f"{emojus} CLM output {var} unexpectedly vary over time:")
-        str_list.sort()
-        if found_in_rx is None:
-            raise RuntimeError("Somehow any_bad True but found_in_rx None")
-        if rx_ds and np.any(~found_in_rx):  # pylint: disable=invalid-unary-operand-type
-            str_list = [
-                "*: Not found in prescribed input file (maybe minor lon/lat mismatch)"
-            ] + str_list
-        elif not rx_ds:
-            str_list = ["(No rx file checked)"] + str_list
-        print("\n".join(str_list))
-
-    # Make sure every patch was checked once (or is all-NaN except possibly final season)
-    ensure_all_patches_checked(this_ds, this_da, ra_sp, incl_patches)
-
-    if not any_bad:
-        if any_bad_before_checking_rx:
-            print(
-                f"✅ CLM output {var} do not vary through {this_ds.dims[time_coord]} growing "
-                + "seasons of output (except for patch(es) with missing rx)."
-            )
+        if verbose:
+            str_list = sorted(format_report_row(report, i) for i in np.where(is_bad)[0])
+            if rx_ds is None:
+                str_list = ["(No rx file checked)"] + str_list
+            print("\n".join(str_list))
         else:
+            i = np.where(is_bad)[0][0]
             print(
-                f"✅ CLM output {var} do not vary through {this_ds.dims[time_coord]} growing "
-                + "seasons of output."
+                f"{var} timestep {time_2_p[report.patch.values[i]]} does not match timestep "
+                + f"{time_1_p[report.patch.values[i]]}"
             )
+    elif report.sizes["row"]:
+        print(
+            f"✅ CLM output {var} do not vary through {n_time} growing "
+            + "seasons of output (except for patch(es) with missing rx)."
+        )
+    else:
+        print(f"✅ CLM output {var} do not vary through {n_time} growing " + "seasons of output.")
 
-    return any_bad, any_bad_before_checking_rx, bad_patches
+    return report
 
 
 def check_constant_vars(
     this_ds, case, ignore_nan, const_growing_seasons=None, verbose=True, throw_error=True
 ):
     """
-    For variables that should stay constant, make sure they are
+    For variables that should stay constant, make sure they are.
+
+    Returns:
+    - The list of patches that vary in any variable (including ones allowed to vary because of
+      missing prescribed inputs)
+    - Whether any patch varies unexpectedly
+    - A report table: Dataset along dimension "row" with one row per variable and varying patch.
+      Includes the patch's location and vegetation type, its first value (value_1, at time_1) and
+      the first value that differs (value_2, at time_2), and whether its prescribed input was
+      missing (rx_missing; such patches are allowed to vary).
     """
     if isinstance(case, str):
         const_vars = [case]
@@ -364,8 +249,6 @@ def check_constant_vars(
             )
         this_ds = this_ds.sel(gs=const_growing_seasons)
 
-    any_bad = False
-    any_bad_before_checking_rx = False
     if throw_error:
         emojus = "❌"
     else:
@@ -373,13 +256,14 @@ def check_constant_vars(
     if not isinstance(const_vars, list):
         const_vars = [const_vars]
 
+    reports = []
     for var in const_vars:
-        any_bad, any_bad_before_checking_rx, bad_patches = check_one_constant_var(
-            this_ds, case, ignore_nan, verbose, emojus, var, any_bad, any_bad_before_checking_rx
-        )
+        reports.append(check_one_constant_var(this_ds, case, ignore_nan, verbose, emojus, var))
+    report = xr.concat(reports, dim="row")
+    any_bad = bool(np.any(~report["rx_missing"].values))
 
     if any_bad and throw_error:
         raise RuntimeError("Stopping due to failed check_constant_vars().")
 
-    bad_patches = np.unique(bad_patches)
-    return [int(p) for p in bad_patches], any_bad
+    bad_patches = np.unique(report["patch"].values)
+    return [int(p) for p in bad_patches], any_bad, report
@@ -6,6 +6,7 @@ import numpy as np
 
 import ctsm.crop_calendars.cropcal_utils as utils
 from ctsm.crop_calendars.cropcal_constants import DEFAULT_GDD_MIN
+from ctsm.crop_calendars.patch_grid_index import get_patch_grid_index
 
 
 def get_pct_harv_at_mature(harvest_reason_da):
@@ -134,6 +135,7 @@ def check_rx_obeyed(
     )
 
     diffs_eg_txt = None
+    grid_index = get_patch_grid_index(dates_ds)
     for vegtype_str in vegtype_list:
         thisveg_patches = np.where(dates_ds.patches1d_itype_veg_str == vegtype_str)[0]
         if thisveg_patches.size == 0:
@@ -142,10 +144,7 @@ def check_rx_obeyed(
 
         vegtype_int = utils.vegtype_str2int(vegtype_str)[0]
         rx_da = rx_ds[f"gs1_{vegtype_int}"]
-        rx_array = rx_da.values[
-            ds_thisveg.patches1d_jxy.values.astype(int) - 1,
-            ds_thisveg.patches1d_ixy.values.astype(int) - 1,
-        ]
+        rx_array = grid_index.ungrid(rx_da.values, patches=thisveg_patches)
         rx_array = np.expand_dims(rx_array, axis=1)
         sim_array = ds_thisveg[output_var].values
         sim_array_dims = ds_thisveg[output_var].dims
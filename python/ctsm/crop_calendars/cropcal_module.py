@@ -12,6 +12,7 @@ from ctsm.crop_calendars.convert_axis_time2gs import convert_axis_time2gs
 from ctsm.crop_calendars.check_rx_obeyed import check_rx_obeyed
 from ctsm.crop_calendars.cropcal_constants import DEFAULT_GDD_MIN
 from ctsm.crop_calendars.import_ds import import_ds
+from ctsm.crop_calendars.patch_grid_index import PatchGridIndex, get_indices_in
 from ctsm.utils import is_instantaneous
 
 MISSING_RX_GDD_VAL = -1
@@ -49,11 +50,16 @@ def check_and_trim_years(year_1, year_n, ds_in):
     return ds_in
 
 
+# Land-use variables copied to patches by open_lu_ds()
+LU_UNGRID_VARS = ["AREA", "LANDFRAC_PFT", "PCT_CFT", "PCT_CROP"]
+
+
 def open_lu_ds(filename, year_1, year_n, existing_ds, ungrid=True):
     """
     Open land-use dataset
     """
-    # Open and trim to years of interest
+    # Open and trim to years of interest. Nothing is read yet: Variables are only read (and then
+    # only for the years of interest) when they're used.
     this_ds_gridded = xr.open_dataset(filename).sel(time=slice(year_1, year_n))
 
     # Assign actual lon/lat coordinates
@@ -62,60 +68,19 @@ def open_lu_ds(filename, year_1, year_n, existing_ds, ungrid=True):
     )
     this_ds_gridded = this_ds_gridded.swap_dims({"lsmlon": "lon", "lsmlat": "lat"})
 
-    if "AREA" in this_ds_gridded:
-        this_ds_gridded["AREA_CFT"] = (
-            this_ds_gridded.AREA
-            * 1e6
-            * this_ds_gridded.LANDFRAC_PFT
-            * this_ds_gridded.PCT_CROP
-            / 100
-            * this_ds_gridded.PCT_CFT
-            / 100
-        )
-        this_ds_gridded["AREA_CFT"].attrs = {"units": "m2"}
-        this_ds_gridded["AREA_CFT"].load()
-    else:
+    if "AREA" not in this_ds_gridded:
         print("Warning: AREA missing from Dataset, so AREA_CFT will not be created")
 
     if not ungrid:
+        if "AREA" in this_ds_gridded:
+            this_ds_gridded["AREA_CFT"] = get_area_cft(this_ds_gridded)
+            this_ds_gridded["AREA_CFT"].load()
         return this_ds_gridded
 
     # Un-grid
-    query_ilons = [int(x) - 1 for x in existing_ds["patches1d_ixy"].values]
-    query_ilats = [int(x) - 1 for x in existing_ds["patches1d_jxy"].values]
-    query_ivts = [
-        list(this_ds_gridded.cft.values).index(x) for x in existing_ds["patches1d_itype_veg"].values
-    ]
-
-    this_ds = xr.Dataset(attrs=this_ds_gridded.attrs)
-    for var in ["AREA", "LANDFRAC_PFT", "PCT_CFT", "PCT_CROP", "AREA_CFT"]:
-        if var not in this_ds_gridded:
-            continue
-        if "time" in this_ds_gridded[var].dims:
-            new_coords = existing_ds["GRAINC_TO_FOOD_ANN"].coords
-        else:
-            new_coords = existing_ds["patches1d_lon"].coords
-        if "cft" in this_ds_gridded[var].dims:
-            this_ds[var] = (
-                this_ds_gridded[var]
-                .isel(
-                    lon=xr.DataArray(query_ilons, dims="patch"),
-                    lat=xr.DataArray(query_ilats, dims="patch"),
-                    cft=xr.DataArray(query_ivts, dims="patch"),
-                    drop=True,
-                )
-                .assign_coords(new_coords)
-            )
-        else:
-            this_ds[var] = (
-                this_ds_gridded[var]
-                .isel(
-                    lon=xr.DataArray(query_ilons, dims="patch"),
-                    lat=xr.DataArray(query_ilats, dims="patch"),
-                    drop=True,
-                )
-                .assign_coords(new_coords)
-            )
+    this_ds = ungrid_lu_ds(this_ds_gridded, existing_ds)
+    if "AREA" in this_ds:
+        this_ds["AREA_CFT"] = get_area_cft(this_ds)
     for var in existing_ds:
         if "patches1d_" in var or "grid1d_" in var:
             this_ds[var] = existing_ds[var]
@@ -123,13 +88,14 @@ def open_lu_ds(filename, year_1, year_n, existing_ds, ungrid=True):
     this_ds["lat"] = this_ds_gridded["lat"]
 
     # Which crops are irrigated?
-    is_irrigated = np.full_like(this_ds["patches1d_itype_veg"], False)
-    for vegtype_str in np.unique(this_ds["patches1d_itype_veg_str"].values):
-        if "irrigated" not in vegtype_str:
-            continue
-        vegtype_int = utils.ivt_str2int(vegtype_str)
-        is_this_vegtype = np.where(this_ds["patches1d_itype_veg"].values == vegtype_int)[0]
-        is_irrigated[is_this_vegtype] = True
+    irrigated_vegtypes = [
+        utils.ivt_str2int(vegtype_str)
+        for vegtype_str in np.unique(this_ds["patches1d_itype_veg_str"].values)
+        if "irrigated" in vegtype_str
+    ]
+    is_irrigated = np.isin(this_ds["patches1d_itype_veg"].values, irrigated_vegtypes).astype(
+        this_ds["patches1d_itype_veg"].dtype
+    )
     this_ds["IRRIGATED"] = xr.DataArray(
         data=is_irrigated,
         coords=this_ds["patches1d_itype_veg_str"].coords,
@@ -142,11 +108,8 @@ def open_lu_ds(filename, year_1, year_n, existing_ds, ungrid=True):
         "long name": "CFT area (irrigated types only)",
         "units": "m^2",
     }
-    this_ds["IRRIGATED_AREA_GRID"] = (
-        this_ds["IRRIGATED_AREA_CFT"]
-        .groupby(this_ds["patches1d_gi"])
-        .sum()
-        .rename({"patches1d_gi": "gridcell"})
+    this_ds["IRRIGATED_AREA_GRID"] = sum_patches_to_gridcells(
+        this_ds["IRRIGATED_AREA_CFT"], this_ds["patches1d_gi"]
     )
     this_ds["IRRIGATED_AREA_GRID"].attrs = {
         "long name": "Irrigated area in gridcell",
@@ -156,6 +119,88 @@ def open_lu_ds(filename, year_1, year_n, existing_ds, ungrid=True):
     return this_ds
 
 
+def sum_patches_to_gridcells(da_patch, patches1d_gi):
+    """
+    Sum a DataArray with a patch dimension over the patches in each gridcell, skipping NaNs. Like
+    da_patch.groupby(patches1d_gi).sum(), but with one vectorized sum instead of one per gridcell.
+    Returns a DataArray with the patch dimension replaced by gridcell.
+    """
+    gridcells, patch_gridcell = np.unique(patches1d_gi.values, return_inverse=True)
+    other_dims = [dim for dim in da_patch.dims if dim != "patch"]
+    da_patch = da_patch.transpose("patch", *other_dims)
+    values = np.zeros((len(gridcells),) + da_patch.shape[1:], dtype=da_patch.dtype)
+    np.add.at(values, patch_gridcell, np.nan_to_num(da_patch.values, nan=0.0))
+    return xr.DataArray(
+        values,
+        dims=["gridcell"] + other_dims,
+        coords={
+            "gridcell": xr.Variable("gridcell", gridcells, attrs=patches1d_gi.attrs),
+            **{name: coord for name, coord in da_patch.coords.items() if "patch" not in coord.dims},
+        },
+    )
+
+
+def get_area_cft(this_ds):
+    """
+    Get the area (m2) of each CFT, gridded or on patches, from a land-use Dataset
+    """
+    area_cft = (
+        this_ds.AREA * 1e6 * this_ds.LANDFRAC_PFT * this_ds.PCT_CROP / 100 * this_ds.PCT_CFT / 100
+    )
+    area_cft.attrs = {"units": "m2"}
+    return area_cft
+
+
+def ungrid_lu_ds(this_ds_gridded, existing_ds):
+    """
+    Copy the land-use variables in LU_UNGRID_VARS from the grid to the patches of existing_ds.
+
+    Every variable is gathered with the same index arrays (each patch's lat, lon, and position of its
+    vegetation type on the cft axis, the latter found with a sorted lookup table). Time-varying
+    variables are read one timestep at a time, so only the requested years are ever in memory, and
+    only on the grid for one timestep.
+    """
+    grid_index = PatchGridIndex(
+        existing_ds["patches1d_jxy"].values.astype(int) - 1,
+        existing_ds["patches1d_ixy"].values.astype(int) - 1,
+        ivt_index=get_indices_in(
+            this_ds_gridded.cft.values, existing_ds["patches1d_itype_veg"].values, "cft"
+        ),
+        n_ivt=this_ds_gridded.sizes["cft"],
+    )
+
+    cfts = this_ds_gridded.cft.values[grid_index.ivt_index]
+
+    this_ds = xr.Dataset(attrs=this_ds_gridded.attrs)
+    for var in LU_UNGRID_VARS:
+        if var not in this_ds_gridded:
+            continue
+        da_gridded = this_ds_gridded[var]
+        include_cft = "cft" in da_gridded.dims
+        grid_dims = ["cft", "lat", "lon"] if include_cft else ["lat", "lon"]
+        cft_coord = {"cft": ("patch", cfts)} if include_cft else {}
+        if "time" in da_gridded.dims:
+            da_gridded = da_gridded.transpose("time", *grid_dims)
+            values = np.empty((da_gridded.sizes["time"], grid_index.n_patch), da_gridded.dtype)
+            for i in range(da_gridded.sizes["time"]):
+                values[i] = grid_index.ungrid(da_gridded[i].values, include_ivt=include_cft)
+            this_ds[var] = xr.DataArray(
+                values,
+                dims=["time", "patch"],
+                coords={"time": da_gridded["time"], **cft_coord},
+                attrs=da_gridded.attrs,
+            ).assign_coords(existing_ds["GRAINC_TO_FOOD_ANN"].coords)
+        else:
+            da_gridded = da_gridded.transpose(*grid_dims)
+            this_ds[var] = xr.DataArray(
+                grid_index.ungrid(da_gridded.values, include_ivt=include_cft),
+                dims=["patch"],
+                coords=cft_coord,
+                attrs=da_gridded.attrs,
+            ).assign_coords(existing_ds["patches1d_lon"].coords)
+    return this_ds
+
+
 def check_v0_le_v1(this_ds, var_list, msg_txt=" ", both_nan_ok=False, throw_error=False):
     """
     Make sure that, e.g., GDDACCUM_PERHARV is always <= HUI_PERHARV
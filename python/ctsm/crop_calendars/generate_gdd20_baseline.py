@@ -17,8 +17,13 @@ sys.path.insert(1, _CTSM_PYTHON)
 # pylint: disable=wrong-import-position
 from ctsm.crop_calendars.import_ds import import_ds
 import ctsm.crop_calendars.cropcal_utils as utils
-from ctsm.crop_calendars.grid_one_variable import grid_one_variable
+from ctsm.crop_calendars.grid_one_variable import grid_variables
 from ctsm.crop_calendars.cropcal_module import MISSING_RX_GDD_VAL
+from ctsm.netcdf_output import (
+    add_netcdf_output_args,
+    netcdf_output_options_from_args,
+    write_netcdf,
+)
 
 GRIDDING_VAR_LIST = ["patches1d_ixy", "patches1d_jxy", "lat", "lon"]
 STREAM_YEAR = 2000  # The year specified for stream_yearFirst and stream_yearLast in the call of
@@ -91,6 +96,7 @@ def _parse_args():
         default="GDDBX",
         choices=["GDDBX", "GDDB20"],
     )
+    add_netcdf_output_args(parser)
 
     # Get arguments
     args = parser.parse_args(sys.argv[1:])
@@ -228,7 +234,9 @@ def setup_output_dataset(input_files, author, variable, year_args, ds_in):
     return ds_out
 
 
-def generate_gdd20_baseline(input_files, output_file, author, time_slice, variable, year_args):
+def generate_gdd20_baseline(
+    input_files, output_file, author, time_slice, variable, year_args, output_options=None
+):
     """
     Generate stream_fldFileName_gdd20_baseline file from CTSM outputs
     """
@@ -270,6 +278,7 @@ def generate_gdd20_baseline(input_files, output_file, author, time_slice, variab
 
     # Process all crops
     encoding_dict = {}
+    vars_to_grid = []
     for cft_str in MGDCROP_LIST:
         cft_int = utils.vegtype_str2int(cft_str)[0]
         print(f"{cft_str} ({cft_int})")
@@ -305,12 +314,22 @@ def generate_gdd20_baseline(input_files, output_file, author, time_slice, variab
         ds_out[var_out] = this_da
         encoding_dict[var_out] = {"dtype": "float64"}
 
-        # Grid, if needed
+        # Will need gridding?
         if any(x not in this_da.dims for x in ["lat", "lon"]):
-            ds_out[var_out] = grid_one_variable(ds_out, var_out)
+            vars_to_grid.append(var_out)
+
+    # Grid all crops at once, if needed
+    if vars_to_grid:
+        ds_out.update(grid_variables(ds_out, vars_to_grid))
 
     # Save
-    ds_out.to_netcdf(output_file, format="NETCDF3_CLASSIC", encoding=encoding_dict)
+    write_netcdf(
+        ds_out,
+        output_file,
+        output_options,
+        default_format="NETCDF3_CLASSIC",
+        encoding=encoding_dict,
+    )
 
     print("Done!")
 
@@ -327,4 +346,5 @@ def main():
         time_slice,
         args.variable,
         [args.first_year, args.last_year],
+        output_options=netcdf_output_options_from_args(args),
     )
@@ -1,12 +1,13 @@
 """
 Generate maturity requirements (GDD) from outputs of a GDD-generating run
 """
+import contextlib
 import os
 import sys
-import pickle
 import datetime as dt
 import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import xarray as xr
 
@@ -19,6 +20,15 @@ _CTSM_PYTHON = os.path.join(
 sys.path.insert(1, _CTSM_PYTHON)
 import ctsm.crop_calendars.cropcal_module as cc  # pylint: disable=wrong-import-position
 import ctsm.crop_calendars.generate_gdds_functions as gddfn  # pylint: disable=wrong-import-position
+from ctsm.crop_calendars.generate_gdds_checkpoint import (  # pylint: disable=wrong-import-position
+    GddCheckpointStore,
+    get_run_key,
+)
+from ctsm.netcdf_output import (  # pylint: disable=wrong-import-position
+    add_netcdf_output_args,
+    netcdf_output_options_from_args,
+    write_netcdf,
+)
 
 # Global constants
 PARAMFILE_DIR = "/glade/campaign/cesm/cesmdata/cseg/inputdata/lnd/clm2/paramdata"
@@ -43,7 +53,9 @@ def main(
     unlimited_season_length=False,
     skip_crops=None,
     logger=None,
-    no_pickle=None,
+    no_checkpoint=None,
+    jobs=1,
+    output_options=None,
 ):
     # pylint: disable=missing-function-docstring,too-many-statements
     # Directories to save output files and figures
@@ -108,31 +120,58 @@ def main(
             + "(years are +1 because of CTSM output naming)",
         )
 
-        pickle_file = os.path.join(output_dir, f"{first_season}-{last_season}.pickle")
         h2_ds_file = os.path.join(output_dir, f"{first_season}-{last_season}.h2_ds.nc")
-        if os.path.exists(pickle_file) and not no_pickle:
-            with open(pickle_file, "rb") as file:
-                (
-                    first_season,
-                    last_season,
-                    pickle_year,
-                    gddaccum_yp_list,
-                    gddharv_yp_list,
-                    skip_patches_for_isel_nan_lastyear,
-                    lastyear_active_patch_indices_list,
-                    incorrectly_daily,
-                    save_figs,
-                    incl_vegtypes_str,
-                    incl_patches1d_itype_veg,
-                    mxsowings,
-                    skip_crops,
-                ) = pickle.load(file)
-            print(f"Will resume import at {pickle_year+1}")
+        input_stream = gddfn.GddInputStream(
+            input_dir, first_season, last_season, skip_crops, logger
+        )
+
+        # Find out how many years can be restored from existing checkpoints, after discarding any
+        # left over from runs with different inputs
+        seasons = np.arange(first_season + 1, last_season + 3)
+        checkpoints = None
+        n_years_restored = 0
+        if not no_checkpoint:
+            checkpoints = GddCheckpointStore(
+                os.path.join(output_dir, "checkpoints"),
+                get_run_key(
+                    first_season, sdates_file, hdates_file, unlimited_season_length, skip_crops
+                ),
+                run_inputs={
+                    "first_season": first_season,
+                    "sdates_file": os.path.basename(sdates_file),
+                    "hdates_file": os.path.basename(hdates_file),
+                    "unlimited_season_length": bool(unlimited_season_length),
+                    "skip_crops": sorted(skip_crops),
+                },
+            )
+            year_keys = checkpoints.get_year_keys(
+                [input_stream.get_year_fingerprint(y) for y in seasons]
+            )
+            n_discarded = checkpoints.discard_stale(year_keys, seasons)
+            if n_discarded:
+                gddfn.log(logger, f"Discarded {n_discarded} stale checkpoint(s)")
+            n_years_restored = checkpoints.count_available(year_keys, seasons)
+        if n_years_restored:
+            (
+                gddaccum_yp_list,
+                gddharv_yp_list,
+                skip_patches_for_isel_nan_lastyear,
+                lastyear_active_patch_indices_list,
+                incorrectly_daily,
+                incl_vegtypes_str,
+                incl_patches1d_itype_veg,
+                mxsowings,
+            ) = checkpoints.restore(year_keys[:n_years_restored], last_season - first_season + 1)
+            gddfn.log(
+                logger,
+                f"Restored {n_years_restored} year(s) from checkpoints in {checkpoints.directory}",
+            )
+            if n_years_restored < len(seasons):
+                print(f"Will resume import at {seasons[n_years_restored]}")
             h2_ds = None
         else:
             incorrectly_daily = False
             skip_patches_for_isel_nan_lastyear = np.ndarray([])
-            pickle_year = -np.inf
             gddaccum_yp_list = []
             gddharv_yp_list = []
             incl_vegtypes_str = None
@@ -145,68 +184,68 @@ def main(
         else:
             mxmats = None
 
-        h1_instantaneous = None
-        for yr_index, this_yr in enumerate(np.arange(first_season + 1, last_season + 3)):
-            if this_yr <= pickle_year:
-                continue
+        # Process crop types in parallel, if requested
+        if jobs > 1:
+            gddfn.log(logger, f"Processing crop types with {jobs} worker processes")
+            executor_context = ProcessPoolExecutor(max_workers=jobs)
+        else:
+            executor_context = contextlib.nullcontext()
 
-            (
-                h2_ds,
-                sdates_rx,
-                hdates_rx,
-                gddaccum_yp_list,
-                gddharv_yp_list,
-                skip_patches_for_isel_nan_lastyear,
-                lastyear_active_patch_indices_list,
-                incorrectly_daily,
-                incl_vegtypes_str,
-                incl_patches1d_itype_veg,
-                mxsowings,
-                h1_instantaneous,
-            ) = gddfn.import_and_process_1yr(
-                first_season,
-                last_season,
-                yr_index,
-                this_yr,
-                sdates_rx,
-                hdates_rx,
-                gddaccum_yp_list,
-                gddharv_yp_list,
-                skip_patches_for_isel_nan_lastyear,
-                lastyear_active_patch_indices_list,
-                incorrectly_daily,
-                input_dir,
-                incl_vegtypes_str,
-                h2_ds_file,
-                mxmats,
-                cc.get_gs_len_da,
-                skip_crops,
-                outdir_figs,
-                logger,
-                h1_instantaneous,
-            )
+        with executor_context as executor:
+            for yr_index, this_yr in enumerate(seasons):
+                if yr_index < n_years_restored:
+                    continue
 
-            gddfn.log(logger, f"   Saving pickle file ({pickle_file})...")
-            with open(pickle_file, "wb") as file:
-                pickle.dump(
-                    [
-                        first_season,
-                        last_season,
-                        this_yr,
+                (
+                    h2_ds,
+                    sdates_rx,
+                    hdates_rx,
+                    gddaccum_yp_list,
+                    gddharv_yp_list,
+                    skip_patches_for_isel_nan_lastyear,
+                    lastyear_active_patch_indices_list,
+                    incorrectly_daily,
+                    incl_vegtypes_str,
+                    incl_patches1d_itype_veg,
+                    mxsowings,
+                ) = gddfn.import_and_process_1yr(
+                    first_season,
+                    last_season,
+                    yr_index,
+                    this_yr,
+                    sdates_rx,
+                    hdates_rx,
+                    gddaccum_yp_list,
+                    gddharv_yp_list,
+                    skip_patches_for_isel_nan_lastyear,
+                    lastyear_active_patch_indices_list,
+                    incorrectly_daily,
+                    input_stream,
+                    incl_vegtypes_str,
+                    h2_ds_file,
+                    mxmats,
+                    cc.get_gs_len_da,
+                    skip_crops,
+                    outdir_figs,
+                    logger,
+                    executor=executor,
+                )
+
+                if checkpoints is not None:
+                    gddfn.log(logger, "   Saving checkpoint...")
+                    checkpoints.save(
+                        year_keys[yr_index],
+                        yr_index,
                         gddaccum_yp_list,
                         gddharv_yp_list,
                         skip_patches_for_isel_nan_lastyear,
                         lastyear_active_patch_indices_list,
                         incorrectly_daily,
-                        save_figs,
                         incl_vegtypes_str,
                         incl_patches1d_itype_veg,
                         mxsowings,
-                        skip_crops,
-                    ],
-                    file,
-                    protocol=-1,
-                )
+                        this_yr,
+                    )
 
         if isinstance(incl_vegtypes_str, list):
             incl_vegtypes_str = np.array(incl_vegtypes_str)
@@ -216,8 +255,9 @@ def main(
 
         gddfn.log(logger, "Done")
 
+        # If every year was restored from checkpoints, import the last year's h2 file for gridding
         if not h2_ds:
-            h2_ds = xr.open_dataset(h2_ds_file)
+            h2_ds = input_stream.get_h2_ds(seasons[-1])
 
     ######################################################
     ### Get and grid mean GDDs in GGCMI growing season ###
@@ -308,7 +348,7 @@ def main(
             for var in template_ds:
                 if "sdate" in var:
                     template_ds = template_ds.drop(var)
-            template_ds.to_netcdf(path=outfile, format="NETCDF3_CLASSIC")
+            write_netcdf(template_ds, outfile, output_options, default_format="NETCDF3_CLASSIC")
             template_ds.close()
 
             # Add global attributes
@@ -327,7 +367,9 @@ def main(
                 gdd_maps_ds["time_bounds"] = sdates_rx.time_bounds
 
             # Save cultivar GDDs
-            gdd_maps_ds.to_netcdf(outfile, mode="w", format="NETCDF3_CLASSIC")
+            write_netcdf(
+                gdd_maps_ds, outfile, output_options, default_format="NETCDF3_CLASSIC", mode="w"
+            )
 
         save_gdds(sdates_file, hdates_file, outfile, gdd_maps_ds, sdates_rx)
 
@@ -397,8 +439,8 @@ if __name__ == "__main__":
         "--input-dir",
         help=(
             "Directory where run outputs can be found (and where outputs will go). If "
-            + "--only-make-figs, this is the directory with the preprocessed files (e.g., *.pickle "
-            + "file)."
+            + "--only-make-figs, this is the directory with the preprocessed files (i.e., the one "
+            + "containing figs/)."
         ),
         required=True,
     )
@@ -475,11 +517,24 @@ if __name__ == "__main__":
         default="",
     )
     parser.add_argument(
+        "--no-checkpoint",
         "--no-pickle",
-        help="Don't read from existing pickle file; instead, overwrite. For troubleshooting.",
+        help="Don't read or write checkpoints. For troubleshooting, or if input files might have "
+        + "been changed without changing their size or modification time (checkpoints are "
+        + "matched to inputs by name, size, modification time, and first and last MiB, not by "
+        + "their full contents).",
         action="store_true",
         default=False,
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of worker processes to use for processing crop types in parallel. Output is "
+        + "identical to that of the default serial processing.",
+        type=int,
+        default=1,
+    )
+    add_netcdf_output_args(parser)
 
     # Get arguments
     args = parser.parse_args(sys.argv[1:])
@@ -503,5 +558,7 @@ if __name__ == "__main__":
         last_land_use_year=args.last_land_use_year,
         unlimited_season_length=args.unlimited_season_length,
         skip_crops=args.skip_crops,
-        no_pickle=args.no_pickle,
+        no_checkpoint=args.no_checkpoint,
+        jobs=args.jobs,
+        output_options=netcdf_output_options_from_args(args),
     )
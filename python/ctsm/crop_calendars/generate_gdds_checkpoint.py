@@ -0,0 +1,304 @@
+"""
+Per-year, content-addressed checkpoints for generate_gdds.py
+
+Each processed year is saved as its own .npz shard, named after a key that hashes together:
+- the checkpoint format version and the arguments that affect processing (see get_run_key()),
+- a fingerprint of that year's inputs (see GddInputStream.get_year_fingerprint()), and
+- the key of the previous year's shard.
+
+Because of that chaining, a change to any year's inputs invalidates the shards of that year and all
+following years, while earlier years are reused. Extending a run by one season only requires
+processing the new years. Shards contain only plain Numpy arrays (no pickled objects) and do not
+depend on the absolute paths of the inputs, so a run can be resumed with a different Python/Numpy
+installation or on a different node (as long as copied inputs keep their modification times; see
+get_file_fingerprint()).
+
+Each shard also records the run key, its own key, its season, and a readable summary of the run's
+inputs. Shards whose records don't match the current run (e.g., left over from an earlier run with
+different inputs) are discarded rather than restored (see GddCheckpointStore.discard_stale()).
+"""
+import glob
+import json
+import os
+import hashlib
+import zipfile
+import numpy as np
+
+CHECKPOINT_VERSION = 2
+
+# Number of bytes at the start and end of each file to include in its fingerprint
+FINGERPRINT_SAMPLE_BYTES = 2**20
+
+
+def hash_items(*items):
+    """
+    Get the SHA-256 hex digest of a sequence of strings, numbers, and/or Numpy arrays
+    """
+    sha = hashlib.sha256()
+    for item in items:
+        if isinstance(item, np.ndarray):
+            sha.update(str(item.dtype).encode())
+            sha.update(str(item.shape).encode())
+            sha.update(np.ascontiguousarray(item).tobytes())
+        elif isinstance(item, bytes):
+            sha.update(item)
+        else:
+            sha.update(repr(item).encode())
+        # Separator, so that e.g. ("ab", "c") and ("a", "bc") hash differently
+        sha.update(b"\0")
+    return sha.hexdigest()
+
+
+def get_file_fingerprint(filename):
+    """
+    Get a fingerprint of a file from its name (without directory), its size, its modification time,
+    and its first and last FINGERPRINT_SAMPLE_BYTES bytes.
+
+    This avoids reading every byte of large history files. Regenerated files are caught by their
+    modification time even if only bytes in the middle changed. The trade-off is that copying the
+    inputs without preserving modification times (e.g., cp without -p) invalidates existing
+    checkpoints. The directory isn't included, so copies elsewhere that keep their modification
+    times have the same fingerprint.
+    """
+    stat = os.stat(filename)
+    size = stat.st_size
+    with open(filename, "rb") as file:
+        head = file.read(FINGERPRINT_SAMPLE_BYTES)
+        tail = b""
+        if size > FINGERPRINT_SAMPLE_BYTES:
+            file.seek(max(FINGERPRINT_SAMPLE_BYTES, size - FINGERPRINT_SAMPLE_BYTES))
+            tail = file.read()
+    return hash_items(os.path.basename(filename), size, stat.st_mtime_ns, head, tail)
+
+
+def get_run_key(first_season, sdates_file, hdates_file, unlimited_season_length, skip_crops):
+    """
+    Get the key of a generate_gdds.py run: Everything other than the per-year inputs that affects
+    the per-year results. The last season is deliberately not included, so that a run can be
+    extended without reprocessing.
+    """
+    return hash_items(
+        CHECKPOINT_VERSION,
+        first_season,
+        get_file_fingerprint(sdates_file),
+        get_file_fingerprint(hdates_file),
+        bool(unlimited_season_length),
+        sorted(skip_crops),
+    )
+
+
+class GddCheckpointStore:
+    """
+    Directory of per-year checkpoint shards for generate_gdds.py
+    """
+
+    def __init__(self, directory, run_key, run_inputs=None):
+        """
+        run_inputs is a dict of the run's key inputs (e.g., first season and date files), recorded in
+        each shard so that shards can be checked against the run restoring them. The directory is
+        only created when the first shard is saved.
+        """
+        self.directory = directory
+        self.run_key = run_key
+        self.run_inputs = json.dumps(run_inputs or {}, sort_keys=True, default=str)
+
+    def get_year_keys(self, year_fingerprints):
+        """
+        Get the chained key of each year, given the fingerprints of each year's inputs
+        """
+        keys = []
+        previous_key = self.run_key
+        for fingerprint in year_fingerprints:
+            previous_key = hash_items(previous_key, fingerprint)
+            keys.append(previous_key)
+        return keys
+
+    def get_path(self, key):
+        """
+        Get the path of the shard for a given key
+        """
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _read_record(self, path):
+        """
+        Get the (version, run key, year key, season, run inputs) recorded in a shard, or None if it
+        can't be read
+        """
+        try:
+            with np.load(path, allow_pickle=False) as shard:
+                if int(shard["version"]) != CHECKPOINT_VERSION:
+                    return None
+                return (
+                    int(shard["version"]),
+                    str(shard["run_key"]),
+                    str(shard["year_key"]),
+                    int(shard["season"]),
+                    str(shard["run_inputs"]),
+                )
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            return None
+
+    def _matches(self, key, season):
+        """
+        Whether the shard for a key exists and was saved by this run for this season
+        """
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            return False
+        return self._read_record(path) == (
+            CHECKPOINT_VERSION,
+            self.run_key,
+            key,
+            int(season),
+            self.run_inputs,
+        )
+
+    def discard_stale(self, year_keys, seasons):
+        """
+        Remove shards that can't be used by this run: those from other runs (different run key or
+        inputs), unreadable or old-version ones, and those for one of this run's seasons whose key
+        doesn't match (i.e., made from different inputs for that or an earlier year). Returns the
+        number of shards removed.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        expected = dict(zip([int(x) for x in seasons], year_keys))
+        n_removed = 0
+        for path in glob.glob(os.path.join(self.directory, "*.npz")):
+            record = self._read_record(path)
+            key = os.path.basename(path)[: -len(".npz")]
+            if record is not None:
+                _, run_key, year_key, season, run_inputs = record
+                if (
+                    run_key == self.run_key
+                    and run_inputs == self.run_inputs
+                    and year_key == key
+                    and expected.get(season, key) == key
+                ):
+                    continue
+            os.remove(path)
+            n_removed += 1
+        return n_removed
+
+    def count_available(self, year_keys, seasons):
+        """
+        Get the number of consecutive years, starting with the first, that have shards saved by this
+        run for those seasons
+        """
+        n_available = 0
+        for key, season in zip(year_keys, seasons):
+            if not self._matches(key, season):
+                break
+            n_available += 1
+        return n_available
+
+    def save(
+        self,
+        key,
+        year_index,
+        gddaccum_yp_list,
+        gddharv_yp_list,
+        skip_patches_for_isel_nan_lastyear,
+        lastyear_active_patch_indices_list,
+        incorrectly_daily,
+        incl_vegtypes_str,
+        incl_patches1d_itype_veg,
+        mxsowings,
+        season,
+    ):
+        """
+        Save the state after processing one year (season). Only the two rows of each crop's year-by-patch
+        arrays that processing a year can change (last season and this season) are saved.
+        """
+        arrays = {
+            "version": np.array(CHECKPOINT_VERSION),
+            "run_key": np.array(self.run_key),
+            "year_key": np.array(key),
+            "season": np.array(int(season)),
+            "run_inputs": np.array(self.run_inputs),
+            "year_index": np.array(year_index),
+            "n_crops": np.array(len(gddaccum_yp_list)),
+            "skip_patches_for_isel_nan_lastyear": np.asarray(skip_patches_for_isel_nan_lastyear),
+            "incorrectly_daily": np.array(incorrectly_daily),
+            "incl_vegtypes_str": np.array(incl_vegtypes_str, dtype=str),
+            "incl_patches1d_itype_veg": np.asarray(incl_patches1d_itype_veg),
+            "mxsowings": np.array(mxsowings),
+        }
+        for name, yp_list in [("gddaccum", gddaccum_yp_list), ("gddharv", gddharv_yp_list)]:
+            for i, yp_array in enumerate(yp_list):
+                if yp_array is None:
+                    continue
+                arrays[f"{name}_this_{i}"] = yp_array[year_index, :]
+                if year_index > 0:
+                    arrays[f"{name}_prev_{i}"] = yp_array[year_index - 1, :]
+        for i, indices in enumerate(lastyear_active_patch_indices_list):
+            if indices is not None:
+                arrays[f"active_patch_indices_{i}"] = np.array(indices, dtype=int)
+
+        # Write to a temporary file first so that an interrupted save can't leave a corrupt shard
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        path = self.get_path(key)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(tmp_path, path)
+
+    def restore(self, year_keys, n_years):
+        """
+        Rebuild the state after processing the years with the given keys. Returns a tuple in the
+        order of the arguments of save(), minus key, year_index, and season.
+        """
+        gddaccum_yp_list = None
+        gddharv_yp_list = None
+        for year_index, key in enumerate(year_keys):
+            with np.load(self.get_path(key), allow_pickle=False) as shard:
+                if int(shard["version"]) != CHECKPOINT_VERSION:
+                    raise RuntimeError(f"Unexpected checkpoint version in {self.get_path(key)}")
+                if int(shard["year_index"]) != year_index:
+                    raise RuntimeError(f"Unexpected year index in {self.get_path(key)}")
+                if str(shard["run_key"]) != self.run_key or str(shard["year_key"]) != key:
+                    raise RuntimeError(f"Checkpoint {self.get_path(key)} is from a different run")
+                if str(shard["run_inputs"]) != self.run_inputs:
+                    raise RuntimeError(
+                        f"Checkpoint {self.get_path(key)} is from a run with different inputs"
+                    )
+                n_crops = int(shard["n_crops"])
+                if gddaccum_yp_list is None:
+                    gddaccum_yp_list = [None] * n_crops
+                    gddharv_yp_list = [None] * n_crops
+                for name, yp_list in [("gddaccum", gddaccum_yp_list), ("gddharv", gddharv_yp_list)]:
+                    for i in range(n_crops):
+                        if f"{name}_this_{i}" not in shard:
+                            continue
+                        row = shard[f"{name}_this_{i}"]
+                        if yp_list[i] is None:
+                            yp_list[i] = np.full((n_years + 1, row.size), np.nan)
+                        yp_list[i][year_index, :] = row
+                        if f"{name}_prev_{i}" in shard:
+                            yp_list[i][year_index - 1, :] = shard[f"{name}_prev_{i}"]
+
+                # Everything else is taken from the last year
+                if year_index == len(year_keys) - 1:
+                    lastyear_active_patch_indices_list = [
+                        shard[f"active_patch_indices_{i}"].tolist()
+                        if f"active_patch_indices_{i}" in shard
+                        else None
+                        for i in range(n_crops)
+                    ]
+                    skip_patches_for_isel_nan_lastyear = shard["skip_patches_for_isel_nan_lastyear"]
+                    incorrectly_daily = bool(shard["incorrectly_daily"])
+                    incl_vegtypes_str = shard["incl_vegtypes_str"].tolist()
+                    incl_patches1d_itype_veg = shard["incl_patches1d_itype_veg"]
+                    mxsowings = int(shard["mxsowings"])
+
+        return (
+            gddaccum_yp_list,
+            gddharv_yp_list,
+            skip_patches_for_isel_nan_lastyear,
+            lastyear_active_patch_indices_list,
+            incorrectly_daily,
+            incl_vegtypes_str,
+            incl_patches1d_itype_veg,
+            mxsowings,
+        )
@@ -4,18 +4,21 @@ Functions to support generate_gdds.py
 # pylint: disable=too-many-lines,too-many-statements,abstract-class-instantiated
 import warnings
 import os
+import io
+import contextlib
+import re
 import glob
 import datetime as dt
-from importlib import util as importlib_util
 import numpy as np
 import xarray as xr
 
 from ctsm.utils import is_instantaneous
 import ctsm.crop_calendars.cropcal_utils as utils
 import ctsm.crop_calendars.cropcal_module as cc
-from ctsm.crop_calendars.xr_flexsel import xr_flexsel
 from ctsm.crop_calendars.grid_one_variable import grid_one_variable
+from ctsm.crop_calendars.patch_grid_index import get_patch_grid_index
 from ctsm.crop_calendars.import_ds import import_ds
+from ctsm.crop_calendars.generate_gdds_checkpoint import get_file_fingerprint, hash_items
 
 CAN_PLOT = True
 try:
@@ -182,17 +185,177 @@ def import_rx_dates(s_or_h, date_infile, incl_patches1d_itype_veg, mxsowings, lo
     return this_ds
 
 
-def this_crop_map_to_patches(lon_points, lat_points, map_ds, vegtype_int):
+def this_crop_map_to_patches(this_ds, patches, map_ds, vegtype_int):
     """
-    Given a map, get a vector of patches
+    Given a map, get a vector of its values at some of a Dataset's patches (given as indices)
     """
-    # xarray pointwise indexing;
-    # see https://xarray.pydata.org/en/stable/user-guide/indexing.html#more-advanced-indexing
-    return (
-        map_ds[f"gs1_{vegtype_int}"]
-        .sel(lon=xr.DataArray(lon_points, dims="patch"), lat=xr.DataArray(lat_points, dims="patch"))
-        .squeeze(drop=True)
-    )
+    grid_index = get_patch_grid_index(this_ds, grid_ds=map_ds)
+    map_da = map_ds[f"gs1_{vegtype_int}"].squeeze(drop=True).transpose("lat", "lon")
+    return grid_index.ungrid(map_da.values, patches=patches)
+
+
+def get_crops_to_read(skip_crops):
+    """
+    Get list of crops to include
+    """
+    if skip_crops is not None:
+        return [c for c in utils.define_mgdcrop_list_withgrasses() if c not in skip_crops]
+    return utils.define_mgdcrop_list_withgrasses()
+
+
+def find_history_files(indir, tape, logger):
+    """
+    Get list of history files for a given tape (e.g., "h1"), falling back to *.nc.base files
+    """
+    patterns = [f"*{tape}.*.nc", f"*{tape}.*.nc.base"]
+    for pat in patterns:
+        filelist = glob.glob(os.path.join(indir, pat))
+        if filelist:
+            return sorted(filelist)
+    error(logger, f"No files found matching patterns: {patterns}")
+    return None
+
+
+class GddInputStream:
+    """
+    Single-pass reader for the outputs of a GDD-generating run.
+
+    The h1 (SDATES, HDATES) and h2 (GDDACCUM, GDDHARV) file lists are globbed once. The h1 files
+    are opened once for the whole period of interest; each year is then a slice of that in-memory
+    Dataset. Each h2 file (one per year) is opened only when its year is requested. Per-file
+    metadata (year of each h1 timestep, all-NaN masks of each h1 timestep, and the patch indices of
+    each crop in the h2 files) is derived once and reused for every season.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, indir, first_season, last_season, skip_crops, logger, chunks="auto"):
+        self.logger = logger
+        self.crops_to_read = get_crops_to_read(skip_crops)
+
+        # Without dask, this can take a LONG time at resolutions finer than 2-deg. See
+        # import_ds.get_chunks() for chunking strategies.
+        self.chunks = chunks
+
+        # Get h1 and h2 file lists
+        self.h1_filelist = find_history_files(indir, "h1", logger)
+        self.h2_files_by_year = {}
+        for file in find_history_files(indir, "h2", logger):
+            match = re.search(r"h2\.(\d+)-01", os.path.basename(file))
+            if match:
+                self.h2_files_by_year.setdefault(int(match.group(1)), []).append(file)
+
+        # Are h1 files instantaneous?
+        with xr.open_dataset(self.h1_filelist[0]) as this_ds:
+            self.h1_instantaneous = is_instantaneous(this_ds["time"])
+
+        # Import SDATES and HDATES for all seasons at once. Keep 1 extra year to avoid incomplete
+        # final growing season for crops harvested after Dec. 31.
+        first_slice_year = self.get_slice_year(first_season + 1)
+        last_slice_year = self.get_slice_year(last_season + 2)
+        log(logger, f"   Importing SDATES and HDATES ({first_slice_year}-{last_slice_year})...")
+        self.dates_ds = import_ds(
+            self.h1_filelist,
+            my_vars=["SDATES", "HDATES"],
+            my_vegtypes=self.crops_to_read,
+            time_slice=slice(f"{first_slice_year}-01-01", f"{last_slice_year}-12-31"),
+            chunks=self.chunks,
+        ).load()
+
+        # Per-timestep metadata
+        self.dates_years = self.dates_ds["time"].dt.year.values
+        self.sdates_all_nan = (
+            self.dates_ds["SDATES"].isnull().all(dim="mxsowings").transpose("time", "patch").values
+        )
+        self.hdates_all_nan = (
+            self.dates_ds["HDATES"].isnull().all(dim="mxharvests").transpose("time", "patch").values
+        )
+
+        # Filled on first call of get_crop_patch_indices()
+        self._h2_patches = None
+        self._crop_patch_indices = {}
+
+    def get_slice_year(self, this_year):
+        """
+        Get the year of h1 timesteps that holds the dates for netCDF year this_year
+        """
+        if self.h1_instantaneous:
+            return this_year
+        return this_year - 1
+
+    def get_dates(self, this_year):
+        """
+        Get SDATES and HDATES for one year, along with their all-NaN patch masks.
+
+        Returns the Dataset (with the time dimension removed), the SDATES and HDATES all-NaN masks,
+        and whether the dates were (incorrectly) saved daily.
+        """
+        i_times = np.where(self.dates_years == self.get_slice_year(this_year))[0]
+        if not i_times.size:
+            error(self.logger, f"No SDATES/HDATES timesteps found for netCDF year {this_year}")
+        for timestep in self.dates_ds["time"].values[i_times]:
+            print(timestep)
+
+        incorrectly_daily = i_times.size == 365
+        if incorrectly_daily:
+            i_time = i_times[-1]
+        elif i_times.size == 1:
+            i_time = i_times[0]
+        else:
+            error(self.logger, f"Expected 1 or 365 SDATES/HDATES timesteps, not {i_times.size}")
+
+        return (
+            self.dates_ds.isel(time=i_time).copy(deep=True),
+            self.sdates_all_nan[i_time, :],
+            self.hdates_all_nan[i_time, :],
+            incorrectly_daily,
+        )
+
+    def get_h2_ds(self, this_year):
+        """
+        Import GDDACCUM and GDDHARV for one year
+        """
+        h2_files = self.h2_files_by_year.get(this_year - 1)
+        if not h2_files:
+            error(self.logger, f"No h2 files found for year {this_year-1}")
+        return import_ds(
+            h2_files,
+            my_vars=["GDDACCUM", "GDDHARV"],
+            my_vegtypes=self.crops_to_read,
+            chunks=self.chunks,
+        )
+
+    def get_year_fingerprint(self, this_year):
+        """
+        Get a fingerprint of one year's inputs, for use in checkpoint keys: the year's SDATES and
+        HDATES values plus fingerprints of the year's h2 files
+        """
+        i_times = np.where(self.dates_years == self.get_slice_year(this_year))[0]
+        year_dates_ds = self.dates_ds.isel(time=i_times)
+        h2_fingerprints = [
+            get_file_fingerprint(f) for f in self.h2_files_by_year.get(this_year - 1, [])
+        ]
+        return hash_items(
+            year_dates_ds["patch"].values,
+            year_dates_ds["SDATES"].values,
+            year_dates_ds["HDATES"].values,
+            *h2_fingerprints,
+        )
+
+    def get_crop_patch_indices(self, h2_ds, vegtype_str):
+        """
+        Get indices (on the h2 patch dimension) of all patches of a given crop. These are cached
+        and only recomputed if the h2 patch list changes.
+        """
+        patches = h2_ds["patch"].values
+        if self._h2_patches is None or not np.array_equal(patches, self._h2_patches):
+            self._h2_patches = patches
+            self._crop_patch_indices = {}
+        if vegtype_str not in self._crop_patch_indices:
+            self._crop_patch_indices[vegtype_str] = np.where(
+                h2_ds["patches1d_itype_veg_str"].values == vegtype_str
+            )[0]
+        return self._crop_patch_indices[vegtype_str]
 
 
 def yp_list_to_ds(yp_list, daily_ds, incl_vegtypes_str, dates_rx, longname_prefix, logger):
@@ -239,6 +402,245 @@ def yp_list_to_ds(yp_list, daily_ds, incl_vegtypes_str, dates_rx, longname_prefi
     return ds_out
 
 
+def get_values_at_rx_hdates(values_tp, hdates_rx_p):
+    """
+    Given a (time, patch) array of daily values, get each patch's value on its prescribed harvest
+    date (day of year, 1-365) with a single fancy-indexing gather
+    """
+    i_times = hdates_rx_p.astype(int) - 1
+    return values_tp[i_times, np.arange(i_times.size)]
+
+
+def get_patch_indices(patchlist, patches):
+    """
+    Get the index in patchlist of each member of patches, or None if any are missing
+    """
+    patchlist = np.asarray(patchlist)
+    sorter = np.argsort(patchlist, kind="stable")
+    positions = np.searchsorted(patchlist, patches, sorter=sorter)
+    if np.any(positions >= patchlist.size):
+        return None
+    indices = sorter[positions]
+    if not np.array_equal(patchlist[indices], patches):
+        return None
+    return indices
+
+
+class _LogBuffer:
+    """
+    Logger stand-in for worker processes. Records messages so that the parent process can replay
+    them to the real logger, in crop order.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def info(self, string):
+        """
+        Record an INFO message
+        """
+        self.records.append(("info", string))
+
+    def error(self, string):
+        """
+        Record an ERROR message
+        """
+        self.records.append(("error", string))
+
+
+def replay_log_records(logger, log_records):
+    """
+    Send messages recorded by a _LogBuffer to the real logger, raising on the first error
+    """
+    for level, string in log_records:
+        if level == "error":
+            error(logger, string)
+        log(logger, string)
+
+
+def process_1crop_worker(crop_args):
+    """
+    Run process_1crop() in a worker process, recording (rather than printing) its log messages
+    """
+    log_buffer = _LogBuffer()
+    result = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            result = process_1crop(*crop_args, log_buffer)
+        except RuntimeError:
+            # Errors raised via error() are recorded and will be re-raised by the parent
+            if not any(level == "error" for level, _ in log_buffer.records):
+                raise
+    return log_buffer.records, result
+
+
+def process_1crop(
+    vegtype_str,
+    year_index,
+    incorrectly_daily,
+    save_figs,
+    this_crop_patches,
+    this_crop_full_patchlist,
+    gddaccum_tp,
+    gddharv_tp,
+    hdates_rx_p,
+    sdates_rx_p,
+    gddaccum_lastyr_p,
+    gddharv_lastyr_p,
+    last_year_active_patch_indices,
+    nanmask_output_sdates,
+    logger,
+):
+    """
+    Fill one year of one crop's GDD accumulation (and GDDHARV) at prescribed harvest
+
+    Works only on Numpy arrays, so that it can be run in a worker process. Only last year's rows of
+    the crop's (year, patch) GDD arrays are passed in (None if year_index is 0), since those are all
+    that this year's seasons can change. Returns the updated last year's rows (None if year_index is
+    0), this year's new rows, and this year's active patch indices.
+    """
+    log(logger, f"      {vegtype_str}...")
+    check_gddharv = save_figs
+
+    # Get the accumulated GDDs at each prescribed harvest date
+    if not np.all(this_crop_patches[:-1] <= this_crop_patches[1:]):
+        error(logger, "This code depends on DataArray patch list being sorted.")
+    if np.any(np.isnan(hdates_rx_p)):
+        error(logger, "Prescribed harvest date is NaN for some patch(es).")
+    gddaccum_atharv_p = get_values_at_rx_hdates(gddaccum_tp, hdates_rx_p)
+    if save_figs:
+        gddharv_atharv_p = get_values_at_rx_hdates(gddharv_tp, hdates_rx_p)
+    if np.any(np.isnan(gddaccum_atharv_p)):
+        log(
+            logger,
+            f"         ❗ {np.sum(np.isnan(gddaccum_atharv_p))}/{len(gddaccum_atharv_p)} "
+            + "NaN after extracting GDDs accumulated at harvest",
+        )
+    if save_figs and np.any(np.isnan(gddharv_atharv_p)):
+        if np.all(np.isnan(gddharv_atharv_p)):
+            log(logger, "         ❗ All GDDHARV are NaN; should only affect figure")
+            check_gddharv = False
+        else:
+            log(
+                logger,
+                f"         ❗ {np.sum(np.isnan(gddharv_atharv_p))}/{len(gddharv_atharv_p)} "
+                + "NaN after extracting GDDHARV",
+            )
+
+    # Assign these to growing seasons based on whether gs crossed new year
+    this_year_active_patch_indices = get_patch_indices(this_crop_full_patchlist, this_crop_patches)
+    if this_year_active_patch_indices is None:
+        error(logger, "Some of this year's patches are missing from the crop's full patch list.")
+    where_gs_thisyr = np.where(sdates_rx_p < hdates_rx_p)[0]
+    tmp_gddaccum = np.full(sdates_rx_p.shape, np.nan)
+    tmp_gddaccum[where_gs_thisyr] = gddaccum_atharv_p[where_gs_thisyr]
+    if save_figs:
+        tmp_gddharv = np.full(tmp_gddaccum.shape, np.nan)
+        tmp_gddharv[where_gs_thisyr] = gddharv_atharv_p[where_gs_thisyr]
+    if year_index > 0:
+        where_gs_lastyr = np.where(sdates_rx_p > hdates_rx_p)[0]
+        active_this_year_where_gs_lastyr_indices = this_year_active_patch_indices[where_gs_lastyr]
+        if not np.array_equal(last_year_active_patch_indices, this_year_active_patch_indices):
+            if incorrectly_daily:
+                log(
+                    logger,
+                    "         ❗ This year's active patch indices differ from last year's. "
+                    + "Allowing because this might just be an artifact of incorrectly daily "
+                    + "outputs, BUT RESULTS MUST NOT BE TRUSTED.",
+                )
+            else:
+                error(logger, "This year's active patch indices differ from last year's.")
+        # Make sure we're not about to overwrite any existing values.
+        if np.any(~np.isnan(gddaccum_lastyr_p[active_this_year_where_gs_lastyr_indices])):
+            if incorrectly_daily:
+                log(
+                    logger,
+                    "         ❗ Unexpected non-NaN for last season's GDD accumulation. "
+                    + "Allowing because this might just be an artifact of incorrectly daily "
+                    + "outputs, BUT RESULTS MUST NOT BE TRUSTED.",
+                )
+            else:
+                error(logger, "Unexpected non-NaN for last season's GDD accumulation")
+        if save_figs and np.any(
+            ~np.isnan(gddharv_lastyr_p[active_this_year_where_gs_lastyr_indices])
+        ):
+            if incorrectly_daily:
+                log(
+                    logger,
+                    "         ❗ Unexpected non-NaN for last season's GDDHARV. Allowing "
+                    + "because this might just be an artifact of incorrectly daily outputs, "
+                    + "BUT RESULTS MUST NOT BE TRUSTED.",
+                )
+            else:
+                error(logger, "Unexpected non-NaN for last season's GDDHARV")
+        # Fill.
+        gddaccum_lastyr_p[active_this_year_where_gs_lastyr_indices] = gddaccum_atharv_p[
+            where_gs_lastyr
+        ]
+        if save_figs:
+            gddharv_lastyr_p[active_this_year_where_gs_lastyr_indices] = gddharv_atharv_p[
+                where_gs_lastyr
+            ]
+        # Last year's season should be filled out now; make sure.
+        if np.any(np.isnan(gddaccum_lastyr_p[active_this_year_where_gs_lastyr_indices])):
+            if incorrectly_daily:
+                log(
+                    logger,
+                    "         ❗ Unexpected NaN for last season's GDD accumulation. Allowing "
+                    + "because this might just be an artifact of incorrectly daily outputs, "
+                    + "BUT RESULTS MUST NOT BE TRUSTED.",
+                )
+            else:
+                error(logger, "Unexpected NaN for last season's GDD accumulation.")
+        if (
+            save_figs
+            and check_gddharv
+            and np.any(np.isnan(gddharv_lastyr_p[active_this_year_where_gs_lastyr_indices]))
+        ):
+            if incorrectly_daily:
+                log(
+                    logger,
+                    "         ❗ Unexpected NaN for last season's GDDHARV. Allowing because "
+                    + "this might just be an artifact of incorrectly daily outputs, BUT "
+                    + "RESULTS MUST NOT BE TRUSTED.",
+                )
+            else:
+                error(logger, "Unexpected NaN for last season's GDDHARV.")
+    gddaccum_thisyr_p = np.full(len(this_crop_full_patchlist), np.nan)
+    gddaccum_thisyr_p[this_year_active_patch_indices] = tmp_gddaccum
+    gddharv_thisyr_p = None
+    if save_figs:
+        gddharv_thisyr_p = np.full(len(this_crop_full_patchlist), np.nan)
+        gddharv_thisyr_p[this_year_active_patch_indices] = tmp_gddharv
+
+    # Make sure that NaN masks are the same for this year's sdates and 'filled-out' GDDs from
+    # last year
+    if year_index > 0:
+        nanmask_output_gdds_lastyr = np.isnan(gddaccum_lastyr_p[:])
+        if not np.array_equal(nanmask_output_gdds_lastyr, nanmask_output_sdates):
+            if incorrectly_daily:
+                log(
+                    logger,
+                    "         ❗ NaN masks differ between this year's sdates and 'filled-out' "
+                    + "GDDs from last year. Allowing because this might just be an artifact of "
+                    + "incorrectly daily outputs, BUT RESULTS MUST NOT BE TRUSTED.",
+                )
+            else:
+                error(
+                    logger,
+                    "NaN masks differ between this year's sdates and 'filled-out' GDDs from "
+                    + "last year",
+                )
+
+    return (
+        gddaccum_lastyr_p,
+        gddaccum_thisyr_p,
+        gddharv_lastyr_p,
+        gddharv_thisyr_p,
+        this_year_active_patch_indices,
+    )
+
+
 def import_and_process_1yr(
     year_1,
     year_n,
@@ -251,7 +653,7 @@ def import_and_process_1yr(
     skip_patches_for_isel_nan_last_year,
     last_year_active_patch_indices_list,
     incorrectly_daily,
-    indir,
+    input_stream,
     incl_vegtypes_str_in,
     h2_ds_file,
     mxmats,
@@ -259,74 +661,29 @@ def import_and_process_1yr(
     skip_crops,
     outdir_figs,
     logger,
-    h1_instantaneous,
+    executor=None,
 ):
     """
     Import one year of CLM output data for GDD generation
+
+    - input_stream: A GddInputStream from which this year's data will be taken.
+    - executor: If provided (e.g., a concurrent.futures.ProcessPoolExecutor), crop types will be
+      processed in parallel using it. Otherwise they are processed serially.
     """
     save_figs = True
     log(logger, f"netCDF year {this_year}...")
     log(logger, dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
-    # Without dask, this can take a LONG time at resolutions finer than 2-deg
-    if importlib_util.find_spec("dask"):
-        chunks = {"time": 1}
-    else:
-        chunks = None
-
-    # Get h1 file (list)
-    h1_pattern = os.path.join(indir, "*h1.*.nc")
-    h1_filelist = glob.glob(h1_pattern)
-    if not h1_filelist:
-        h1_pattern = os.path.join(indir, "*h1.*.nc.base")
-        h1_filelist = glob.glob(h1_pattern)
-        if not h1_filelist:
-            error(logger, "No files found matching pattern '*h1.*.nc(.base)'")
-
-    # Get list of crops to include
-    if skip_crops is not None:
-        crops_to_read = [c for c in utils.define_mgdcrop_list_withgrasses() if c not in skip_crops]
-    else:
-        crops_to_read = utils.define_mgdcrop_list_withgrasses()
-
-    # Are h1 files instantaneous?
-    if h1_instantaneous is None:
-        h1_instantaneous = is_instantaneous(xr.open_dataset(h1_filelist[0])["time"])
-
-    if h1_instantaneous:
-        slice_year = this_year
-    else:
-        slice_year = this_year - 1
-    dates_ds = import_ds(
-        h1_filelist,
-        my_vars=["SDATES", "HDATES"],
-        my_vegtypes=crops_to_read,
-        time_slice=slice(f"{slice_year}-01-01", f"{slice_year}-12-31"),
-        chunks=chunks,
-    )
-    for timestep in dates_ds["time"].values:
-        print(timestep)
-
-    if dates_ds.dims["time"] > 1:
-        if dates_ds.dims["time"] == 365:
-            if not incorrectly_daily:
-                log(
-                    logger,
-                    "   ℹ️ You saved SDATES and HDATES daily, but you only needed annual. Fixing.",
-                )
-            incorrectly_daily = True
-            dates_ds = dates_ds.isel(time=-1)
-    else:
-        dates_ds = dates_ds.isel(time=0)
+    dates_ds, sdates_all_nan, hdates_all_nan, this_year_daily = input_stream.get_dates(this_year)
+    if this_year_daily:
+        if not incorrectly_daily:
+            log(
+                logger,
+                "   ℹ️ You saved SDATES and HDATES daily, but you only needed annual. Fixing.",
+            )
+        incorrectly_daily = True
 
     # Make sure NaN masks match
-    sdates_all_nan = (
-        np.sum(~np.isnan(dates_ds.SDATES.values), axis=dates_ds.SDATES.dims.index("mxsowings")) == 0
-    )
-    hdates_all_nan = (
-        np.sum(~np.isnan(dates_ds.HDATES.values), axis=dates_ds.HDATES.dims.index("mxharvests"))
-        == 0
-    )
     n_unmatched_nans = np.sum(sdates_all_nan != hdates_all_nan)
     if n_unmatched_nans > 0:
         error(logger, "Output SDATE and HDATE NaN masks do not match.")
@@ -560,26 +917,12 @@ def import_and_process_1yr(
 
     log(logger, "   Importing accumulated GDDs...")
     clm_gdd_var = "GDDACCUM"
-    my_vars = [clm_gdd_var, "GDDHARV"]
-    patterns = [f"*h2.{this_year-1}-01*.nc", f"*h2.{this_year-1}-01*.nc.base"]
-    for pat in patterns:
-        pattern = os.path.join(indir, pat)
-        h2_files = glob.glob(pattern)
-        if h2_files:
-            break
-    if not h2_files:
-        error(logger, f"No files found matching patterns: {patterns}")
-    h2_ds = import_ds(
-        h2_files,
-        my_vars=my_vars,
-        my_vegtypes=crops_to_read,
-        chunks=chunks,
-    )
+    h2_ds = input_stream.get_h2_ds(this_year)
 
     # Restrict to patches we're including
+    if not np.array_equal(dates_ds.patch.values, h2_ds.patch.values):
+        error(logger, "dates_ds and h2_ds don't have the same patch list!")
     if skipping_patches_for_isel_nan:
-        if not np.array_equal(dates_ds.patch.values, h2_ds.patch.values):
-            error(logger, "dates_ds and h2_ds don't have the same patch list!")
         h2_incl_ds = h2_ds.isel(patch=incl_patches_for_isel_nan)
     else:
         h2_incl_ds = h2_ds
@@ -597,30 +940,39 @@ def import_and_process_1yr(
             gddharv_yp_list = [None for vegtype_str in incl_vegtypes_str]
 
     incl_vegtype_indices = []
+    crop_results = {}
+    crop_futures = {}
+    # Log messages for skipped crops, held until the workers' messages are replayed so that the
+    # order matches the serial path
+    skip_log_records = {}
     for var, vegtype_str in enumerate(incl_vegtypes_str):
         if vegtype_str in skip_crops:
-            log(logger, f"      SKIPPING {vegtype_str}")
+            if executor is None:
+                log(logger, f"      SKIPPING {vegtype_str}")
+            else:
+                skip_log_records[var] = [("info", f"      SKIPPING {vegtype_str}")]
             continue
 
         vegtype_int = utils.vegtype_str2int(vegtype_str)[0]
-        this_crop_full_patchlist = list(xr_flexsel(h2_ds, vegtype=vegtype_str).patch.values)
+        this_crop_full_patch_indices = input_stream.get_crop_patch_indices(h2_ds, vegtype_str)
+        this_crop_full_patchlist = h2_ds.patch.values[this_crop_full_patch_indices]
 
         # Get time series for each patch of this type
-        this_crop_ds = xr_flexsel(h2_incl_ds, vegtype=vegtype_str)
+        this_crop_incl_indices = np.where(h2_incl_ds.patches1d_itype_veg_str.values == vegtype_str)[
+            0
+        ]
+        this_crop_ds = h2_incl_ds.isel(patch=this_crop_incl_indices)
         this_crop_gddaccum_da = this_crop_ds[clm_gdd_var]
-        if save_figs:
-            this_crop_gddharv_da = this_crop_ds["GDDHARV"]
-            check_gddharv = True
         if not this_crop_gddaccum_da.size:
             continue
-        log(logger, f"      {vegtype_str}...")
         incl_vegtype_indices = incl_vegtype_indices + [var]
 
-        # Get prescribed harvest dates for these patches
-        lon_points = this_crop_ds.patches1d_lon.values
-        lat_points = this_crop_ds.patches1d_lat.values
+        # Get prescribed sowing and harvest dates for these patches
         this_crop_hdates_rx = this_crop_map_to_patches(
-            lon_points, lat_points, hdates_rx, vegtype_int
+            h2_incl_ds, this_crop_incl_indices, hdates_rx, vegtype_int
+        )
+        this_crop_sdates_rx = this_crop_map_to_patches(
+            h2_incl_ds, this_crop_incl_indices, sdates_rx, vegtype_int
         )
 
         if isinstance(gddaccum_yp_list[var], type(None)):
@@ -628,177 +980,66 @@ def import_and_process_1yr(
             if save_figs:
                 gddharv_yp_list[var] = np.full((n_years + 1, len(this_crop_full_patchlist)), np.nan)
 
-        # Get the accumulated GDDs at each prescribed harvest date
-        gddaccum_atharv_p = np.full(this_crop_hdates_rx.shape, np.nan)
-        if save_figs:
-            gddharv_atharv_p = np.full(this_crop_hdates_rx.shape, np.nan)
-        unique_rx_hdates = np.unique(this_crop_hdates_rx.values)
-        # Build an indexing tuple
-        patches = []
-        i_patches = []
-        i_times = []
-        for hdate in unique_rx_hdates:
-            here = np.where(this_crop_hdates_rx.values == hdate)[0]
-            patches += list(this_crop_gddaccum_da.patch.values[here])
-            i_patches += list(here)
-            i_times += list(np.full((len(here),), int(hdate - 1)))
-        # Sort back to correct order
-        if not np.all(
-            this_crop_gddaccum_da.patch.values[:-1] <= this_crop_gddaccum_da.patch.values[1:]
-        ):
-            error(logger, "This code depends on DataArray patch list being sorted.")
-        sortorder = np.argsort(patches)
-        i_patches = list(np.array(i_patches)[np.array(sortorder)])
-        i_times = list(np.array(i_times)[np.array(sortorder)])
-        # Select using the indexing tuple
-        gddaccum_atharv_p = this_crop_gddaccum_da.values[(i_times, i_patches)]
-        if save_figs:
-            gddharv_atharv_p = this_crop_gddharv_da.values[(i_times, i_patches)]
-        if np.any(np.isnan(gddaccum_atharv_p)):
-            log(
-                logger,
-                f"         ❗ {np.sum(np.isnan(gddaccum_atharv_p))}/{len(gddaccum_atharv_p)} "
-                + "NaN after extracting GDDs accumulated at harvest",
+        # This year's sowing-date NaN mask, to be compared against last year's filled-out GDDs
+        nanmask_output_sdates = None
+        if year_index > 0:
+            nanmask_output_sdates = np.isnan(
+                dates_ds.SDATES.isel(mxsowings=0, patch=this_crop_full_patch_indices).values
             )
-        if save_figs and np.any(np.isnan(gddharv_atharv_p)):
-            if np.all(np.isnan(gddharv_atharv_p)):
-                log(logger, "         ❗ All GDDHARV are NaN; should only affect figure")
-                check_gddharv = False
-            else:
-                log(
-                    logger,
-                    f"         ❗ {np.sum(np.isnan(gddharv_atharv_p))}/{len(gddharv_atharv_p)} "
-                    + "NaN after extracting GDDHARV",
-                )
 
-        # Assign these to growing seasons based on whether gs crossed new year
-        this_year_active_patch_indices = [
-            this_crop_full_patchlist.index(x) for x in this_crop_ds.patch.values
-        ]
-        this_crop_sdates_rx = this_crop_map_to_patches(
-            lon_points, lat_points, sdates_rx, vegtype_int
-        )
-        where_gs_thisyr = np.where(this_crop_sdates_rx < this_crop_hdates_rx)[0]
-        tmp_gddaccum = np.full(this_crop_sdates_rx.shape, np.nan)
-        tmp_gddaccum[where_gs_thisyr] = gddaccum_atharv_p[where_gs_thisyr]
-        if save_figs:
-            tmp_gddharv = np.full(tmp_gddaccum.shape, np.nan)
-            tmp_gddharv[where_gs_thisyr] = gddharv_atharv_p[where_gs_thisyr]
+        # Only last year's rows are needed (and, for worker processes, pickled)
+        gddaccum_lastyr_p = None
+        gddharv_lastyr_p = None
         if year_index > 0:
-            last_year_active_patch_indices = last_year_active_patch_indices_list[var]
-            where_gs_lastyr = np.where(this_crop_sdates_rx > this_crop_hdates_rx)[0]
-            active_this_year_where_gs_lastyr_indices = [
-                this_year_active_patch_indices[x] for x in where_gs_lastyr
-            ]
-            if not np.array_equal(last_year_active_patch_indices, this_year_active_patch_indices):
-                if incorrectly_daily:
-                    log(
-                        logger,
-                        "         ❗ This year's active patch indices differ from last year's. "
-                        + "Allowing because this might just be an artifact of incorrectly daily "
-                        + "outputs, BUT RESULTS MUST NOT BE TRUSTED.",
-                    )
-                else:
-                    error(logger, "This year's active patch indices differ from last year's.")
-            # Make sure we're not about to overwrite any existing values.
-            if np.any(
-                ~np.isnan(
-                    gddaccum_yp_list[var][year_index - 1, active_this_year_where_gs_lastyr_indices]
-                )
-            ):
-                if incorrectly_daily:
-                    log(
-                        logger,
-                        "         ❗ Unexpected non-NaN for last season's GDD accumulation. "
-                        + "Allowing because this might just be an artifact of incorrectly daily "
-                        + "outputs, BUT RESULTS MUST NOT BE TRUSTED.",
-                    )
-                else:
-                    error(logger, "Unexpected non-NaN for last season's GDD accumulation")
-            if save_figs and np.any(
-                ~np.isnan(
-                    gddharv_yp_list[var][year_index - 1, active_this_year_where_gs_lastyr_indices]
-                )
-            ):
-                if incorrectly_daily:
-                    log(
-                        logger,
-                        "         ❗ Unexpected non-NaN for last season's GDDHARV. Allowing "
-                        + "because this might just be an artifact of incorrectly daily outputs, "
-                        + "BUT RESULTS MUST NOT BE TRUSTED.",
-                    )
-                else:
-                    error(logger, "Unexpected non-NaN for last season's GDDHARV")
-            # Fill.
-            gddaccum_yp_list[var][
-                year_index - 1, active_this_year_where_gs_lastyr_indices
-            ] = gddaccum_atharv_p[where_gs_lastyr]
+            gddaccum_lastyr_p = gddaccum_yp_list[var][year_index - 1, :]
             if save_figs:
-                gddharv_yp_list[var][
-                    year_index - 1, active_this_year_where_gs_lastyr_indices
-                ] = gddharv_atharv_p[where_gs_lastyr]
-            # Last year's season should be filled out now; make sure.
-            if np.any(
-                np.isnan(
-                    gddaccum_yp_list[var][year_index - 1, active_this_year_where_gs_lastyr_indices]
-                )
-            ):
-                if incorrectly_daily:
-                    log(
-                        logger,
-                        "         ❗ Unexpected NaN for last season's GDD accumulation. Allowing "
-                        + "because this might just be an artifact of incorrectly daily outputs, "
-                        + "BUT RESULTS MUST NOT BE TRUSTED.",
-                    )
-                else:
-                    error(logger, "Unexpected NaN for last season's GDD accumulation.")
-            if (
-                save_figs
-                and check_gddharv
-                and np.any(
-                    np.isnan(
-                        gddharv_yp_list[var][
-                            year_index - 1, active_this_year_where_gs_lastyr_indices
-                        ]
-                    )
-                )
-            ):
-                if incorrectly_daily:
-                    log(
-                        logger,
-                        "         ❗ Unexpected NaN for last season's GDDHARV. Allowing because "
-                        + "this might just be an artifact of incorrectly daily outputs, BUT "
-                        + "RESULTS MUST NOT BE TRUSTED.",
-                    )
-                else:
-                    error(logger, "Unexpected NaN for last season's GDDHARV.")
-        gddaccum_yp_list[var][year_index, this_year_active_patch_indices] = tmp_gddaccum
-        if save_figs:
-            gddharv_yp_list[var][year_index, this_year_active_patch_indices] = tmp_gddharv
+                gddharv_lastyr_p = gddharv_yp_list[var][year_index - 1, :]
+
+        crop_args = (
+            vegtype_str,
+            year_index,
+            incorrectly_daily,
+            save_figs,
+            this_crop_ds.patch.values,
+            this_crop_full_patchlist,
+            this_crop_gddaccum_da.values,
+            this_crop_ds["GDDHARV"].values if save_figs else None,
+            this_crop_hdates_rx,
+            this_crop_sdates_rx,
+            gddaccum_lastyr_p,
+            gddharv_lastyr_p,
+            last_year_active_patch_indices_list[var],
+            nanmask_output_sdates,
+        )
+        if executor is None:
+            crop_results[var] = process_1crop(*crop_args, logger)
+        else:
+            crop_futures[var] = executor.submit(process_1crop_worker, crop_args)
 
-        # Make sure that NaN masks are the same for this year's sdates and 'filled-out' GDDs from
-        # last year
+    # Collect results from worker processes in crop order, so that log messages (including those
+    # for skipped crops) and outputs are identical to those of the serial path
+    for var in sorted(set(crop_futures) | set(skip_log_records)):
+        if var in skip_log_records:
+            replay_log_records(logger, skip_log_records[var])
+            continue
+        log_records, crop_results[var] = crop_futures[var].result()
+        replay_log_records(logger, log_records)
+
+    for var, crop_result in crop_results.items():
+        (
+            gddaccum_lastyr_p,
+            gddaccum_thisyr_p,
+            gddharv_lastyr_p,
+            gddharv_thisyr_p,
+            this_year_active_patch_indices,
+        ) = crop_result
         if year_index > 0:
-            nanmask_output_sdates = np.isnan(
-                dates_ds.SDATES.isel(
-                    mxsowings=0, patch=np.where(dates_ds.patches1d_itype_veg_str == vegtype_str)[0]
-                ).values
-            )
-            nanmask_output_gdds_lastyr = np.isnan(gddaccum_yp_list[var][year_index - 1, :])
-            if not np.array_equal(nanmask_output_gdds_lastyr, nanmask_output_sdates):
-                if incorrectly_daily:
-                    log(
-                        logger,
-                        "         ❗ NaN masks differ between this year's sdates and 'filled-out' "
-                        + "GDDs from last year. Allowing because this might just be an artifact of "
-                        + "incorrectly daily outputs, BUT RESULTS MUST NOT BE TRUSTED.",
-                    )
-                else:
-                    error(
-                        logger,
-                        "NaN masks differ between this year's sdates and 'filled-out' GDDs from "
-                        + "last year",
-                    )
+            gddaccum_yp_list[var][year_index - 1, :] = gddaccum_lastyr_p
+        gddaccum_yp_list[var][year_index, :] = gddaccum_thisyr_p
+        if save_figs:
+            if year_index > 0:
+                gddharv_yp_list[var][year_index - 1, :] = gddharv_lastyr_p
+            gddharv_yp_list[var][year_index, :] = gddharv_thisyr_p
         last_year_active_patch_indices_list[var] = this_year_active_patch_indices
 
     skip_patches_for_isel_nan_last_year = skip_patches_for_isel_nan
@@ -819,7 +1060,6 @@ def import_and_process_1yr(
         incl_vegtypes_str,
         incl_patches1d_itype_veg,
         mxsowings,
-        h1_instantaneous,
     )
 
 
@@ -10,25 +10,19 @@ lon) of one variable within a Dataset.
 import numpy as np
 import xarray as xr
 from ctsm.crop_calendars.xr_flexsel import xr_flexsel
+from ctsm.crop_calendars.patch_grid_index import get_patch_grid_index
 
 
-def get_thisvar_da(var, this_ds):
+def get_spatial_unit(thisvar_da):
     """
-    Return a DataArray, with defined coordinates, for a given variable in a dataset.
+    Get the name of the ungridded spatial dimension of a DataArray
     """
-    # Make DataArray for this variable
-    thisvar_da = np.array(this_ds.variables[var])
-    these_dims = this_ds.variables[var].dims
-    thisvar_da = xr.DataArray(thisvar_da, dims=these_dims)
-
-    # Define coordinates of this variable's DataArray
-    dims_dict = dict()
-    for dim in these_dims:
-        dims_dict[dim] = this_ds[dim]
-    thisvar_da = thisvar_da.assign_coords(dims_dict)
-    thisvar_da.attrs = this_ds[var].attrs
-
-    return thisvar_da
+    for spatial_unit in ["patch", "gridcell"]:
+        if spatial_unit in thisvar_da.dims:
+            return spatial_unit
+    raise RuntimeError(
+        f"What variables to use for _ixy and _jxy of variable with dims {thisvar_da.dims}?"
+    )
 
 
 def convert_to_da(this_ds, var, fill_value, thisvar_da, new_dims, thisvar_gridded):
@@ -52,76 +46,6 @@ def convert_to_da(this_ds, var, fill_value, thisvar_da, new_dims, thisvar_gridde
     return thisvar_gridded
 
 
-def grid_the_data(thisvar_da, vt_da, ixy_da, jxy_da, new_dims, thisvar_gridded):
-    """
-    Fill lat-lon array with previously-ungridded data
-    """
-    fill_indices = []
-    for dim in new_dims:
-        if dim == "lat":
-            fill_indices.append(jxy_da.values.astype(int) - 1)
-        elif dim == "lon":
-            fill_indices.append(ixy_da.values.astype(int) - 1)
-        elif dim == "ivt_str":
-            fill_indices.append(vt_da)
-        elif not fill_indices:
-            # I.e., if fill_indices is empty. Could also do "elif len(fill_indices)==0".
-            fill_indices.append(Ellipsis)
-    try:
-        thisvar_gridded[tuple(fill_indices[: len(fill_indices)])] = thisvar_da.values
-    except:  # pylint: disable=bare-except
-        thisvar_gridded[tuple(fill_indices[: len(fill_indices)])] = thisvar_da.values.transpose()
-    if not np.any(np.bitwise_not(np.isnan(thisvar_gridded))):
-        if np.all(np.isnan(thisvar_da.values)):
-            print("Warning: This DataArray (and thus map) is all NaN")
-        else:
-            raise RuntimeError("thisvar_gridded was not filled!")
-
-
-def create_filled_array(this_ds, fill_value, thisvar_da, new_dims):
-    """
-    Create a Numpy array to be filled with gridded data
-    """
-    dim_size_list = []
-    for dim in new_dims:
-        if dim == "ivt_str":
-            dim_size = this_ds.sizes["ivt"]
-        elif dim in thisvar_da.coords:
-            dim_size = thisvar_da.sizes[dim]
-        else:
-            dim_size = this_ds.sizes[dim]
-        dim_size_list = dim_size_list + [dim_size]
-    thisvar_gridded = np.empty(dim_size_list)
-    if fill_value:
-        thisvar_gridded[:] = fill_value
-    else:
-        thisvar_gridded[:] = np.NaN
-    return thisvar_gridded
-
-
-def get_ixy_jxy_das(this_ds, var):
-    """
-    Get DataArrays needed for gridding
-    """
-    thisvar_da = get_thisvar_da(var, this_ds)
-    vt_da = None
-    if "patch" in thisvar_da.dims:
-        spatial_unit = "patch"
-        xy_1d_prefix = "patches"
-        if "patches1d_itype_veg" in this_ds:
-            vt_da = get_thisvar_da("patches1d_itype_veg", this_ds)
-    elif "gridcell" in thisvar_da.dims:
-        spatial_unit = "gridcell"
-        xy_1d_prefix = "grid"
-    else:
-        raise RuntimeError(
-            f"What variables to use for _ixy and _jxy of variable with dims {thisvar_da.dims}?"
-        )
-    ixy_da = get_thisvar_da(xy_1d_prefix + "1d_ixy", this_ds)
-    jxy_da = get_thisvar_da(xy_1d_prefix + "1d_jxy", this_ds)
-    return thisvar_da, vt_da, spatial_unit, ixy_da, jxy_da
-
-
 def get_new_dim_list(this_ds, thisvar_da, spatial_unit):
     """
     Get new dimension list
@@ -139,41 +63,84 @@ def get_new_dim_list(this_ds, thisvar_da, spatial_unit):
     return new_dims
 
 
-def grid_one_variable(this_ds, var, fill_value=None, **kwargs):
+def get_fill_value(thisvar_da, fill_value):
     """
-    Make a geographically gridded DataArray (with dimensions time, vegetation type [as string], lat,
-    lon) of one variable within a Dataset.
-
-    - Optional keyword arguments will be passed to xr_flexsel() to select single steps or slices
-      along the specified ax(ie)s.
-    - fill_value: Default None means grid will be filled with NaN, unless the variable in question
-      already has a _FillValue, in which case that will be used.
+    Get the fill value to use for a variable: fill_value if given, otherwise the variable's
+    _FillValue attribute (if any)
     """
-    # Get this Dataset's values for selection(s), if provided
-    this_ds = xr_flexsel(this_ds, **kwargs)
-
-    # Get DataArrays needed for gridding
-    thisvar_da, vt_da, spatial_unit, ixy_da, jxy_da = get_ixy_jxy_das(this_ds, var)
-
     if not fill_value and "_FillValue" in thisvar_da.attrs:
         fill_value = thisvar_da.attrs["_FillValue"]
+    return fill_value
 
-    # Renumber vt_da to work as indices on new ivt dimension, if needed.
-    ### Ensures that the unique set of vt_da values begins with 1 and
-    ### contains no missing steps.
-    if "ivt" in this_ds and vt_da is not None:
-        vt_da.values = np.array([np.where(this_ds.ivt.values == x)[0][0] for x in vt_da.values])
 
-    # Get new dimension list
-    new_dims = get_new_dim_list(this_ds, thisvar_da, spatial_unit)
+def grid_variables(this_ds, varlist, fill_value=None, dtype=np.float64, **kwargs):
+    """
+    Make geographically gridded DataArrays (each with dimensions time, vegetation type [as string],
+    lat, lon) of multiple variables within a Dataset, returning them in a new Dataset.
 
-    # Create a Numpy array to be filled with gridded data
-    thisvar_gridded = create_filled_array(this_ds, fill_value, thisvar_da, new_dims)
+    - Optional keyword arguments will be passed to xr_flexsel() to select single steps or slices
+      along the specified ax(ie)s. This is done once for all variables.
+    - fill_value: Default None means each grid will be filled with NaN, unless the variable in
+      question already has a _FillValue, in which case that will be used.
+    - dtype: Data type of the gridded arrays. E.g., np.float32 halves the memory used.
+
+    The patch-to-grid index is computed once and shared by all variables. Variables with the same
+    dimensions are gridded into slices of one preallocated array, to which the output DataArrays are
+    views.
+    """
+    # Get this Dataset's values for selection(s), if provided
+    this_ds = xr_flexsel(this_ds, **kwargs)
 
-    # Fill lat-lon array with previously-ungridded data
-    grid_the_data(thisvar_da, vt_da, ixy_da, jxy_da, new_dims, thisvar_gridded)
+    # Group variables by spatial unit and output dimensions
+    groups = {}
+    for var in varlist:
+        thisvar_da = this_ds[var]
+        spatial_unit = get_spatial_unit(thisvar_da)
+        new_dims = get_new_dim_list(this_ds, thisvar_da, spatial_unit)
+        groups.setdefault((spatial_unit, tuple(new_dims)), []).append(var)
+
+    gridded_das = {}
+    for (spatial_unit, new_dims), group_vars in groups.items():
+        grid_index = get_patch_grid_index(this_ds, spatial_unit)
+        include_ivt = "ivt_str" in new_dims
+        other_dims = [d for d in this_ds[group_vars[0]].dims if d != spatial_unit]
+        out_shape = tuple(this_ds.sizes[d] for d in other_dims)
+        if include_ivt:
+            out_shape += (grid_index.n_ivt,)
+        out_shape += grid_index.grid_shape
+        gridded_block = np.empty((len(group_vars),) + out_shape, dtype=dtype)
+
+        for i, var in enumerate(group_vars):
+            thisvar_da = this_ds[var]
+            var_fill_value = get_fill_value(thisvar_da, fill_value)
+
+            # Fill lat-lon array with previously-ungridded data
+            values = thisvar_da.transpose(*other_dims, spatial_unit).values
+            if np.all(np.isnan(values)):
+                print(f"Warning: {var} DataArray (and thus map) is all NaN")
+            grid_index.grid(
+                values,
+                fill_value=var_fill_value if var_fill_value else np.nan,
+                include_ivt=include_ivt,
+                out=gridded_block[i],
+            )
+
+            # Convert Numpy array to DataArray with coordinates, attributes and name
+            gridded_das[var] = convert_to_da(
+                this_ds, var, var_fill_value, thisvar_da, list(new_dims), gridded_block[i]
+            )
+
+    return xr.Dataset({var: gridded_das[var] for var in varlist})
 
-    # Convert Numpy array to DataArray with coordinates, attributes and name
-    thisvar_gridded = convert_to_da(this_ds, var, fill_value, thisvar_da, new_dims, thisvar_gridded)
 
-    return thisvar_gridded
+def grid_one_variable(this_ds, var, fill_value=None, **kwargs):
+    """
+    Make a geographically gridded DataArray (with dimensions time, vegetation type [as string], lat,
+    lon) of one variable within a Dataset.
+
+    - Optional keyword arguments will be passed to xr_flexsel() to select single steps or slices
+      along the specified ax(ie)s.
+    - fill_value: Default None means grid will be filled with NaN, unless the variable in question
+      already has a _FillValue, in which case that will be used.
+    """
+    return grid_variables(this_ds, [var], fill_value=fill_value, **kwargs)[var]
@@ -2,11 +2,14 @@
 Import a dataset that can be spread over multiple files, only including specified variables
 and/or vegetation types and/or timesteps, concatenating by time.
 
-- DOES actually read the dataset into memory, but only AFTER dropping unwanted variables and/or
-    vegetation types.
+- DOES actually read the dataset into memory (unless lazy=True), but only AFTER dropping unwanted
+    variables, vegetation types, and timesteps.
 """
 import re
+import hashlib
 import warnings
+from collections import OrderedDict
+from functools import lru_cache
 from importlib.util import find_spec
 import numpy as np
 import xarray as xr
@@ -14,6 +17,21 @@ from ctsm.utils import is_instantaneous
 import ctsm.crop_calendars.cropcal_utils as utils
 from ctsm.crop_calendars.xr_flexsel import xr_flexsel
 
+# Chunking strategies that can be given as import_ds(chunks=...)
+CHUNK_STRATEGIES = ["time", "patch", "auto"]
+
+# Number of patches per chunk in the "patch" chunking strategy
+PATCH_CHUNK_SIZE = 50000
+
+# Vegetation type metadata derived by mfdataset_preproc(), keyed on patch layout. See
+# get_patch_metadata(). Only the most recently used PATCH_METADATA_CACHE_SIZE entries are kept.
+PATCH_METADATA_CACHE_SIZE = 16
+_PATCH_METADATA_CACHE = OrderedDict()
+
+# Number of distinct variable-name lists for which get_pft2patch_dict() and get_oned_vars() results
+# are kept
+VAR_NAMES_CACHE_SIZE = 64
+
 
 def compute_derived_vars(ds_in, var):
     """
@@ -43,26 +61,171 @@ def compute_derived_vars(ds_in, var):
     return ds_in
 
 
+def dask_is_available():
+    """
+    Check whether dask is installed
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings(action="ignore", category=DeprecationWarning)
+        return find_spec("dask") is not None
+
+
+def get_chunks(chunks, filename):
+    """
+    Convert a chunking strategy into a chunks dict for xarray, given the first file to be imported.
+    Anything other than one of CHUNK_STRATEGIES is passed through unchanged.
+
+    - "time": One chunk per timestep. Best for reading a few timesteps at a time.
+    - "patch": Chunks of PATCH_CHUNK_SIZE patches, each spanning all timesteps in a file. Best for
+      reading whole time series of a subset of patches (e.g., one crop).
+    - "auto": Match the layout of the file: its own chunking if it's a chunked (netCDF-4) file, or
+      one chunk per timestep if time is its record (unlimited) dimension. Otherwise, let dask
+      decide.
+    """
+    if not isinstance(chunks, str):
+        return chunks
+    if chunks not in CHUNK_STRATEGIES:
+        raise ValueError(
+            f"Unknown chunking strategy '{chunks}'; expected one of {CHUNK_STRATEGIES}"
+        )
+
+    with xr.open_dataset(filename, decode_times=False) as this_ds:
+        dims = list(this_ds.dims)
+        if chunks == "auto":
+            if any(this_ds[v].encoding.get("chunksizes") for v in this_ds.data_vars):
+                # Use the file's own chunks
+                return {}
+            if "time" in this_ds.encoding.get("unlimited_dims", set()):
+                chunks = "time"
+            else:
+                return "auto"
+
+    chunks_dict = {}
+    if chunks == "time" and "time" in dims:
+        chunks_dict["time"] = 1
+    elif chunks == "patch":
+        if "time" in dims:
+            chunks_dict["time"] = -1
+        for dim in ["patch", "pft"]:
+            if dim in dims:
+                chunks_dict[dim] = PATCH_CHUNK_SIZE
+    return chunks_dict
+
+
 def manual_mfdataset(filelist, my_vars, my_vegtypes, time_slice):
     """
     Opening a list of files with Xarray's open_mfdataset requires dask. This function is a
     workaround for Python environments that don't have dask.
+
+    Each file is opened lazily and reduced to the requested variables, vegetation types, and
+    timesteps before anything is read; the reduced Datasets are then concatenated in one pass.
     """
-    ds_out = None
+    ds_list = []
     for filename in filelist:
         ds_in = xr.open_dataset(filename)
-        ds_in = mfdataset_preproc(ds_in, my_vars, my_vegtypes, time_slice)
-        if ds_out is None:
-            ds_out = ds_in
-        else:
-            ds_out = xr.concat(
-                [ds_out, ds_in],
-                data_vars="minimal",
-                compat="override",
-                coords="all",
-                dim="time",
-            )
-    return ds_out
+        ds_list.append(mfdataset_preproc(ds_in, my_vars, my_vegtypes, time_slice))
+    if len(ds_list) == 1:
+        return ds_list[0]
+    return xr.concat(
+        ds_list,
+        data_vars="minimal",
+        compat="override",
+        coords="all",
+        dim="time",
+    )
+
+
+@lru_cache(maxsize=VAR_NAMES_CACHE_SIZE)
+def get_pft2patch_dict(var_names):
+    """
+    Get the dict for renaming the "pft" dimension and all like-named variables (e.g.,
+    pfts1d_itype_veg) to "patch", given a tuple of the variable names in a Dataset
+    """
+    pattern = re.compile("pft.*1d")
+    matches = [x for x in var_names if pattern.search(x) is not None]
+    pft2patch_dict = {"pft": "patch"}
+    for match in matches:
+        pft2patch_dict[match] = match.replace("pft", "patch").replace("patchs", "patches")
+    return pft2patch_dict
+
+
+@lru_cache(maxsize=VAR_NAMES_CACHE_SIZE)
+def get_oned_vars(dim, var_names):
+    """
+    Get the _1d variables associated with a dimension, given a tuple of the variable names in a
+    Dataset
+    """
+    pattern = re.compile(f"{dim}.*1d")
+    return [x for x in var_names if pattern.search(x) is not None]
+
+
+def get_patch_signature(patches1d_itype_veg):
+    """
+    Get a hashable signature of a patch layout, given the integer vegetation type of each patch
+    """
+    patches1d_itype_veg = np.ascontiguousarray(patches1d_itype_veg)
+    return (
+        str(patches1d_itype_veg.dtype),
+        patches1d_itype_veg.shape,
+        hashlib.sha256(patches1d_itype_veg.tobytes()).hexdigest(),
+    )
+
+
+def get_patch_metadata(patches1d_itype_veg, vegtypes_to_import):
+    """
+    Get the vegetation type metadata that mfdataset_preproc() adds to each file, given the integer
+    vegetation type of each patch. Memoized on the patch layout (keeping the most recently used
+    PATCH_METADATA_CACHE_SIZE layouts), so that a history series with thousands of files sharing
+    one layout is only parsed once per session.
+
+    Returns a dict with:
+    - vegtype_da: DataArray of all vegetation type names
+    - patches1d_itype_veg_str: DataArray of each patch's vegetation type name
+    - patch_indices: Indices of patches of the vegetation types to import (None for all)
+    - ivt_mask: Boolean mask of vegtype_da members to import (None for all)
+
+    Callers must not modify the returned DataArrays in place.
+    """
+    if vegtypes_to_import is not None:
+        if not isinstance(vegtypes_to_import, list):
+            vegtypes_to_import = [vegtypes_to_import]
+        if isinstance(vegtypes_to_import[0], str):
+            vegtypes_to_import = utils.vegtype_str2int(vegtypes_to_import)
+        vegtypes_key = tuple(vegtypes_to_import)
+    else:
+        vegtypes_key = None
+    key = (get_patch_signature(patches1d_itype_veg), vegtypes_key)
+    if key in _PATCH_METADATA_CACHE:
+        _PATCH_METADATA_CACHE.move_to_end(key)
+        return _PATCH_METADATA_CACHE[key]
+
+    this_pftlist = utils.define_pftlist()
+    vegtype_da = utils.get_vegtype_str_da(this_pftlist)
+    npatch = len(patches1d_itype_veg)
+    patches1d_itype_veg_str = xr.DataArray(
+        vegtype_da.values[patches1d_itype_veg],
+        coords={"patch": np.arange(0, npatch)},
+        dims=["patch"],
+        name="patches1d_itype_veg_str",
+    )
+
+    patch_indices = None
+    ivt_mask = None
+    if vegtypes_to_import is not None:
+        is_vegtype = utils.is_each_vegtype(patches1d_itype_veg, vegtypes_to_import, "ok_exact")
+        patch_indices = np.where(is_vegtype)[0]
+        ivt_mask = utils.is_each_vegtype(vegtype_da.ivt.values, vegtypes_to_import, "ok_exact")
+
+    metadata = {
+        "vegtype_da": vegtype_da,
+        "patches1d_itype_veg_str": patches1d_itype_veg_str,
+        "patch_indices": patch_indices,
+        "ivt_mask": ivt_mask,
+    }
+    _PATCH_METADATA_CACHE[key] = metadata
+    while len(_PATCH_METADATA_CACHE) > PATCH_METADATA_CACHE_SIZE:
+        _PATCH_METADATA_CACHE.popitem(last=False)
+    return metadata
 
 
 def mfdataset_preproc(ds_in, vars_to_import, vegtypes_to_import, time_slice):
@@ -77,12 +240,7 @@ def mfdataset_preproc(ds_in, vars_to_import, vegtypes_to_import, time_slice):
     """
     # Rename "pft" dimension and variables to "patch", if needed
     if "pft" in ds_in.dims:
-        pattern = re.compile("pft.*1d")
-        matches = [x for x in list(ds_in.keys()) if pattern.search(x) is not None]
-        pft2patch_dict = {"pft": "patch"}
-        for match in matches:
-            pft2patch_dict[match] = match.replace("pft", "patch").replace("patchs", "patches")
-        ds_in = ds_in.rename(pft2patch_dict)
+        ds_in = ds_in.rename(get_pft2patch_dict(tuple(ds_in.keys())))
 
     derived_vars = []
     if vars_to_import is not None:
@@ -101,10 +259,9 @@ def mfdataset_preproc(ds_in, vars_to_import, vegtypes_to_import, time_slice):
         # gridding. Also, if any dimension is "pft", set up to rename it and all like-named
         # variables to "patch"
         oned_vars = []
+        var_names = tuple(ds_in.keys())
         for dim in dim_list:
-            pattern = re.compile(f"{dim}.*1d")
-            matches = [x for x in list(ds_in.keys()) if pattern.search(x) is not None]
-            oned_vars = list(set(oned_vars + matches))
+            oned_vars = list(set(oned_vars + get_oned_vars(dim, var_names)))
 
         # Add dimensions and _1d variables to vars_to_import
         vars_to_import = list(set(vars_to_import + list(ds_in.dims) + oned_vars))
@@ -124,33 +281,30 @@ def mfdataset_preproc(ds_in, vars_to_import, vegtypes_to_import, time_slice):
         # Drop them
         ds_in = ds_in.drop_vars(vars_to_drop)
 
-    # Add vegetation type info
+    # Restrict to time slice, if any. Doing this before anything else that touches the data means
+    # that no timesteps outside the slice are ever read.
+    if time_slice:
+        ds_in = utils.safer_timeslice(ds_in, time_slice)
+
+    # Add vegetation type info and restrict to veg. types of interest, if any
     if "patches1d_itype_veg" in list(ds_in):
-        this_pftlist = utils.define_pftlist()
-        utils.get_patch_ivts(
-            ds_in, this_pftlist
-        )  # Includes check of whether vegtype changes over time anywhere
-        vegtype_da = utils.get_vegtype_str_da(this_pftlist)
-        patches1d_itype_veg_str = vegtype_da.values[
-            ds_in.isel(time=0).patches1d_itype_veg.values.astype(int)
-        ]
-        npatch = len(patches1d_itype_veg_str)
-        patches1d_itype_veg_str = xr.DataArray(
-            patches1d_itype_veg_str,
-            coords={"patch": np.arange(0, npatch)},
-            dims=["patch"],
-            name="patches1d_itype_veg_str",
+        patches1d_itype_veg = ds_in.patches1d_itype_veg
+        patches1d_itype_veg.values = patches1d_itype_veg.values.astype(int)
+        metadata = get_patch_metadata(
+            ds_in.isel(time=0).patches1d_itype_veg.values, vegtypes_to_import
         )
-        ds_in = xr.merge([ds_in, vegtype_da, patches1d_itype_veg_str])
-
-    # Restrict to veg. types of interest, if any
-    if vegtypes_to_import is not None:
+        ds_in = xr.merge(
+            [
+                ds_in,
+                metadata["vegtype_da"].copy(deep=True),
+                metadata["patches1d_itype_veg_str"].copy(deep=True),
+            ]
+        )
+        if metadata["patch_indices"] is not None:
+            ds_in = ds_in.isel(patch=metadata["patch_indices"], ivt=metadata["ivt_mask"])
+    elif vegtypes_to_import is not None:
         ds_in = xr_flexsel(ds_in, vegtype=vegtypes_to_import)
 
-    # Restrict to time slice, if any
-    if time_slice:
-        ds_in = utils.safer_timeslice(ds_in, time_slice)
-
     # Finish import
     ds_in = xr.decode_cf(ds_in, decode_times=True)
 
@@ -199,13 +353,18 @@ def import_ds(
     my_vars_missing_ok=None,
     rename_lsmlatlon=False,
     chunks=None,
+    lazy=False,
 ):
     """
     Import a dataset that can be spread over multiple files, only including specified variables
     and/or vegetation types and/or timesteps, concatenating by time.
 
     - DOES actually read the dataset into memory, but only AFTER dropping unwanted variables and/or
-      vegetation types.
+      vegetation types and/or timesteps. (Exception: With dask, multiple files are returned
+      lazily.)
+    - If lazy, return a dask-backed Dataset without reading any data. Requires dask.
+    - chunks can be a dict (passed to xarray) or one of CHUNK_STRATEGIES (see get_chunks()). It's
+      ignored if dask is unavailable.
     """
     filelist, my_vars, my_vegtypes, my_vars_missing_ok = process_inputs(
         filelist, my_vars, my_vegtypes, my_vars_missing_ok
@@ -219,9 +378,9 @@ def import_ds(
     if time_slice:
         new_filelist = []
         for file in sorted(filelist):
-            filetime = xr.open_dataset(file).time
-            filetime_sel = utils.safer_timeslice(filetime, time_slice)
-            include_this_file = filetime_sel.size
+            with xr.open_dataset(file) as this_ds:
+                filetime_sel = utils.safer_timeslice(this_ds.time, time_slice)
+                include_this_file = filetime_sel.size
             if include_this_file:
                 new_filelist.append(file)
 
@@ -239,15 +398,23 @@ def import_ds(
     # directly, but that's bad practice as it could lead to scoping issues.
     mfdataset_preproc_closure = lambda ds: mfdataset_preproc(ds, my_vars, my_vegtypes, time_slice)
 
+    # Resolve chunking. Without dask, xarray can't chunk; everything is read into memory instead.
+    have_dask = dask_is_available()
+    if lazy and not have_dask:
+        raise RuntimeError("import_ds(lazy=True) requires dask")
+    if have_dask:
+        if lazy and chunks is None:
+            chunks = "auto"
+        chunks = get_chunks(chunks, sorted(filelist)[0])
+    else:
+        chunks = None
+
     # Import
     if isinstance(filelist, list) and len(filelist) == 1:
         filelist = filelist[0]
     if isinstance(filelist, list):
-        with warnings.catch_warnings():
-            warnings.filterwarnings(action="ignore", category=DeprecationWarning)
-            dask_unavailable = find_spec("dask") is None
-        if dask_unavailable:
-            this_ds = manual_mfdataset(filelist, my_vars, my_vegtypes, time_slice)
+        if not have_dask:
+            this_ds = manual_mfdataset(sorted(filelist), my_vars, my_vegtypes, time_slice)
         else:
             this_ds = xr.open_mfdataset(
                 sorted(filelist),
@@ -262,7 +429,8 @@ def import_ds(
     elif isinstance(filelist, str):
         this_ds = xr.open_dataset(filelist, chunks=chunks)
         this_ds = mfdataset_preproc(this_ds, my_vars, my_vegtypes, time_slice)
-        this_ds = this_ds.compute()
+        if not lazy:
+            this_ds = this_ds.compute()
 
     # Warn and/or error about variables that couldn't be imported or derived
     if my_vars:
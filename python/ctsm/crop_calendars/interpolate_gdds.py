@@ -17,6 +17,11 @@ from ctsm import ctsm_logging  # pylint: disable=wrong-import-position
 from ctsm.crop_calendars.cropcal_module import (  # pylint: disable=wrong-import-position
     unexpected_negative_rx_gdd,
 )
+from ctsm.netcdf_output import (  # pylint: disable=wrong-import-position
+    add_netcdf_output_args,
+    netcdf_output_options_from_args,
+    write_netcdf,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -85,6 +90,7 @@ def _setup_process_args():
         action="store_true",
         required=False,
     )
+    add_netcdf_output_args(parser)
     ctsm_logging.add_logging_args(parser)
 
     # Get arguments
@@ -146,7 +152,12 @@ def interpolate_gdds(args):
     ds_out.attrs["interpolation_target"] = args.target_file
     ds_out.attrs["interpolation_script"] = os.path.basename(__file__)
     if not args.dry_run:
-        ds_out.to_netcdf(args.output_file, format=OUTPUT_FORMAT)
+        write_netcdf(
+            ds_out,
+            args.output_file,
+            netcdf_output_options_from_args(args),
+            default_format=OUTPUT_FORMAT,
+        )
     else:
         print("Dry run looks good!")
 
@@ -0,0 +1,173 @@
+"""
+Index from patches (or gridcells) to the lat-lon grid, for gridding and ungridding
+
+A PatchGridIndex holds, for each patch, its lat, lon, and (optionally) vegetation type index. It's
+built once per Dataset and cached on it (see get_patch_grid_index()), so that gridding or
+ungridding any number of variables reuses the same index arrays. Gridding writes directly into the
+output array and ungridding reads directly from the input array, with no intermediate copies.
+"""
+import hashlib
+import numpy as np
+import xarray as xr
+
+
+class PatchGridIndex:
+    """
+    Index from patches to a lat-lon grid (and optionally a vegetation type axis)
+    """
+
+    def __init__(self, lat_index, lon_index, grid_shape=None, ivt_index=None, n_ivt=None):
+        self.lat_index = np.asarray(lat_index, dtype=np.int64)
+        self.lon_index = np.asarray(lon_index, dtype=np.int64)
+        if self.lat_index.shape != self.lon_index.shape:
+            raise RuntimeError("lat_index and lon_index must have the same shape")
+        self.n_patch = self.lat_index.size
+        self.grid_shape = grid_shape
+        self.ivt_index = None if ivt_index is None else np.asarray(ivt_index, dtype=np.int64)
+        self.n_ivt = n_ivt
+
+    @classmethod
+    def from_dataset(cls, this_ds, spatial_unit="patch"):
+        """
+        Build from a Dataset's 1-based {patches,grid}1d_ixy and _jxy variables. If spatial_unit is
+        patch and the Dataset has an ivt dimension, also include the index of each patch's
+        vegetation type along it.
+        """
+        if spatial_unit == "patch":
+            xy_1d_prefix = "patches"
+        elif spatial_unit == "gridcell":
+            xy_1d_prefix = "grid"
+        else:
+            raise RuntimeError(f"What variables to use for _ixy and _jxy of {spatial_unit}?")
+        lon_index = this_ds[xy_1d_prefix + "1d_ixy"].values.astype(int) - 1
+        lat_index = this_ds[xy_1d_prefix + "1d_jxy"].values.astype(int) - 1
+        grid_shape = None
+        if "lat" in this_ds.sizes and "lon" in this_ds.sizes:
+            grid_shape = (this_ds.sizes["lat"], this_ds.sizes["lon"])
+
+        ivt_index = None
+        n_ivt = None
+        if spatial_unit == "patch" and "ivt" in this_ds and "patches1d_itype_veg" in this_ds:
+            ivt_index = get_indices_in(
+                this_ds.ivt.values, this_ds.patches1d_itype_veg.values.astype(int), "ivt"
+            )
+            n_ivt = this_ds.sizes["ivt"]
+        return cls(lat_index, lon_index, grid_shape, ivt_index, n_ivt)
+
+    @classmethod
+    def from_lonlat(cls, patches1d_lon, patches1d_lat, lon, lat):
+        """
+        Build from the longitude and latitude of each patch, given the grid's lon and lat
+        coordinates. Like Dataset.sel(), these must match exactly.
+        """
+        lon_index = get_indices_in(np.asarray(lon), np.asarray(patches1d_lon), "lon")
+        lat_index = get_indices_in(np.asarray(lat), np.asarray(patches1d_lat), "lat")
+        return cls(lat_index, lon_index, (len(lat), len(lon)))
+
+    def _get_indices(self, include_ivt, patches):
+        """
+        Get the tuple of index arrays (for the trailing axes of a gridded array)
+        """
+        indices = [self.lat_index, self.lon_index]
+        if include_ivt:
+            if self.ivt_index is None:
+                raise RuntimeError("This PatchGridIndex has no vegetation type index")
+            indices = [self.ivt_index] + indices
+        if patches is not None:
+            indices = [x[patches] for x in indices]
+        return tuple(indices)
+
+    def grid(self, values, fill_value=np.nan, dtype=np.float64, include_ivt=None, out=None):
+        """
+        Grid an array whose last axis is patch. Any leading axes (e.g., time, or a stack of
+        variables) are kept. Returns an array with shape (..., [ivt,] lat, lon). If include_ivt is
+        None, the ivt axis is included if this index has one.
+
+        If out is given, it's filled with fill_value and the values are written into it (instead of
+        into a newly allocated array); fill_value=None leaves out's existing contents as background.
+        """
+        if self.grid_shape is None:
+            raise RuntimeError("This PatchGridIndex doesn't know the grid's shape")
+        if include_ivt is None:
+            include_ivt = self.ivt_index is not None
+        values = np.asarray(values)
+        if values.shape[-1] != self.n_patch:
+            raise RuntimeError(
+                f"Expected last axis of length {self.n_patch}; got shape {values.shape}"
+            )
+        out_shape = values.shape[:-1]
+        if include_ivt:
+            out_shape += (self.n_ivt,)
+        out_shape += self.grid_shape
+        if out is None:
+            gridded = np.full(out_shape, fill_value, dtype=dtype)
+        else:
+            if out.shape != out_shape:
+                raise RuntimeError(f"Expected out of shape {out_shape}; got {out.shape}")
+            gridded = out
+            if fill_value is not None:
+                gridded.fill(fill_value)
+        gridded[(Ellipsis,) + self._get_indices(include_ivt, None)] = values
+        return gridded
+
+    def ungrid(self, gridded, include_ivt=False, patches=None):
+        """
+        Ungrid an array with shape (..., [ivt,] lat, lon). Any leading axes are kept. Returns an
+        array with shape (..., patch). If patches is given, only those patches are returned.
+        """
+        return np.asarray(gridded)[(Ellipsis,) + self._get_indices(include_ivt, patches)]
+
+
+def get_indices_in(coord_values, values, name):
+    """
+    Get the index in coord_values of each member of values, raising an error if any are missing
+    """
+    order = np.argsort(coord_values, kind="stable")
+    sorted_coord = coord_values[order]
+    positions = np.clip(np.searchsorted(sorted_coord, values), 0, len(sorted_coord) - 1)
+    missing = sorted_coord[positions] != values
+    if np.any(missing):
+        raise RuntimeError(f"{name} value(s) not found: {np.unique(values[missing])}")
+    return order[positions]
+
+
+@xr.register_dataset_accessor("_patch_grid_index_cache")
+class _PatchGridIndexCache:
+    """
+    Per-Dataset cache of PatchGridIndex objects. xarray creates one instance of this per Dataset
+    object, so operations that make a new Dataset (e.g., isel()) automatically get a new cache.
+    """
+
+    def __init__(self, _this_ds):
+        self.indices = {}
+
+
+def get_patch_grid_index(this_ds, spatial_unit="patch", grid_ds=None):
+    """
+    Get the PatchGridIndex for a Dataset, building it on first use.
+
+    If grid_ds is given, the index maps this_ds's patches (by patches1d_lon and patches1d_lat) onto
+    grid_ds's lon-lat grid. Otherwise, it's built from this_ds's _ixy and _jxy variables.
+
+    The index is cached on this_ds, so changing its _ixy, _jxy, or lon/lat variables in place after
+    the first call is not supported.
+    """
+    if grid_ds is None:
+        key = spatial_unit
+    else:
+        key = (
+            hashlib.sha256(np.ascontiguousarray(grid_ds.lon.values).tobytes()).hexdigest(),
+            hashlib.sha256(np.ascontiguousarray(grid_ds.lat.values).tobytes()).hexdigest(),
+        )
+    cache = this_ds._patch_grid_index_cache.indices  # pylint: disable=protected-access
+    if key not in cache:
+        if grid_ds is None:
+            cache[key] = PatchGridIndex.from_dataset(this_ds, spatial_unit)
+        else:
+            cache[key] = PatchGridIndex.from_lonlat(
+                this_ds.patches1d_lon.values,
+                this_ds.patches1d_lat.values,
+                grid_ds.lon.values,
+                grid_ds.lat.values,
+            )
+    return cache[key]
@@ -19,6 +19,11 @@ sys.path.insert(1, _CTSM_PYTHON)
 from ctsm import ctsm_logging
 import ctsm.crop_calendars.cropcal_utils as utils
 import ctsm.crop_calendars.regrid_ggcmi_shdates as regrid
+from ctsm.netcdf_output import (
+    add_netcdf_output_args,
+    netcdf_output_options_from_args,
+    write_netcdf,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +64,10 @@ def main():
         args.regrid_template_file,
         args.regrid_extension,
         args.crop_list,
+        output_options=netcdf_output_options_from_args(args),
+        regrid_engine=args.regrid_engine,
+        jobs=args.jobs,
+        overwrite=args.overwrite,
     )
 
 
@@ -136,6 +145,7 @@ def process_ggcmi_shdates_args():
         default="Jonas Jägermeyr (jonas.jaegermeyr@columbia.edu)",
     )
 
+    add_netcdf_output_args(parser)
     ctsm_logging.add_logging_args(parser)
 
     # Arguments for regridding
@@ -326,6 +336,7 @@ def create_output_files(
     first_year,
     last_year,
     template_ds,
+    output_options=None,
 ):
     """
     Create output files, one for each variable
@@ -339,9 +350,11 @@ def create_output_files(
         )
         outfile = os.path.join(output_directory, basename)
         variable_dict[var]["outfile"] = outfile
-        template_ds.to_netcdf(
-            path=variable_dict[var]["outfile"],
-            format="NETCDF3_CLASSIC",
+        write_netcdf(
+            template_ds,
+            variable_dict[var]["outfile"],
+            output_options,
+            default_format="NETCDF3_CLASSIC",
         )
 
     return nninterp_suffix
@@ -371,6 +384,10 @@ def process_ggcmi_shdates(
     regrid_template_file,
     regrid_extension,
     crop_list,
+    output_options=None,
+    regrid_engine="cdo",
+    jobs=1,
+    overwrite=False,
 ):
     """
     Convert GGCMI crop calendar files for use in CTSM
@@ -394,6 +411,9 @@ def process_ggcmi_shdates(
         regridded_ggcmi_files_dir,
         regrid_extension,
         crop_list,
+        engine=regrid_engine,
+        jobs=jobs,
+        overwrite=overwrite,
     )
 
     # Set up dictionaries used in remapping crops and variables between GGCMI and CLM
@@ -441,6 +461,7 @@ def process_ggcmi_shdates(
         first_year,
         last_year,
         template_ds,
+        output_options,
     )
 
     #########################
@@ -525,7 +546,13 @@ def process_ggcmi_shdates(
 
             # Save
             logger.info("    Saving %s...", varname_ggcmi)
-            thisvar_da.to_netcdf(file_clm, mode="a", format="NETCDF3_CLASSIC")
+            write_netcdf(
+                thisvar_da,
+                file_clm,
+                output_options,
+                default_format="NETCDF3_CLASSIC",
+                mode="a",
+            )
 
         cropcal_ds.close()
 
@@ -1,14 +1,19 @@
 """
 Regrid GGCMI sowing and harvest date files
 """
+from concurrent.futures import ProcessPoolExecutor
 from subprocess import run
 import os
 import glob
 import argparse
+import hashlib
+import shutil
 import sys
 import logging
+import netCDF4
 import xarray as xr
 import numpy as np
+from scipy.spatial import cKDTree
 
 # -- add python/ctsm  to path (needed if we want to run regrid_ggcmi_shdates stand-alone)
 _CTSM_PYTHON = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, os.pardir)
@@ -20,9 +25,24 @@ from ctsm.ctsm_pylib_dependent_utils import (  # pylint: disable=wrong-import-po
     import_coord_2d,
 )
 from ctsm import ctsm_logging  # pylint: disable=wrong-import-position
+from ctsm.netcdf_output import write_netcdf  # pylint: disable=wrong-import-position
+from ctsm.site_and_regional.spatial_index import (  # pylint: disable=wrong-import-position
+    lonlat_to_xyz,
+)
 
 logger = logging.getLogger(__name__)
 
+REGRID_ENGINES = ["cdo", "native"]
+
+# Global attribute recording which engine regridded an output file
+REGRID_ENGINE_ATTR = "regrid_engine"
+
+# Relative tolerance within which two source gridcells are equally near a point
+NN_TIE_RTOL = 1e-9
+
+# Sometimes cdo fails for no apparent reason. In testing this never happened more than 3x in a row.
+CDO_TRIES = 4
+
 
 def main():
     """
@@ -39,22 +59,27 @@ def main():
         args.regrid_output_directory,
         args.regrid_extension,
         args.crop_list,
+        engine=args.regrid_engine,
+        jobs=args.jobs,
+        overwrite=args.overwrite,
     )
 
 
-def run_and_check(cmd):
+def run_and_check(cmd, n_tries=1):
     """
-    Run a given shell command and check its result
+    Run a given shell command and check its result, trying up to n_tries times
     """
-    result = run(
-        cmd,
-        shell=True,
-        capture_output=True,
-        text=True,
-        check=False,
-    )
-    if result.returncode != 0:
-        abort(f"Trouble running `{result.args}` in shell:\n{result.stdout}\n{result.stderr}")
+    for _ in range(n_tries):
+        result = run(
+            cmd,
+            shell=True,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if result.returncode == 0:
+            return
+    abort(f"Trouble running `{result.args}` in shell:\n{result.stdout}\n{result.stderr}")
 
 
 def define_arguments(parser):
@@ -99,6 +124,36 @@ def define_arguments(parser):
         ),
         default=None,
     )
+    parser.add_argument(
+        "--regrid-engine",
+        help=(
+            "How to do the nearest-neighbor regridding: by calling cdo ('cdo'; needs cdo on your "
+            + "PATH or loadable with 'module load cdo'), or natively in Python ('native'). Where a "
+            + "destination gridcell is exactly equally near two or more source gridcells, 'native' "
+            + "uses the first in the source file's (lat, lon) order; cdo may pick a different "
+            + "one. [default: %(default)s]"
+        ),
+        choices=REGRID_ENGINES,
+        default="cdo",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of worker processes to use for regridding crop files in parallel. "
+        + "[default: %(default)s]",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--overwrite",
+        help=(
+            "Regrid every crop file. By default, crop files whose regridded output is newer than "
+            + "both the crop file and the regrid template file, and was made with the same "
+            + "--regrid-engine, are skipped."
+        ),
+        action="store_true",
+        default=False,
+    )
     return parser
 
 
@@ -109,87 +164,269 @@ def regrid_ggcmi_shdates(
     regrid_output_directory,
     regrid_extension,
     crop_list,
+    engine="cdo",
+    jobs=1,
+    overwrite=False,
 ):
     """
     Regrid GGCMI sowing and harvest date files
     """
     logger.info("Regridding GGCMI crop calendars to %s:", regrid_resolution)
 
-    # Ensure we can call necessary shell script(s)
-    for cmd in ["module load cdo; cdo"]:
-        run_and_check(f"{cmd} --help")
+    if engine not in REGRID_ENGINES:
+        abort(f"regrid engine must be one of {REGRID_ENGINES}, not {engine}")
+    if engine == "cdo":
+        cdo = get_cdo_command()
 
-    previous_dir = os.getcwd()
-    os.chdir(regrid_input_directory)
+    regrid_input_directory = os.path.realpath(regrid_input_directory)
+    regrid_output_directory = os.path.realpath(regrid_output_directory)
     if not os.path.exists(regrid_output_directory):
         os.makedirs(regrid_output_directory)
 
-    templatefile = os.path.join(regrid_output_directory, "template.nc")
-    if os.path.exists(templatefile):
-        os.remove(templatefile)
-
-    template_ds_in = xr.open_dataset(regrid_template_file_in)
-
     # Process inputs
     if crop_list is not None:
         crop_list = crop_list.split(",")
     if regrid_extension[0] != ".":
         regrid_extension = "." + regrid_extension
 
-    # Import and format latitude
-    lat, lon, template_da_out = get_template_da_out(template_ds_in)
-
-    # Save template Dataset for use by cdo
-    template_ds_out = xr.Dataset(
-        data_vars={
-            "planting_day": template_da_out,
-            "maturity_day": template_da_out,
-            "growing_season_length": template_da_out,
-        },
-        coords={"lat": lat, "lon": lon},
-    )
-    template_ds_out.to_netcdf(templatefile, mode="w")
-
-    # Loop through original crop calendar files, interpolating using cdo with nearest-neighbor
-    pattern = "*" + regrid_extension
+    # Find the files to regrid, skipping any whose output is up to date
+    pattern = os.path.join(regrid_input_directory, "*" + regrid_extension)
     input_files = glob.glob(pattern)
     if len(input_files) == 0:
-        abort(f"No files found matching {os.path.join(os.getcwd(), pattern)}")
+        abort(f"No files found matching {pattern}")
     input_files.sort()
+    template_mtime = os.path.getmtime(regrid_template_file_in)
+    file_pairs = []
     for file in input_files:
-        this_crop = file[0:6]
+        this_crop = os.path.basename(file)[0:6]
         if crop_list is not None and this_crop not in crop_list:
             continue
-
+        file_out = os.path.join(
+            regrid_output_directory,
+            os.path.basename(file).replace(
+                regrid_extension, f"_nninterp-{regrid_resolution}{regrid_extension}"
+            ),
+        )
+        if not overwrite and is_up_to_date(file_out, [file], template_mtime, engine):
+            logger.info("    %s (skipped; up to date)", this_crop)
+            continue
         logger.info("    %s", this_crop)
-        file_2 = os.path.join(regrid_output_directory, file)
-        file_3 = file_2.replace(
-            regrid_extension, f"_nninterp-{regrid_resolution}{regrid_extension}"
+        file_pairs.append((file, file_out))
+    if not file_pairs:
+        return
+
+    with xr.open_dataset(regrid_template_file_in) as template_ds_in:
+        lat, lon, template_da_out = get_template_da_out(template_ds_in)
+        lat.load()
+        lon.load()
+
+    if engine == "cdo":
+        # Save template Dataset for use by cdo
+        templatefile = os.path.join(regrid_output_directory, "template.nc")
+        template_ds_out = xr.Dataset(
+            data_vars={
+                "planting_day": template_da_out,
+                "maturity_day": template_da_out,
+                "growing_season_length": template_da_out,
+            },
+            coords={"lat": lat, "lon": lon},
+        )
+        template_ds_out.to_netcdf(templatefile, mode="w")
+        task = regrid_file_cdo
+        task_args = [(cdo, templatefile, file, file_out) for file, file_out in file_pairs]
+    else:
+        # Each source grid's regridder is built once and shared by all the files on that grid
+        regridders = {}
+        task = regrid_file_native
+        task_args = []
+        for file, file_out in file_pairs:
+            with xr.open_dataset(file) as ds_in:
+                src_lon = ds_in["lon"].values
+                src_lat = ds_in["lat"].values
+            key = (
+                hashlib.sha256(src_lon.tobytes()).hexdigest(),
+                hashlib.sha256(src_lat.tobytes()).hexdigest(),
+            )
+            if key not in regridders:
+                regridders[key] = NearestNeighborRegridder(src_lon, src_lat, lon.values, lat.values)
+            task_args.append((regridders[key], lat, lon, file, file_out))
+
+    if jobs > 1:
+        logger.info("Regridding %d files with %d worker processes", len(task_args), jobs)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(task, *args) for args in task_args]
+            for future in futures:
+                future.result()
+    else:
+        for args in task_args:
+            task(*args)
+
+    if engine == "cdo":
+        # Delete template file, which is no longer needed
+        os.remove(templatefile)
+
+
+def is_up_to_date(file_out, files_in, template_mtime, engine):
+    """
+    Whether file_out exists, is newer than all of files_in and the template file, and was
+    regridded with engine (according to its REGRID_ENGINE_ATTR global attribute)
+    """
+    if not os.path.exists(file_out):
+        return False
+    out_mtime = os.path.getmtime(file_out)
+    if any(out_mtime < os.path.getmtime(x) for x in files_in) or out_mtime < template_mtime:
+        return False
+    try:
+        with netCDF4.Dataset(file_out) as nc_out:
+            return getattr(nc_out, REGRID_ENGINE_ATTR, None) == engine
+    except OSError:
+        return False
+
+
+def get_cdo_command():
+    """
+    Get the shell command for calling cdo: just cdo if it's on the PATH, otherwise loading it with
+    the module system first
+    """
+    if shutil.which("cdo"):
+        cdo = "cdo"
+    else:
+        cdo = "module load cdo; cdo"
+    result = run(f"{cdo} --help", shell=True, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        abort(
+            "cdo is not on your PATH and couldn't be loaded with 'module load cdo'; use "
+            + "--regrid-engine native instead"
         )
+    return cdo
+
+
+def regrid_file_cdo(cdo, templatefile, file_in, file_out):
+    """
+    Regrid one crop calendar file with cdo, filling missing values with their nearest neighbor
+    """
+    file_tmp = file_out + ".tmp"
+    cdo_cmd = f"{cdo} -L -remapnn,'{templatefile}' -setmisstonn '{file_in}' '{file_tmp}'"
+    run_and_check(cdo_cmd, n_tries=CDO_TRIES)
+    with netCDF4.Dataset(file_tmp, "a") as nc_tmp:
+        nc_tmp.setncattr(REGRID_ENGINE_ATTR, "cdo")
+    os.replace(file_tmp, file_out)
+
+
+def regrid_file_native(regridder, lat, lon, file_in, file_out):
+    """
+    Regrid one crop calendar file with a NearestNeighborRegridder. Like cdo with -setmisstonn and
+    -remapnn, this regrids every variable on the lat-lon grid and fills missing values with their
+    nearest neighbor. Exact ties may be broken differently than by cdo; see NearestNeighborRegridder.
+    """
+    with xr.open_dataset(file_in) as ds_in:
+        ds_out = xr.Dataset(coords={"lat": lat, "lon": lon}, attrs=ds_in.attrs)
+        encoding = {}
+        for var in ds_in.data_vars:
+            da_in = ds_in[var]
+            if da_in.dims != ("lat", "lon"):
+                logger.warning("Skipping %s in %s: dims aren't (lat, lon)", var, file_in)
+                continue
+            ds_out[var] = xr.DataArray(
+                regridder.regrid(da_in.values), dims=("lat", "lon"), attrs=da_in.attrs
+            )
+            encoding[var] = {
+                key: da_in.encoding[key] for key in ["dtype", "_FillValue"] if key in da_in.encoding
+            }
+    ds_out.attrs["history"] = (
+        f"Regridded from {os.path.basename(file_in)} with nearest-neighbor interpolation by "
+        + "regrid_ggcmi_shdates"
+    )
+    ds_out.attrs[REGRID_ENGINE_ATTR] = "native"
+
+    # Write to a temporary file first, so an interrupted run doesn't leave an output file that
+    # looks up to date
+    file_tmp = file_out + ".tmp"
+    write_netcdf(ds_out, file_tmp, default_format=None, encoding=encoding)
+    os.replace(file_tmp, file_out)
 
-        if os.path.exists(file_3):
-            os.remove(file_3)
 
-        # Sometimes cdo fails for no apparent reason. In testing this never happened more than 3x
-        # in a row.
-        cdo_cmd = (
-            f"module load cdo; cdo -L -remapnn,'{templatefile}' "
-            + f"-setmisstonn '{file}' '{file_3}'"
+def query_nearest(tree, xyz, k=4):
+    """
+    Get the index of the point in KD-tree tree nearest to each of the points xyz. Where several
+    points are equally near (as when a destination gridcell center is halfway between source
+    gridcell centers), take the first, so the result doesn't depend on the KD-tree's internals.
+    """
+    distance, index = tree.query(xyz, k=min(k, tree.n))
+    if distance.ndim == 1:
+        return index
+    is_tie = distance <= distance[:, :1] * (1 + NN_TIE_RTOL)
+    return np.where(is_tie, index, tree.n).min(axis=1)
+
+
+class NearestNeighborRegridder:
+    """
+    Nearest-neighbor regridding from one lat-lon grid to another, equivalent to cdo's
+    -remapnn after -setmisstonn: Each destination gridcell gets the value of the nearest source
+    gridcell, or, if that's missing, the value of the nearest non-missing source gridcell to it.
+
+    Distances are great-circle distances (see ctsm.site_and_regional.spatial_index), with ties
+    (within a relative tolerance of NN_TIE_RTOL) going to the first source gridcell in the file's
+    (lat, lon) order. cdo doesn't document how it breaks ties, so results may differ from cdo's at
+    destination gridcells exactly halfway between source gridcells. The KD-tree
+    from source to destination gridcells is built once and reused for every variable regridded.
+    The search for non-missing neighbors is cached on the missing-value mask, which is usually
+    shared by all the variables in a file.
+
+    ...
+
+    Methods
+    -------
+    regrid(values)
+        Regrid a 2-d (lat, lon) array of values on the source grid
+    """
+
+    def __init__(self, src_lon, src_lat, dst_lon, dst_lat):
+        """
+        Initializes NearestNeighborRegridder with the 1-d longitudes and latitudes (degrees) of
+        the source and destination grids
+        """
+        src_lon_2d, src_lat_2d = np.meshgrid(src_lon, src_lat)
+        dst_lon_2d, dst_lat_2d = np.meshgrid(dst_lon, dst_lat)
+        self._src_xyz = lonlat_to_xyz(src_lon_2d.ravel(), src_lat_2d.ravel())
+        self.src_shape = src_lon_2d.shape
+        self.dst_shape = dst_lon_2d.shape
+        self._dst_to_src = query_nearest(
+            cKDTree(self._src_xyz), lonlat_to_xyz(dst_lon_2d.ravel(), dst_lat_2d.ravel())
         )
-        try:
-            run_and_check(cdo_cmd)
-        except:  # pylint: disable=bare-except
-            try:
-                run_and_check(cdo_cmd)
-            except:  # pylint: disable=bare-except
-                try:
-                    run_and_check(cdo_cmd)
-                except:  # pylint: disable=bare-except
-                    run_and_check(cdo_cmd)
-
-    # Delete template file, which is no longer needed
-    os.remove(templatefile)
-    os.chdir(previous_dir)
+        self._filled_index_cache = {}
+
+    def _get_filled_index(self, is_valid):
+        """
+        Get the index of the source gridcell to use for each destination gridcell, given which
+        source gridcells have valid values
+        """
+        key = hashlib.sha256(np.packbits(is_valid).tobytes()).hexdigest()
+        if key not in self._filled_index_cache:
+            src_index = self._dst_to_src.copy()
+            is_missing = ~is_valid[src_index]
+            if np.any(is_missing):
+                valid_index = np.nonzero(is_valid)[0]
+                nearest_valid = query_nearest(
+                    cKDTree(self._src_xyz[valid_index]), self._src_xyz[src_index[is_missing]]
+                )
+                src_index[is_missing] = valid_index[nearest_valid]
+            self._filled_index_cache[key] = src_index
+        return self._filled_index_cache[key]
+
+    def regrid(self, values):
+        """
+        Regrid a 2-d (lat, lon) array of values on the source grid, where NaN means missing.
+        Returns a 2-d (lat, lon) array on the destination grid.
+        """
+        values = np.asarray(values)
+        if values.shape != self.src_shape:
+            abort(f"Expected values on source grid of shape {self.src_shape}; got {values.shape}")
+        values = values.ravel()
+        is_valid = ~np.isnan(values)
+        if not np.any(is_valid):
+            return np.full(self.dst_shape, np.nan, dtype=values.dtype)
+        return values[self._get_filled_index(is_valid)].reshape(self.dst_shape)
 
 
 def get_template_da_out(template_ds_in):
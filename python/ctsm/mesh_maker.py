@@ -20,6 +20,7 @@ from datetime import datetime
 import xarray as xr
 import numpy as np
 
+from ctsm.args_utils import positive_int_type
 from ctsm.site_and_regional.mesh_type import MeshType
 from ctsm.utils import abort
 from ctsm.ctsm_logging import (
@@ -100,6 +101,25 @@ def get_parser():
         type=str,
         required=False,
     )
+    parser.add_argument(
+        "--block-size",
+        help="Write the mesh file this many nodes or elements at a time, rather than building it "
+        + "all in memory first. Useful for very large meshes.",
+        action="store",
+        dest="block_size",
+        type=positive_int_type,
+        required=False,
+    )
+    parser.add_argument(
+        "--compression-level",
+        help="Write a chunked mesh file (block-wise, as with --block-size), compressed at this "
+        + "level (1-9).",
+        action="store",
+        dest="compression_level",
+        type=int,
+        choices=range(1, 10),
+        required=False,
+    )
     parser.add_argument(
         "--overwrite",
         help="If meshfile exists, overwrite the meshfile.",
@@ -273,7 +293,9 @@ def main():
     this_mesh = MeshType(lats, lons, mask=mask, area=area)
     this_mesh.calculate_corners()
     this_mesh.calculate_nodes()
-    this_mesh.create_esmf(mesh_out)
+    this_mesh.create_esmf(
+        mesh_out, block_size=args.block_size, compression_level=args.compression_level
+    )
 
 
 def read_main():
@@ -306,7 +328,9 @@ def read_main():
 
     this_mesh = MeshType(lats, lons)
     this_mesh.read_file(ds)
-    this_mesh.create_esmf(mesh_out)
+    this_mesh.create_esmf(
+        mesh_out, block_size=args.block_size, compression_level=args.compression_level
+    )
 
 
 if __name__ == "__main__":
@@ -18,6 +18,7 @@ from ctsm.ctsm_logging import (
     process_logging_args,
 )
 from ctsm.modify_input_files.modify_fsurdat import ModifyFsurdat
+from ctsm.netcdf_output import add_netcdf_output_args, netcdf_output_options_from_args
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +65,20 @@ def fsurdat_modifier_arg_process():
         action="store_true",
         help="Overwrite the output file if it already exists. ",
     )
+    parser.add_argument(
+        "--copy-on-write",
+        dest="copy_on_write",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Copy the input surface dataset to the output byte for byte and then "
+        + "overwrite only the modified variables within the smallest (lat, lon) "
+        + "index box containing the region, instead of reading and rewriting the "
+        + "whole file. Much faster for small regions of high-resolution files. "
+        + "The output keeps the input's netCDF format. "
+        + "Cannot be used with evenly_split_cropland. ",
+    )
+    add_netcdf_output_args(parser)
     add_logging_args(parser)
     args = parser.parse_args()
     process_logging_args(args)
@@ -513,7 +528,40 @@ def read_cfg_required_basic_opts(config, section, cfg_path):
     lon_dimname = get_config_value(
         config=config, section=section, item="lon_dimname", file_path=cfg_path, can_be_unset=True
     )
-    return (lnd_lat_1, lnd_lat_2, lnd_lon_1, lnd_lon_2, landmask_file, lat_dimname, lon_dimname)
+
+    # Optional, so that older config files without them still work
+    region_file = None
+    if config.has_option(section=section, option="region_file"):
+        region_file = get_config_value(
+            config=config,
+            section=section,
+            item="region_file",
+            file_path=cfg_path,
+            is_list=True,
+            can_be_unset=True,
+        )
+    landmask_regions = None
+    if config.has_option(section=section, option="landmask_regions"):
+        landmask_regions = get_config_value(
+            config=config,
+            section=section,
+            item="landmask_regions",
+            file_path=cfg_path,
+            is_list=True,
+            convert_to_type=int,
+            can_be_unset=True,
+        )
+    return (
+        lnd_lat_1,
+        lnd_lat_2,
+        lnd_lon_1,
+        lnd_lon_2,
+        landmask_file,
+        lat_dimname,
+        lon_dimname,
+        region_file,
+        landmask_regions,
+    )
 
 
 def fsurdat_modifier(parser):
@@ -568,6 +616,8 @@ def fsurdat_modifier(parser):
         landmask_file,
         lat_dimname,
         lon_dimname,
+        region_file,
+        landmask_regions,
     ) = read_cfg_required_basic_opts(config, section, cfg_path)
     # Create ModifyFsurdat object
     modify_fsurdat = ModifyFsurdat.init_from_file(
@@ -579,7 +629,14 @@ def fsurdat_modifier(parser):
         landmask_file,
         lat_dimname,
         lon_dimname,
+        region_file=region_file,
+        landmask_regions=landmask_regions,
     )
+    output_options = netcdf_output_options_from_args(parser)
+    if parser.copy_on_write:
+        if not output_options.is_default():
+            abort("--copy-on-write keeps the format of fsurdat_in, so can't be used with --nc-*")
+        modify_fsurdat.restrict_to_index_box()
 
     # Read control information about the optional sections
     (
@@ -647,4 +704,7 @@ def fsurdat_modifier(parser):
     # ----------------------------------------------
     # Output the now modified CTSM surface data file
     # ----------------------------------------------
-    write_output(modify_fsurdat.file, fsurdat_in, fsurdat_out, "fsurdat")
+    if parser.copy_on_write:
+        modify_fsurdat.write_output_in_place(fsurdat_in, fsurdat_out)
+    else:
+        write_output(modify_fsurdat.file, fsurdat_in, fsurdat_out, "fsurdat", output_options)
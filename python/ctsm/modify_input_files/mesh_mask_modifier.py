@@ -13,6 +13,7 @@ from configparser import ConfigParser
 from ctsm.utils import abort, write_output
 from ctsm.config_utils import get_config_value
 from ctsm.ctsm_logging import setup_logging_pre_config, add_logging_args, process_logging_args
+from ctsm.netcdf_output import add_netcdf_output_args, netcdf_output_options_from_args
 from ctsm.modify_input_files.modify_mesh_mask import ModifyMeshMask
 
 logger = logging.getLogger(__name__)
@@ -31,13 +32,14 @@ def main():
     # read the command line argument to obtain the path to the .cfg file
     parser = argparse.ArgumentParser()
     parser.add_argument("cfg_path", help="/path/name.cfg of input file, eg ./modify.cfg")
+    add_netcdf_output_args(parser)
     add_logging_args(parser)
     args = parser.parse_args()
     process_logging_args(args)
-    mesh_mask_modifier(args.cfg_path)
+    mesh_mask_modifier(args.cfg_path, netcdf_output_options_from_args(args))
 
 
-def mesh_mask_modifier(cfg_path):
+def mesh_mask_modifier(cfg_path, output_options=None):
     """Implementation of mesh_mask_modifier command"""
     # read the .cfg (config) file
     config = ConfigParser()
@@ -87,4 +89,4 @@ def mesh_mask_modifier(cfg_path):
     # ----------------------------------------------
     # Output the now modified CTSM surface data file
     # ----------------------------------------------
-    write_output(modify_mesh_mask.file, mesh_mask_in, mesh_mask_out, "mesh")
+    write_output(modify_mesh_mask.file, mesh_mask_in, mesh_mask_out, "mesh", output_options)
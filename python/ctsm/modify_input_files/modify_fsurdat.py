@@ -7,14 +7,17 @@ The wrapper script includes a full description and instructions.
 
 import os
 import logging
+import shutil
 
-from math import isclose
+import netCDF4
 import numpy as np
 import xarray as xr
 
 from ctsm.utils import abort, update_metadata
 from ctsm.git_utils import get_ctsm_git_short_hash
 from ctsm.config_utils import lon_range_0_to_360
+from ctsm.netcdf_output import write_netcdf
+from ctsm.modify_input_files.region_mask import get_region_mask
 
 logger = logging.getLogger(__name__)
 
@@ -26,16 +29,38 @@ class ModifyFsurdat:
     """
 
     def __init__(
-        self, my_data, lon_1, lon_2, lat_1, lat_2, landmask_file, lat_dimname, lon_dimname
+        self,
+        my_data,
+        lon_1,
+        lon_2,
+        lat_1,
+        lat_2,
+        landmask_file,
+        lat_dimname,
+        lon_dimname,
+        region_file=None,
+        landmask_regions=None,
     ):
 
         self.numurbl = 3  # Number of urban density types
         self.file = my_data
+        # Names of variables changed so far, and (for copy-on-write output)
+        # the index box of the file that self.file holds and its dtypes as read;
+        # see restrict_to_index_box()
+        self.modified_vars = set()
+        self.index_box = None
+        self.index_box_dtypes = None
+        self.rectangle_index = None
         if "numurbl" in self.file.dims:
             self.numurbl = self.file.dims["numurbl"]
         else:
             abort("numurbl is not a dimension on the input surface dataset file and needs to be")
 
+        if landmask_file is not None and region_file is not None:
+            abort("Only one of landmask_file and region_file may be set")
+        if landmask_regions is not None and landmask_file is None:
+            abort("landmask_regions requires landmask_file to be set")
+
         self.rectangle = self._get_rectangle(
             lon_1=lon_1,
             lon_2=lon_2,
@@ -48,36 +73,97 @@ class ModifyFsurdat:
         if landmask_file is not None:
             # overwrite self.not_rectangle with data from
             # user-specified .nc file in the .cfg file
-            landmask_ds = xr.open_dataset(landmask_file)
-            self.rectangle = landmask_ds.mod_lnd_props.data
-            # CF convention has dimension and coordinate variable names the same
-            if lat_dimname is None:  # set to default
-                lat_dimname = "lsmlat"
-            if lon_dimname is None:  # set to default
-                lon_dimname = "lsmlon"
-            lsmlat = landmask_ds.dims[lat_dimname]
-            lsmlon = landmask_ds.dims[lon_dimname]
-
-            for row in range(lsmlat):  # rows from landmask file
-                for col in range(lsmlon):  # cols from landmask file
-                    errmsg = (
-                        "landmask_ds.mod_lnd_props not 0 or 1 at "
-                        + f"row, col, value = {row} {col} {self.rectangle[row, col]}"
-                    )
-                    assert isclose(self.rectangle[row, col], 0, abs_tol=1e-9) or isclose(
-                        self.rectangle[row, col], 1, abs_tol=1e-9
-                    ), errmsg
+            self.rectangle = self._get_landmask(
+                landmask_file, lat_dimname, lon_dimname, landmask_regions
+            )
+
+        if region_file is not None:
+            # overwrite self.not_rectangle with the gridcells inside the
+            # polygons in user-specified file(s) in the .cfg file
+            self.rectangle = get_region_mask(
+                region_file, self.file.LONGXY.values, self.file.LATIXY.values
+            )
+            logger.info("%d gridcells are inside the region(s)", np.count_nonzero(self.rectangle))
 
         self.not_rectangle = np.logical_not(self.rectangle)
+        # (lat, lon) indices of the gridcells in the rectangle
+        self.rectangle_index = np.nonzero(np.asarray(self.rectangle, dtype=bool))
 
     @classmethod
     def init_from_file(
-        cls, fsurdat_in, lon_1, lon_2, lat_1, lat_2, landmask_file, lat_dimname, lon_dimname
+        cls,
+        fsurdat_in,
+        lon_1,
+        lon_2,
+        lat_1,
+        lat_2,
+        landmask_file,
+        lat_dimname,
+        lon_dimname,
+        region_file=None,
+        landmask_regions=None,
     ):
         """Initialize a ModifyFsurdat object from file fsurdat_in"""
         logger.info("Opening fsurdat_in file to be modified: %s", fsurdat_in)
         my_file = xr.open_dataset(fsurdat_in)
-        return cls(my_file, lon_1, lon_2, lat_1, lat_2, landmask_file, lat_dimname, lon_dimname)
+        return cls(
+            my_file,
+            lon_1,
+            lon_2,
+            lat_1,
+            lat_2,
+            landmask_file,
+            lat_dimname,
+            lon_dimname,
+            region_file=region_file,
+            landmask_regions=landmask_regions,
+        )
+
+    @staticmethod
+    def _get_landmask(landmask_file, lat_dimname, lon_dimname, landmask_regions=None):
+        """
+        Description
+        -----------
+        Read the mask of gridcells to modify from variable mod_lnd_props in landmask_file.
+
+        If landmask_regions is None, mod_lnd_props must be 0 or 1 everywhere. Otherwise,
+        mod_lnd_props holds integer region ids and the mask is the union of the regions
+        in landmask_regions.
+        """
+        with xr.open_dataset(landmask_file) as landmask_ds:
+            mod_lnd_props = landmask_ds.mod_lnd_props.values
+            # CF convention has dimension and coordinate variable names the same
+            if lat_dimname is None:  # set to default
+                lat_dimname = "lsmlat"
+            if lon_dimname is None:  # set to default
+                lon_dimname = "lsmlon"
+            if lat_dimname not in landmask_ds.dims or lon_dimname not in landmask_ds.dims:
+                abort(
+                    f"{landmask_file} must have dimensions {lat_dimname} and {lon_dimname}; "
+                    + "set lat_dimname and lon_dimname to the names it uses"
+                )
+
+        if landmask_regions is not None:
+            is_integer = np.isclose(mod_lnd_props, np.round(mod_lnd_props), rtol=0, atol=1e-9)
+            if not np.all(is_integer):
+                row, col = np.argwhere(~is_integer)[0]
+                abort(
+                    "landmask_ds.mod_lnd_props not an integer region id at "
+                    + f"row, col, value = {row} {col} {mod_lnd_props[row, col]}"
+                )
+            return np.isin(np.round(mod_lnd_props), landmask_regions)
+
+        is_0_or_1 = np.isclose(mod_lnd_props, 0, rtol=0, atol=1e-9) | np.isclose(
+            mod_lnd_props, 1, rtol=0, atol=1e-9
+        )
+        if not np.all(is_0_or_1):
+            row, col = np.argwhere(~is_0_or_1)[0]
+            errmsg = (
+                "landmask_ds.mod_lnd_props not 0 or 1 at "
+                + f"row, col, value = {row} {col} {mod_lnd_props[row, col]}"
+            )
+            raise AssertionError(errmsg)
+        return mod_lnd_props
 
     @staticmethod
     def _get_rectangle(lon_1, lon_2, lat_1, lat_2, longxy, latixy):
@@ -120,11 +206,48 @@ class ModifyFsurdat:
 
         return rectangle
 
+    def restrict_to_index_box(self):
+        """
+        Description
+        -----------
+        Restrict self.file, self.rectangle, and self.not_rectangle to the
+        smallest box of (lat, lon) indices containing the whole rectangle, so
+        that only that part of the file is read, modified, and (with
+        write_output_in_place()) written.
+        """
+        rectangle = np.asarray(self.rectangle, dtype=bool)
+        lat_dim, lon_dim = self.file.LONGXY.dims
+        rows = np.nonzero(rectangle.any(axis=1))[0]
+        cols = np.nonzero(rectangle.any(axis=0))[0]
+        if rows.size == 0:
+            lat_slice = lon_slice = slice(0, 0)
+        else:
+            lat_slice = slice(int(rows[0]), int(rows[-1]) + 1)
+            lon_slice = slice(int(cols[0]), int(cols[-1]) + 1)
+        self.index_box = {lat_dim: lat_slice, lon_dim: lon_slice}
+        logger.info(
+            "Modifying index box %s %d:%d, %s %d:%d of %d x %d gridcells",
+            lat_dim,
+            lat_slice.start,
+            lat_slice.stop,
+            lon_dim,
+            lon_slice.start,
+            lon_slice.stop,
+            rectangle.shape[0],
+            rectangle.shape[1],
+        )
+        self.file = self.file.isel(self.index_box)
+        # dtypes as read, so write_output_in_place() can tell if any changed
+        self.index_box_dtypes = {var: self.file[var].dtype for var in self.file.variables}
+        self.rectangle = rectangle[lat_slice, lon_slice]
+        self.not_rectangle = np.logical_not(self.rectangle)
+        self.rectangle_index = np.nonzero(self.rectangle)
+
     def get_urb_dens(self):
         """Get the number of urban density classes"""
         return self.numurbl
 
-    def write_output(self, fsurdat_in, fsurdat_out):
+    def write_output(self, fsurdat_in, fsurdat_out, output_options=None):
         """
         Description
         -----------
@@ -136,6 +259,9 @@ class ModifyFsurdat:
             (str) Command line entry of input surface dataset
         fsurdat_out:
             (str) Command line entry of output surface dataset
+        output_options:
+            (NetcdfOutputOptions) format, compression, etc. of the output file;
+            default NETCDF3_64BIT
         """
 
         # update attributes
@@ -161,7 +287,68 @@ class ModifyFsurdat:
             abort(errmsg)
 
         # mode 'w' overwrites file if it exists
-        self.file.to_netcdf(path=fsurdat_out, mode="w", format="NETCDF3_64BIT")
+        write_netcdf(
+            self.file, fsurdat_out, output_options, default_format="NETCDF3_64BIT", mode="w"
+        )
+        logger.info("Successfully created fsurdat_out: %s", fsurdat_out)
+        self.file.close()
+
+    def write_output_in_place(self, fsurdat_in, fsurdat_out):
+        """
+        Description
+        -----------
+        Write output file by copying fsurdat_in byte for byte and then
+        overwriting only the modified variables, and only within the index
+        box (see restrict_to_index_box()). The data match those written by
+        write_output(), but the file keeps the format of fsurdat_in. Aborts if
+        a modified variable's dtype changed (e.g., an integer variable set to
+        a float value), since fsurdat_in's variable couldn't hold the new
+        values.
+
+        Arguments
+        ---------
+        fsurdat_in:
+            (str) Command line entry of input surface dataset
+        fsurdat_out:
+            (str) Command line entry of output surface dataset
+        """
+        if self.index_box is None:
+            abort("restrict_to_index_box() must be called before write_output_in_place()")
+        for var in sorted(self.modified_vars):
+            dtype_in = self.index_box_dtypes.get(var)
+            if self.file[var].dtype != dtype_in:
+                abort(
+                    f"{var} changed from {dtype_in} to {self.file[var].dtype}, so it can't be "
+                    "written into a copy of fsurdat_in; rerun without --copy-on-write"
+                )
+
+        update_metadata(
+            self.file,
+            title="Modified fsurdat file",
+            summary="Modified fsurdat file",
+            contact="N/A",
+            data_script=os.path.abspath(__file__) + " -- " + get_ctsm_git_short_hash(),
+            description="Modified this file: " + fsurdat_in,
+        )
+
+        shutil.copyfile(fsurdat_in, fsurdat_out)
+        with netCDF4.Dataset(fsurdat_out, "r+") as nc_out:
+            for attr in nc_out.ncattrs():
+                if attr not in self.file.attrs:
+                    nc_out.delncattr(attr)
+            nc_out.setncatts(self.file.attrs)
+
+            for var in sorted(self.modified_vars):
+                values = self.file[var].values
+                if values.size == 0:
+                    continue
+                if values.dtype.kind == "f":
+                    # NaNs are where the input had _FillValue
+                    values = np.ma.masked_invalid(values)
+                index = tuple(self.index_box.get(dim, slice(None)) for dim in self.file[var].dims)
+                logger.debug("Writing %s%s", var, index)
+                nc_out[var][index] = values
+
         logger.info("Successfully created fsurdat_out: %s", fsurdat_out)
         self.file.close()
 
@@ -172,10 +359,16 @@ class ModifyFsurdat:
         In rectangle selected by user (or default -90 to 90 and 0 to 360),
         replace fsurdat file's PCT_CFT with equal values for all crop types.
         """
+        if self.index_box is not None:
+            abort(
+                "evenly_split_cropland changes PCT_CFT in every gridcell, not just "
+                + "in the rectangle, so it can't be combined with copy-on-write output"
+            )
         pct_cft = np.full_like(self.file["PCT_CFT"].values, 100 / self.file.dims["cft"])
         self.file["PCT_CFT"] = xr.DataArray(
             data=pct_cft, attrs=self.file["PCT_CFT"].attrs, dims=self.file["PCT_CFT"].dims
         )
+        self.modified_vars.add("PCT_CFT")
 
     def set_dom_pft(self, dom_pft, lai, sai, hgt_top, hgt_bot):
         """
@@ -210,21 +403,18 @@ class ModifyFsurdat:
             self.file["PCT_CROP"] = self.file["PCT_CROP"] + self.file["PCT_NATVEG"].where(
                 self.rectangle, other=0
             )
+            self.modified_vars.add("PCT_CROP")
             self.setvar_lev0("PCT_NATVEG", 0)
 
-            for cft in self.file.cft:
-                cft_local = cft - (max(self.file.natpft) + 1)
-                # initialize 3D variable; set outside the loop below
-                self.setvar_lev1("PCT_CFT", val=0, lev1_dim=cft_local)
-
-            # set 3D variable
-            self.setvar_lev1("PCT_CFT", val=100, lev1_dim=dom_pft - (max(self.file.natpft) + 1))
+            # set 3D variable: 100 for dom_pft, 0 for the other CFTs
+            pct_cft = np.zeros(self.file.sizes["cft"], dtype=int)
+            pct_cft[dom_pft - (int(max(self.file.natpft)) + 1)] = 100
+            self.setvar_in_rectangle("PCT_CFT", pct_cft, lev_index=(slice(None),))
         else:  # dom_pft is a pft (not a crop)
-            for pft in self.file.natpft:
-                # initialize 3D variable; set outside the loop below
-                self.setvar_lev1("PCT_NAT_PFT", val=0, lev1_dim=pft)
-            # set 3D variable value for dom_pft
-            self.setvar_lev1("PCT_NAT_PFT", val=100, lev1_dim=dom_pft)
+            # set 3D variable: 100 for dom_pft, 0 for the other PFTs
+            pct_nat_pft = np.zeros(self.file.sizes["natpft"], dtype=int)
+            pct_nat_pft[dom_pft] = 100
+            self.setvar_in_rectangle("PCT_NAT_PFT", pct_nat_pft, lev_index=(slice(None),))
 
         # dictionary of 4d variables to loop over
         vars_4d = {
@@ -321,15 +511,15 @@ class ModifyFsurdat:
                         abort(
                             "Variable " + var + " is of the wrong size. It should be = " + str(dim1)
                         )
-                    for lev1 in range(dim1):
-                        self.setvar_lev1(var, vallist[lev1], lev1_dim=lev1)
+                    self.setvar_in_rectangle(var, vallist, lev_index=(slice(None),))
                 elif len(self.file[var].dims) == 4:
-                    dim_lev1 = int(self.file.sizes[self.file[var].dims[1]])
-                    dim_lev2 = int(self.file.sizes[self.file[var].dims[0]])
                     vallist = settings[var]
-                    for lev1 in range(dim_lev1):
-                        for lev2 in range(dim_lev2):
-                            self.setvar_lev2(var, vallist[lev2], lev1_dim=lev1, lev2_dim=lev2)
+                    # vallist is over the first dimension; the same for all of the second
+                    self.setvar_in_rectangle(
+                        var,
+                        np.asarray(vallist)[:, np.newaxis],
+                        lev_index=(slice(None), slice(None)),
+                    )
                 else:
                     abort(
                         "Error: Variable "
@@ -359,9 +549,11 @@ class ModifyFsurdat:
                 + var
             )
             abort(errmsg)
-        for mon in self.file.time - 1:  # loop over 12 months
-            # set 4D variable to value for dom_pft
-            self.setvar_lev2(var, val[int(mon)], lev1_dim=dom_pft, lev2_dim=mon)
+        # set 4D variable to value for dom_pft in all 12 months at once
+        mons = self.file.time.values.astype(int) - 1
+        self.setvar_in_rectangle(
+            var, np.asarray(val)[mons], lev_index=(mons[:, np.newaxis], dom_pft)
+        )
 
     def zero_nonveg(self):
         """
@@ -379,30 +571,48 @@ class ModifyFsurdat:
         self.setvar_lev0("PCT_GLACIER", 0)
         self.setvar_lev0("PCT_OCEAN", 0)
 
+    def setvar_in_rectangle(self, var, val, lev_index=()):
+        """
+        Sets variable var to value val in user-defined rectangle, with a
+        single assignment to the precomputed (lat, lon) indices of the
+        rectangle, so only those gridcells are touched.
+
+        lev_index indexes the leading (non-lat/lon) dimensions of var, e.g.
+        (lev1_dim,) or (slice(None),) for all levels of a 3d variable; any
+        leading dimensions it leaves out are set at all levels. val is
+        a scalar or an array broadcast against the selected levels (with the
+        gridcells added as its last dimension). As with xarray's where(), var
+        is promoted to a wider dtype if val needs it. The data are copied
+        first, so arrays shared with other variables or views aren't changed.
+        """
+        val = np.asarray(val)
+        dtype = self.file[var].dtype
+        for item in np.unique(val):
+            dtype = np.result_type(dtype, item)
+        values = self.file[var].values.astype(dtype, copy=True)
+        if val.ndim > 0:
+            val = val[..., np.newaxis]
+        values[tuple(lev_index) + (Ellipsis,) + self.rectangle_index] = val
+        self.file[var] = self.file[var].copy(data=values)
+        self.modified_vars.add(var)
+
     def setvar_lev0(self, var, val):
         """
-        Sets 2d variable var to value val in user-defined rectangle,
-        defined as "other" in the function
+        Sets 2d variable var to value val in user-defined rectangle
         """
-        self.file[var] = self.file[var].where(self.not_rectangle, other=val)
+        self.setvar_in_rectangle(var, val)
 
     def setvar_lev1(self, var, val, lev1_dim):
         """
-        Sets 3d variable var to value val in user-defined rectangle,
-        defined as "other" in the function
+        Sets 3d variable var to value val in user-defined rectangle
         """
-        self.file[var][lev1_dim, ...] = self.file[var][lev1_dim, ...].where(
-            self.not_rectangle, other=val
-        )
+        self.setvar_in_rectangle(var, val, lev_index=(int(lev1_dim),))
 
     def setvar_lev2(self, var, val, lev1_dim, lev2_dim):
         """
-        Sets 4d variable var to value val in user-defined rectangle,
-        defined as "other" in the function
+        Sets 4d variable var to value val in user-defined rectangle
         """
-        self.file[var][lev2_dim, lev1_dim, ...] = self.file[var][lev2_dim, lev1_dim, ...].where(
-            self.not_rectangle, other=val
-        )
+        self.setvar_in_rectangle(var, val, lev_index=(int(lev2_dim), int(lev1_dim)))
 
     def set_idealized(self):
         """
@@ -451,17 +661,13 @@ class ModifyFsurdat:
         self.setvar_lev0("PCT_OCEAN", pct_not_nat_veg)
         self.setvar_lev0("PCT_NATVEG", pct_nat_veg)
 
-        for lev in self.file.nlevsoi:
-            # set next three 3D variables to values representing loam
-            self.setvar_lev1("PCT_SAND", val=pct_sand, lev1_dim=lev)
-            self.setvar_lev1("PCT_CLAY", val=pct_clay, lev1_dim=lev)
-            self.setvar_lev1("ORGANIC", val=organic, lev1_dim=lev)
-
-        for crop in self.file.cft:
-            cft_local = crop - (max(self.file.natpft) + 1)
-            # initialize 3D variable; set outside the loop below
-            self.setvar_lev1("PCT_CFT", val=0, lev1_dim=cft_local)
+        # set next three 3D variables to values representing loam at all levels
+        self.setvar_in_rectangle("PCT_SAND", pct_sand, lev_index=(slice(None),))
+        self.setvar_in_rectangle("PCT_CLAY", pct_clay, lev_index=(slice(None),))
+        self.setvar_in_rectangle("ORGANIC", organic, lev_index=(slice(None),))
 
-        # set 3D variable
+        # set 3D variable: 100 for the first CFT, 0 for the others
         # NB. sum(PCT_CFT) must = 100 even though PCT_CROP = 0
-        self.setvar_lev1("PCT_CFT", val=100, lev1_dim=0)
+        pct_cft = np.zeros(self.file.sizes["cft"], dtype=int)
+        pct_cft[0] = 100
+        self.setvar_in_rectangle("PCT_CFT", pct_cft, lev_index=(slice(None),))
@@ -7,7 +7,6 @@ The wrapper script includes a full description and instructions.
 
 import logging
 
-from math import isclose
 import numpy as np
 import xarray as xr
 
@@ -16,6 +15,9 @@ from ctsm.config_utils import lon_range_0_to_360
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of offending cells to list in error messages
+MAX_CELLS_REPORTED = 10
+
 
 class ModifyMeshMask:
     """
@@ -89,86 +91,86 @@ class ModifyMeshMask:
         order as the 2d array.
         """
 
-        # Initialize
-        ncount = 0
-        mod_lnd_props = self._landmask_file.mod_lnd_props
-        landmask = self._landmask_file.landmask
-
-        for row in range(self.lsmlat):  # rows from landmask file
-            logger.info("row = %d", row + 1)
-            for col in range(self.lsmlon):  # cols from landmask file
-                errmsg = (
-                    "landmask not 0 or 1 at row, col, value = "
-                    + f"{row} {col} {landmask[row, col]}"
-                )
-                assert landmask[row, col] == 0 or landmask[row, col] == 1, errmsg
-                errmsg = (
-                    "mod_lnd_props not 0 or 1 at row, col, value = "
-                    + f"{row} {col} {mod_lnd_props[row, col]}"
-                )
-                assert mod_lnd_props[row, col] == 0 or mod_lnd_props[row, col] == 1, errmsg
-                if int(mod_lnd_props[row, col]) == 1:
-                    errmsg = (
-                        "landmask should = mod_lnd_props where the "
-                        + f"latter equals 1, but here landmask = 0 at row, col = {row} {col}"
-                    )
-                    assert int(landmask[row, col]) == 1, errmsg
-                # Reshape landmask into the
-                # elementCount dimension of the mesh file.
-                # In the process overwrite self.file[var].
-                ocnmask = np.logical_not(int(landmask[row, col]))
-                self.file[var][ncount] = ocnmask
-
-                # All else in this function supports error checking
-
-                # lon and lat from the landmask file
-                if len(self.latvar.sizes) == 2:
-                    latvar_scalar = float(self.latvar[row, col])
-                    lonvar_scalar = float(self.lonvar[row, col])
-                elif len(self.latvar.sizes) == 1:
-                    latvar_scalar = float(self.latvar[row])
-                    lonvar_scalar = float(self.lonvar[col])
-                else:
-                    errmsg = (
-                        "ERROR: Expecting latvar.sizes == 1 or 2, not "
-                        + f"{len(self.latvar.sizes)}"
-                    )
-                    abort(errmsg)
-                # ensure lon range of 0-360 rather than -180 to 180
-                lonvar_scalar = lon_range_0_to_360(lonvar_scalar)
-                # lon and lat from the mesh file
-                lat_mesh = float(self.file["centerCoords"][ncount, 1])
-                lon_mesh = float(self.file["centerCoords"][ncount, 0])
-                # ensure lon range of 0-360 rather than -180 to 180
-                lon_mesh = lon_range_0_to_360(lon_mesh)
-
-                errmsg = (
-                    "Must be equal: "
-                    " latvar_scalar = "
-                    + str(latvar_scalar)
-                    + " lat_mesh = "
-                    + str(lat_mesh)
-                    + " (at ncount = "
-                    + str(ncount)
-                    + ")"
-                )
-                assert isclose(latvar_scalar, lat_mesh, abs_tol=1e-5), errmsg
-                errmsg = (
-                    "Must be equal: "
-                    " lonvar_scalar = "
-                    + str(lonvar_scalar)
-                    + " lon_mesh = "
-                    + str(lon_mesh)
-                    + " (at ncount = "
-                    + str(ncount)
-                    + ")"
-                )
-                assert isclose(lonvar_scalar, lon_mesh, abs_tol=1e-5), errmsg
-
-                # increment counter
-                ncount = ncount + 1
-
         # Error check
-        element_count = int(max((self.file["elementCount"])) + 1)
+        element_count = self.file.sizes["elementCount"]
+        ncount = self.lsmlat * self.lsmlon
         errmsg = "element_count =" + str(element_count) + "ncount =" + str(ncount) + "must be equal"
         assert ncount == element_count, errmsg
+
+        mod_lnd_props = self._landmask_file.mod_lnd_props.values
+        landmask = self._landmask_file.landmask.values
+
+        for name, values in [("landmask", landmask), ("mod_lnd_props", mod_lnd_props)]:
+            not_0_or_1 = (values != 0) & (values != 1)
+            assert not not_0_or_1.any(), f"{name} not 0 or 1 at " + _describe_cells(
+                not_0_or_1, values
+            )
+        not_landmask = (mod_lnd_props == 1) & (landmask != 1)
+        assert not not_landmask.any(), (
+            "landmask should = mod_lnd_props where the latter equals 1, but here landmask = 0 at "
+            + _describe_cells(not_landmask)
+        )
+
+        # Reshape landmask into the
+        # elementCount dimension of the mesh file.
+        # In the process overwrite self.file[var].
+        ocnmask = np.logical_not(landmask.astype(int))
+        self.file[var][:] = ocnmask.ravel()
+
+        # All else in this function supports error checking
+
+        # lon and lat from the landmask file
+        if len(self.latvar.sizes) == 2:
+            latvar = self.latvar.values.astype(np.float64)
+            lonvar = self.lonvar.values.astype(np.float64)
+        elif len(self.latvar.sizes) == 1:
+            lonvar, latvar = np.meshgrid(
+                self.lonvar.values.astype(np.float64), self.latvar.values.astype(np.float64)
+            )
+        else:
+            errmsg = "ERROR: Expecting latvar.sizes == 1 or 2, not " + f"{len(self.latvar.sizes)}"
+            abort(errmsg)
+        # ensure lon range of 0-360 rather than -180 to 180
+        _check_lon_range_0_to_360(lonvar)
+        # lon and lat from the mesh file
+        center_coords = self.file["centerCoords"].values.astype(np.float64)
+        lat_mesh = center_coords[:, 1].reshape(landmask.shape)
+        lon_mesh = center_coords[:, 0].reshape(landmask.shape)
+        # ensure lon range of 0-360 rather than -180 to 180
+        _check_lon_range_0_to_360(lon_mesh)
+
+        for name, var_values, mesh_values in [("lat", latvar, lat_mesh), ("lon", lonvar, lon_mesh)]:
+            # Same test as math.isclose(var_value, mesh_value, abs_tol=1e-5)
+            tolerance = np.maximum(1e-9 * np.maximum(abs(var_values), abs(mesh_values)), 1e-5)
+            not_equal = ~(abs(var_values - mesh_values) <= tolerance)
+            assert not not_equal.any(), (
+                f"Must be equal: {name}var and {name}_mesh at "
+                + _describe_cells(not_equal, var_values)
+                + f"; {name}_mesh values "
+                + str(mesh_values[not_equal][:MAX_CELLS_REPORTED].tolist())
+            )
+
+
+def _describe_cells(is_bad, values=None):
+    """
+    Describe (up to MAX_CELLS_REPORTED of) the cells where the 2d boolean array is_bad is True: their
+    row, col and, if given, their values
+    """
+    rows, cols = np.nonzero(is_bad)
+    cells = [
+        f"({row}, {col})" for row, col in zip(rows[:MAX_CELLS_REPORTED], cols[:MAX_CELLS_REPORTED])
+    ]
+    msg = f"{rows.size} cell(s), starting at (row, col) = {' '.join(cells)}"
+    if values is not None:
+        msg += f", values = {values[is_bad][:MAX_CELLS_REPORTED].tolist()}"
+    return msg
+
+
+def _check_lon_range_0_to_360(lons):
+    """
+    Check that an array of longitudes is in the range 0 to 360, with the same errors as
+    lon_range_0_to_360() gives for the first longitude that isn't
+    """
+    out_of_range = ~((lons >= 0) & (lons <= 360))
+    if out_of_range.any():
+        lon_range_0_to_360(float(lons[out_of_range][0]))
@@ -0,0 +1,214 @@
+"""
+Rasterize polygon regions (from GeoJSON or shapefiles) onto the LONGXY/LATIXY grid of an fsurdat
+file, for use by fsurdat_modifier as an alternative to a lon/lat rectangle.
+
+A gridcell is in a region if its center is inside one of the region's polygons, using the even-odd
+rule so that holes are excluded. Rasterization is vectorized over gridcells: the cell centers are
+sorted by latitude once, so each polygon edge only has to be tested against the band of cells whose
+latitude it spans. The most recently used masks are cached on the region file and the grid, so
+asking for the same region on the same grid again is free.
+
+GeoJSON is read with the standard library. Shapefiles need the pyshp package (imported as
+"shapefile").
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from ctsm.utils import abort
+
+try:
+    import shapefile
+
+    CAN_READ_SHAPEFILES = True
+except ModuleNotFoundError:
+    CAN_READ_SHAPEFILES = False
+
+logger = logging.getLogger(__name__)
+
+# Cache of region masks, keyed on the region file and the hash of the grid's coordinate arrays. Only
+# the most recently used REGION_MASK_CACHE_SIZE masks are kept.
+REGION_MASK_CACHE_SIZE = 8
+_REGION_MASK_CACHE = OrderedDict()
+
+
+def _read_geojson(region_file):
+    """
+    Read the polygons in a GeoJSON file. Returns a list of polygons, each a list of (n, 2) arrays
+    of (lon, lat) ring vertices.
+    """
+    with open(region_file, "r", encoding="utf-8") as geojson:
+        data = json.load(geojson)
+
+    if data.get("type") == "FeatureCollection":
+        geometries = [feature.get("geometry") for feature in data.get("features", [])]
+    elif data.get("type") == "Feature":
+        geometries = [data.get("geometry")]
+    else:
+        geometries = [data]
+
+    polygons = []
+    while geometries:
+        geometry = geometries.pop(0)
+        if geometry is None:
+            continue
+        geom_type = geometry.get("type")
+        if geom_type == "Polygon":
+            polygons.append(
+                [np.asarray(ring, dtype=np.float64)[:, :2] for ring in geometry["coordinates"]]
+            )
+        elif geom_type == "MultiPolygon":
+            for polygon in geometry["coordinates"]:
+                polygons.append([np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon])
+        elif geom_type == "GeometryCollection":
+            geometries.extend(geometry["geometries"])
+        else:
+            abort(f"Unsupported geometry type in {region_file}: {geom_type}")
+    return polygons
+
+
+def _read_shapefile(region_file):
+    """
+    Read the polygons in a shapefile. Returns a list of polygons, each a list of (n, 2) arrays of
+    (lon, lat) ring vertices.
+    """
+    if not CAN_READ_SHAPEFILES:
+        abort(f"Reading {region_file} requires the pyshp package, which is not installed")
+
+    polygons = []
+    with shapefile.Reader(region_file) as reader:
+        for shape in reader.shapes():
+            if shape.shapeType not in (
+                shapefile.POLYGON,
+                shapefile.POLYGONZ,
+                shapefile.POLYGONM,
+            ):
+                abort(f"Shapes in {region_file} must be polygons, not {shape.shapeTypeName}")
+            points = np.asarray(shape.points, dtype=np.float64)
+            starts = list(shape.parts) + [len(points)]
+            polygons.append([points[start:stop] for start, stop in zip(starts[:-1], starts[1:])])
+    return polygons
+
+
+def read_polygons(region_file):
+    """
+    Read the polygons in a GeoJSON (.geojson or .json) or shapefile (.shp). Returns a list of
+    polygons, each a list of (n, 2) arrays of (lon, lat) ring vertices; the first ring of each
+    polygon is its outer boundary and any others are holes.
+    """
+    if not os.path.exists(region_file):
+        abort(f"Region file does NOT exist: {region_file}")
+    extension = os.path.splitext(region_file)[1].lower()
+    if extension in (".geojson", ".json"):
+        polygons = _read_geojson(region_file)
+    elif extension == ".shp":
+        polygons = _read_shapefile(region_file)
+    else:
+        abort(f"Region file must be GeoJSON (.geojson, .json) or a shapefile (.shp): {region_file}")
+    if not polygons:
+        abort(f"No polygons found in region file {region_file}")
+    return polygons
+
+
+def _points_in_polygon(polygon, lons, lats, lat_order, sorted_lats):
+    """
+    Even-odd test of which points are inside a polygon (given as a list of rings). lat_order sorts
+    the points by latitude and sorted_lats are the sorted latitudes.
+    """
+    inside = np.zeros(lons.shape, dtype=bool)
+    for ring in polygon:
+        x_1 = ring[:, 0]
+        y_1 = ring[:, 1]
+        x_2 = np.roll(x_1, -1)
+        y_2 = np.roll(y_1, -1)
+        # Points whose latitude is in [min(y_1, y_2), max(y_1, y_2)) cross this edge's latitude
+        # band; they are a contiguous slice of the latitude-sorted points.
+        starts = np.searchsorted(sorted_lats, np.minimum(y_1, y_2), side="left")
+        stops = np.searchsorted(sorted_lats, np.maximum(y_1, y_2), side="left")
+        for i in np.nonzero(stops > starts)[0]:
+            band = lat_order[starts[i] : stops[i]]
+            x_cross = x_1[i] + (lats[band] - y_1[i]) * (x_2[i] - x_1[i]) / (y_2[i] - y_1[i])
+            inside[band[lons[band] < x_cross]] ^= True
+    return inside
+
+
+def rasterize_polygons(polygons, longxy, latixy):
+    """
+    Get a boolean mask, with the shape of longxy and latixy, that is True for gridcells whose centers
+    are inside any of the polygons. Grid longitudes may use any convention (e.g., [0, 360) or
+    [-180, 180)); so may polygon longitudes, as long as each polygon spans less than 360 degrees.
+    """
+    longxy = np.asarray(longxy, dtype=np.float64)
+    latixy = np.asarray(latixy, dtype=np.float64)
+    lons = np.mod(longxy.ravel(), 360)
+    lats = latixy.ravel()
+    mask = np.zeros(lons.shape, dtype=bool)
+
+    for polygon in polygons:
+        outer = polygon[0]
+        lon_min, lat_min = outer.min(axis=0)
+        lon_max, lat_max = outer.max(axis=0)
+        # Only test points in the polygon's bounding box, shifting the grid's [0, 360) longitudes by
+        # whole turns into every range the polygon overlaps
+        first_turn = int(np.floor(lon_min / 360))
+        last_turn = int(np.floor(lon_max / 360))
+        for lon_offset in 360.0 * np.arange(first_turn, last_turn + 1):
+            plons = lons + lon_offset
+            in_box = (plons >= lon_min) & (plons <= lon_max) & (lats >= lat_min) & (lats <= lat_max)
+            in_box &= ~mask
+            if not np.any(in_box):
+                continue
+            candidates = np.nonzero(in_box)[0]
+            lat_order = np.argsort(lats[candidates], kind="stable")
+            sorted_lats = lats[candidates][lat_order]
+            inside = _points_in_polygon(
+                polygon, plons[candidates], lats[candidates], lat_order, sorted_lats
+            )
+            mask[candidates[inside]] = True
+
+    return mask.reshape(longxy.shape)
+
+
+def _hash_arrays(*arrays):
+    """
+    Hash the contents, dtypes, and shapes of numpy arrays
+    """
+    hasher = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        hasher.update(array.tobytes())
+        hasher.update(str((array.dtype, array.shape)).encode())
+    return hasher.hexdigest()
+
+
+def get_region_mask(region_files, longxy, latixy):
+    """
+    Get the boolean mask of gridcells inside the polygons in region_files (a file name or a list of
+    them; see read_polygons()) on the grid given by longxy and latixy. Masks are cached on each file
+    (and its modification time) and the grid.
+    """
+    if isinstance(region_files, str):
+        region_files = [region_files]
+    longxy = np.asarray(longxy)
+    latixy = np.asarray(latixy)
+    grid_hash = _hash_arrays(longxy, latixy)
+    mask = np.zeros(longxy.shape, dtype=bool)
+    for region_file in region_files:
+        region_file = os.path.abspath(region_file)
+        if not os.path.exists(region_file):
+            abort(f"Region file does NOT exist: {region_file}")
+        key = (region_file, os.path.getmtime(region_file), grid_hash)
+        if key in _REGION_MASK_CACHE:
+            _REGION_MASK_CACHE.move_to_end(key)
+        else:
+            logger.info("Rasterizing regions in %s", region_file)
+            _REGION_MASK_CACHE[key] = rasterize_polygons(read_polygons(region_file), longxy, latixy)
+            while len(_REGION_MASK_CACHE) > REGION_MASK_CACHE_SIZE:
+                _REGION_MASK_CACHE.popitem(last=False)
+        mask |= _REGION_MASK_CACHE[key]
+    return mask
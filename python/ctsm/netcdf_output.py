@@ -0,0 +1,301 @@
+"""
+Shared writer for the netCDF files made by the python tools, with a selectable format, compression,
+chunking, and float32 downcasting.
+
+Each tool keeps its own default format, so output is unchanged unless the user asks otherwise
+(see add_netcdf_output_args()). Compression and chunking need a netCDF-4 format; if they are asked
+for without a format, NETCDF4_CLASSIC is used, which keeps the classic data model that the model's
+Fortran I/O expects.
+"""
+
+import logging
+
+import netCDF4
+import numpy as np
+import xarray as xr
+
+from ctsm.utils import abort
+
+logger = logging.getLogger(__name__)
+
+NETCDF_FORMATS = ["NETCDF3_CLASSIC", "NETCDF3_64BIT", "NETCDF4_CLASSIC", "NETCDF4"]
+NETCDF4_FORMATS = ["NETCDF4_CLASSIC", "NETCDF4"]
+COMPRESSION_TYPES = ["zlib", "zstd"]
+
+# Format used for compressed or chunked output when no format is given
+DEFAULT_NETCDF4_FORMAT = "NETCDF4_CLASSIC"
+
+# Variables that are never downcast to float32, in addition to coordinate variables: their precision
+# matters for finding and matching gridcells
+FLOAT32_EXCLUDE = [
+    "LONGXY",
+    "LATIXY",
+    "AREA",
+    "area",
+    "xc",
+    "yc",
+    "xv",
+    "yv",
+    "lon",
+    "lat",
+    "nodeCoords",
+    "centerCoords",
+    "time",
+    "time_bnds",
+]
+
+
+class NetcdfOutputOptions:
+    """
+    Options for writing a netCDF file (see write_netcdf())
+
+    ...
+
+    Attributes
+    ----------
+    nc_format : str or None
+        netCDF format (one of NETCDF_FORMATS), or None for the tool's default
+    compression : str or None
+        compression filter (one of COMPRESSION_TYPES), or None for no compression
+    compression_level : int or None
+        compression level, 1 (fastest) to 9 (smallest); None for the netCDF default
+    chunks : dict
+        chunk size for each named dimension; variables with none of these dimensions are
+        left to the netCDF library's default chunking
+    float32 : bool
+        if True, downcast float64 variables to float32, except coordinate variables and those
+        in FLOAT32_EXCLUDE
+
+    Methods
+    -------
+    is_default()
+        True if no output options were asked for
+    get_format(default_format)
+        Get the netCDF format to write
+    get_encoding(ds)
+        Get the xarray encoding for each variable of a Dataset
+    """
+
+    def __init__(
+        self,
+        nc_format=None,
+        compression=None,
+        compression_level=None,
+        chunks=None,
+        float32=False,
+    ):
+        if nc_format is not None and nc_format not in NETCDF_FORMATS:
+            abort(f"netCDF format must be one of {NETCDF_FORMATS}, not {nc_format}")
+        if compression is not None and compression not in COMPRESSION_TYPES:
+            abort(f"netCDF compression must be one of {COMPRESSION_TYPES}, not {compression}")
+        if compression_level is not None:
+            if compression is None:
+                compression = "zlib"
+            if not 1 <= compression_level <= 9:
+                abort(f"netCDF compression level must be 1-9, not {compression_level}")
+        if compression == "zstd" and not getattr(netCDF4, "__has_zstandard_support__", False):
+            abort("zstd compression isn't supported by this netCDF library; use zlib instead")
+        chunks = dict(chunks or {})
+        for dim, size in chunks.items():
+            if size < 1:
+                abort(f"netCDF chunk size for {dim} must be positive, not {size}")
+        if (compression or chunks) and nc_format not in NETCDF4_FORMATS + [None]:
+            abort(f"netCDF compression and chunking need format {' or '.join(NETCDF4_FORMATS)}")
+
+        self.nc_format = nc_format
+        self.compression = compression
+        self.compression_level = compression_level
+        self.chunks = chunks
+        self.float32 = float32
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(nc_format={self.nc_format!r}, "
+            + f"compression={self.compression!r}, compression_level={self.compression_level!r}, "
+            + f"chunks={self.chunks!r}, float32={self.float32!r})"
+        )
+
+    def is_default(self):
+        """
+        True if no output options were asked for, so each tool writes its usual format
+        """
+        return (
+            self.nc_format is None
+            and self.compression is None
+            and not self.chunks
+            and not self.float32
+        )
+
+    def get_format(self, default_format):
+        """
+        Get the netCDF format to write: the one asked for; else default_format, unless that is
+        netCDF-3 and compression or chunking were asked for
+        """
+        if self.nc_format is not None:
+            return self.nc_format
+        if (self.compression or self.chunks) and default_format not in NETCDF4_FORMATS:
+            return DEFAULT_NETCDF4_FORMAT
+        return default_format
+
+    def _get_var_encoding(self, name, var, is_coord, unlimited_dims):
+        """
+        Get the encoding for one variable
+        """
+        encoding = {}
+        if self.float32 and var.dtype == np.float64 and not is_coord:
+            if name not in FLOAT32_EXCLUDE:
+                encoding["dtype"] = "float32"
+                fill_value = var.encoding.get("_FillValue", var.attrs.get("_FillValue"))
+                if fill_value is not None:
+                    encoding["_FillValue"] = np.float32(fill_value)
+
+        # Compression and chunking only apply to non-scalar numeric variables with data
+        if var.ndim == 0 or var.dtype.kind not in "biuf" or 0 in var.shape:
+            return encoding
+        if self.compression is not None:
+            if self.compression == "zlib":
+                encoding["zlib"] = True
+            else:
+                encoding["compression"] = self.compression
+            encoding["shuffle"] = True
+            if self.compression_level is not None:
+                encoding["complevel"] = self.compression_level
+        if any(dim in self.chunks for dim in var.dims):
+            encoding["chunksizes"] = tuple(
+                (
+                    min(self.chunks[dim], size)
+                    if dim in self.chunks
+                    else (1 if dim in unlimited_dims else size)
+                )
+                for dim, size in zip(var.dims, var.shape)
+            )
+        if encoding and is_coord and "_FillValue" not in var.encoding:
+            # Coordinates have no missing values, so don't give them the default _FillValue
+            encoding["_FillValue"] = None
+        return encoding
+
+    def get_encoding(self, ds, unlimited_dims=()):
+        """
+        Get the xarray encoding for each variable of Dataset ds (or an empty dict if all
+        defaults were asked for)
+        """
+        if not (self.compression or self.chunks or self.float32):
+            return {}
+        encoding = {}
+        for name, var in ds.variables.items():
+            is_coord = name in ds.coords or var.dims == (name,)
+            var_encoding = self._get_var_encoding(name, var, is_coord, unlimited_dims)
+            if var_encoding:
+                encoding[name] = var_encoding
+        return encoding
+
+
+def add_netcdf_output_args(parser):
+    """
+    Add the netCDF output options to an argparse parser (or argument group parent)
+    """
+    output_args = parser.add_argument_group(
+        "netCDF output options",
+        "Format, compression, and chunking of the netCDF files written. By default each "
+        + "tool writes the same netCDF-3 format as before.",
+    )
+    output_args.add_argument(
+        "--nc-format",
+        dest="nc_format",
+        choices=NETCDF_FORMATS,
+        default=None,
+        help="netCDF format of output files. [default: the tool's usual format, or "
+        + f"{DEFAULT_NETCDF4_FORMAT} if compression or chunking is asked for]",
+    )
+    output_args.add_argument(
+        "--nc-compression",
+        dest="nc_compression",
+        choices=COMPRESSION_TYPES,
+        default=None,
+        help="Compress output variables with this filter (needs a netCDF-4 format). "
+        + "[default: no compression, or zlib if --nc-compression-level is given]",
+    )
+    output_args.add_argument(
+        "--nc-compression-level",
+        dest="nc_compression_level",
+        type=int,
+        choices=range(1, 10),
+        metavar="{1-9}",
+        default=None,
+        help="Compression level, from 1 (fastest) to 9 (smallest).",
+    )
+    output_args.add_argument(
+        "--nc-chunk",
+        dest="nc_chunks",
+        action="append",
+        metavar="DIM=SIZE",
+        default=None,
+        help="Chunk size for dimension DIM of output variables (needs a netCDF-4 format). "
+        + "Can be given more than once, e.g. --nc-chunk lsmlat=100 --nc-chunk lsmlon=100.",
+    )
+    output_args.add_argument(
+        "--nc-float32",
+        dest="nc_float32",
+        action="store_true",
+        help="Write double-precision variables as single precision, except coordinates "
+        + "(e.g., LONGXY, LATIXY, time).",
+    )
+
+
+def netcdf_output_options_from_args(args):
+    """
+    Get NetcdfOutputOptions from the arguments added by add_netcdf_output_args()
+    """
+    chunks = {}
+    for chunk in args.nc_chunks or []:
+        dim, _, size = chunk.partition("=")
+        try:
+            chunks[dim] = int(size)
+        except ValueError:
+            abort(f"--nc-chunk must be given as DIM=SIZE, not {chunk}")
+        if not dim:
+            abort(f"--nc-chunk must be given as DIM=SIZE, not {chunk}")
+    return NetcdfOutputOptions(
+        nc_format=args.nc_format,
+        compression=args.nc_compression,
+        compression_level=args.nc_compression_level,
+        chunks=chunks,
+        float32=args.nc_float32,
+    )
+
+
+def write_netcdf(
+    ds,
+    path,
+    options=None,
+    default_format="NETCDF3_64BIT",
+    encoding=None,
+    mode="w",
+    unlimited_dims=None,
+):
+    """
+    Write xarray Dataset (or named DataArray) ds to netCDF file path, with NetcdfOutputOptions options.
+    default_format is the tool's usual format (None for xarray's default), used unless the options
+    say otherwise. encoding holds any per-variable encoding the tool needs, which takes precedence
+    over that from the options.
+    """
+    if options is None:
+        options = NetcdfOutputOptions()
+    nc_format = options.get_format(default_format)
+    if isinstance(ds, xr.DataArray):
+        ds = ds.to_dataset()
+    if unlimited_dims is None:
+        unlimited_dims = ds.encoding.get("unlimited_dims", ())
+
+    out_encoding = options.get_encoding(ds, unlimited_dims=unlimited_dims)
+    for name, var_encoding in (encoding or {}).items():
+        out_encoding.setdefault(name, {}).update(var_encoding)
+
+    logger.debug("Writing %s as %s with encoding %s", path, nc_format, out_encoding)
+    ds.to_netcdf(
+        path=path,
+        mode=mode,
+        format=nc_format,
+        encoding=out_encoding or None,
+        unlimited_dims=unlimited_dims or None,
+    )
@@ -14,11 +14,13 @@ from datetime import date
 from getpass import getuser
 
 # -- 3rd party libraries
+import netCDF4
 import numpy as np
 import xarray as xr
 
 # -- import local classes for this script
 from ctsm.utils import abort
+from ctsm.netcdf_output import NetcdfOutputOptions, write_netcdf
 from ctsm.git_utils import get_ctsm_git_short_hash
 
 USRDAT_DIR = "CLM_USRDAT_DIR"
@@ -50,6 +52,8 @@ class BaseCase:
         flag for creating a user_mods directory
     overwrite : bool
         flag for overwriting if the file already exists
+    output_options : NetcdfOutputOptions
+        format, compression, etc. of the netcdf files written (default NETCDF3_64BIT)
 
     Methods
     -------
@@ -61,7 +65,7 @@ class BaseCase:
     write_to_file:
         Writes text to a file, surrounding text with \n characters
     write_to_netcdf:
-        write xarray dataset to netcdf
+        write xarray dataset to netcdf, optionally in chunks along a dimension
     """
 
     def __init__(
@@ -97,6 +101,7 @@ class BaseCase:
         self.create_datm = create_datm
         self.create_user_mods = create_user_mods
         self.overwrite = overwrite
+        self.output_options = NetcdfOutputOptions()
 
     def __str__(self):
         """
@@ -212,7 +217,7 @@ class BaseCase:
         """
         file_out.write("\n{}\n".format(text))
 
-    def write_to_netcdf(self, xr_ds, nc_fname):
+    def write_to_netcdf(self, xr_ds, nc_fname, chunk_size=None, chunk_dim="time"):
         """
         Writes a netcdf file if
             - the file does not exist.
@@ -224,12 +229,24 @@ class BaseCase:
                 The xarray dataset that we are write out to netcdf file.
             nc_fname : str
                 Netcdf file name
+            chunk_size : int, optional
+                If given, read and write the dataset chunk_size steps of chunk_dim at a time (see
+                write_to_netcdf_chunked()), so that a lazily-opened dataset is never loaded whole.
+            chunk_dim : str
+                Dimension to chunk along. Default "time".
         Raises:
             Error and aborts the code if the file exists and --overwrite is not used.
         """
         if not os.path.exists(nc_fname) or self.overwrite:
-            # mode 'w' overwrites file
-            xr_ds.to_netcdf(path=nc_fname, mode="w", format="NETCDF3_64BIT")
+            if chunk_size and xr_ds.sizes.get(chunk_dim, 0) > chunk_size:
+                self.write_to_netcdf_chunked(
+                    xr_ds, nc_fname, chunk_size, chunk_dim, self.output_options
+                )
+            else:
+                # mode 'w' overwrites file
+                write_netcdf(
+                    xr_ds, nc_fname, self.output_options, default_format="NETCDF3_64BIT", mode="w"
+                )
         else:
             err_msg = (
                 "File "
@@ -239,3 +256,58 @@ class BaseCase:
                 + "--overwrite to overwrite the existing files."
             )
             abort(err_msg)
+
+    @staticmethod
+    def write_to_netcdf_chunked(xr_ds, nc_fname, chunk_size, chunk_dim="time", output_options=None):
+        """
+        Writes a netcdf file chunk_size steps of chunk_dim at a time, so that at most one chunk of
+        one variable is in memory at once.
+
+        The first chunk is written (with chunk_dim as the unlimited dimension) by xarray, which
+        defines the file; each later chunk of each variable on chunk_dim is encoded the same way
+        and appended.
+
+        Args:
+            xr_ds : Xarray Dataset
+                The xarray dataset that we are write out to netcdf file.
+            nc_fname : str
+                Netcdf file name
+            chunk_size : int
+                Number of steps of chunk_dim to read and write at a time
+            chunk_dim : str
+                Dimension to chunk along
+            output_options : NetcdfOutputOptions, optional
+                Format, compression, etc. of the file (default NETCDF3_64BIT)
+        """
+        n_steps = xr_ds.sizes[chunk_dim]
+        unlimited_dims = set(xr_ds.encoding.get("unlimited_dims", set())) | {chunk_dim}
+        write_netcdf(
+            xr_ds.isel({chunk_dim: slice(0, chunk_size)}),
+            nc_fname,
+            output_options,
+            default_format="NETCDF3_64BIT",
+            mode="w",
+            unlimited_dims=unlimited_dims,
+        )
+
+        chunked_vars = [name for name, var in xr_ds.variables.items() if chunk_dim in var.dims]
+        with netCDF4.Dataset(nc_fname, "a") as nc_out:
+            # Data are encoded by xarray, as in the first chunk
+            nc_out.set_auto_maskandscale(False)
+            for start in range(chunk_size, n_steps, chunk_size):
+                stop = min(start + chunk_size, n_steps)
+                logger.debug("Writing %s %d-%d of %d", chunk_dim, start, stop, n_steps)
+                ds_chunk = xr_ds.isel({chunk_dim: slice(start, stop)})
+                for name in chunked_vars:
+                    nc_var = nc_out[name]
+                    var = ds_chunk[name].variable.copy(deep=False)
+                    if var.dtype.kind in "mM":
+                        # Encode times relative to the same reference as the first chunk
+                        for attr in ("units", "calendar"):
+                            if attr in nc_var.ncattrs():
+                                var.encoding[attr] = nc_var.getncattr(attr)
+                    var = xr.conventions.encode_cf_variable(var, name=name)
+                    index = tuple(
+                        slice(start, stop) if dim == chunk_dim else slice(None) for dim in var.dims
+                    )
+                    nc_var[index] = var.values
@@ -6,17 +6,21 @@ import logging
 import argparse
 import datetime
 
+import netCDF4
 import numpy as np
 import xarray as xr
 
-# import dask.array as da
-# import dask.dataframe as dd
-import pandas
-
 from ctsm.utils import abort
 
 logger = logging.getLogger(__name__)
 
+# Corners of neighboring elements that are the same node are averages of the same four centers,
+# but summed in a different order; they can differ by roundoff up to this much
+NODE_COORD_TOLERANCE = 1.0e-10
+
+# Default number of nodes or elements written at a time by the block-wise ESMF mesh writer
+DEFAULT_BLOCK_SIZE = 1000000
+
 
 class MeshType:
     """
@@ -56,6 +60,9 @@ class MeshType:
         calculate_corners:
             calculate corner coordinates for each polygon in the grid
 
+        number_nodes:
+            number the unique corners (nodes) of the grid, in order of first appearance
+
         calculate_node_coords:
             extract node coordiantes for nodeCoords variable on mesh file
 
@@ -63,7 +70,8 @@ class MeshType:
             calculate element connectivity for elementConn variable on mesh file
 
         create_esmf
-            write mesh file to netcdf file.
+            write mesh file to netcdf file, either all at once or (for very large meshes) in
+            blocks, optionally compressed.
         """
 
         self.mesh_name = mesh_name
@@ -99,6 +107,8 @@ class MeshType:
         self.center_coords = 1
         # This one is only used when read from a file
         self.num_elem_conn = 1
+        # Cached result of number_nodes()
+        self._node_numbering = None
 
     def read_file(self, xrds_in):
         """
@@ -270,6 +280,7 @@ class MeshType:
         """
 
         self.create_2d_coords()
+        self._node_numbering = None
         # -- pad center_lats for calculating edge gridpoints
         # -- otherwise we cannot calculate the corner coords
         # -- for the edge rows/columns.
@@ -379,18 +390,8 @@ class MeshType:
         if not self.are_corners_set():
             abort("Corners have not been set in the mesh object")
 
-        # -- create an array of corner pairs
-        corner_pairs = np.stack(
-            [self.corner_lons.T.reshape((-1,)).T, self.corner_lats.T.reshape((-1,)).T],
-            axis=1,
-        )
-
-        # -- convert to float32 to find duplicates
-
         # -- remove coordinates that are shared between the elements
-        # node_coords = dd.from_dask_array(corner_pairs).drop_duplicates().values
-        # node_coords.compute_chunk_sizes()
-        node_coords = pandas.DataFrame(data=corner_pairs).drop_duplicates().values
+        node_coords, _ = self.number_nodes()
 
         # -- check size of unique coordinate pairs
         dims = self.mask.shape
@@ -411,6 +412,100 @@ class MeshType:
             logger.error("Including a pole point in your grid is the usual reason for this problem")
             abort("Expected size for element connections is wrong")
 
+    def number_nodes(self):
+        """
+        Number the nodes (unique corners) of the grid.
+
+        Nodes are numbered in order of their first appearance in the corners, taking all the
+        north-west corners (in element order), then all the south-west corners, and so on. Returns
+        the node coordinates (nodeCount, 2) and the (1-based) node number of each corner of each
+        element (elementCount, 4). The result is cached until the corners are recalculated.
+
+        The grid is logically rectangular, so neighboring elements share corners by construction
+        and the numbering can be computed directly. This is checked against the corner
+        coordinates (to within roundoff); if it doesn't hold (e.g., for a degenerate grid with
+        elements collapsed at a pole), corners are instead matched by their exact coordinates.
+        """
+        if self._node_numbering is None:
+            self._node_numbering = self._number_nodes_rectangular()
+            if self._node_numbering is None:
+                logger.info("Grid corners are not shared as expected; matching by coordinates")
+                self._node_numbering = self._number_nodes_by_coords()
+        return self._node_numbering
+
+    def _number_nodes_rectangular(self):
+        """
+        Number the nodes of a logically rectangular grid of n0 x n1 elements, whose (n0 + 1) x
+        (n1 + 1) nodes are shared by construction. Returns None if the corner coordinates don't
+        match that numbering.
+        """
+        if self.corner_lats.shape[1] != 4 or np.ndim(self.center_lat2d) != 2:
+            return None
+        n_0, n_1 = np.shape(self.center_lat2d)
+        n_elem = n_0 * n_1
+        if self.corner_lats.shape[0] != n_elem:
+            return None
+
+        # Node (i, j) is the corner between elements i-1 and i along the first dimension and j-1
+        # and j along the second. Number them in order of first appearance (see number_nodes()):
+        # first the north-west corners of all the elements, then the new south-west corners (on
+        # the last row), the new south-east corners (on the last column), and the last north-east
+        # corner.
+        node_num = np.empty((n_0 + 1, n_1 + 1), dtype=np.int64)
+        node_num[:n_0, :n_1] = np.arange(n_elem).reshape(n_1, n_0).T
+        node_num[n_0, :n_1] = n_elem + np.arange(n_1)
+        node_num[1:, n_1] = n_elem + n_1 + np.arange(n_0)
+        node_num[0, n_1] = n_elem + n_1 + n_0
+
+        # Element e = j * n0 + i has corners (north-west, south-west, south-east, north-east) at
+        # nodes (i, j), (i + 1, j), (i + 1, j + 1), and (i, j + 1)
+        elem_conn = np.stack(
+            [
+                node_num[:-1, :-1].T.ravel(),
+                node_num[1:, :-1].T.ravel(),
+                node_num[1:, 1:].T.ravel(),
+                node_num[:-1, 1:].T.ravel(),
+            ],
+            axis=1,
+        )
+        del node_num
+
+        # Each node takes the coordinates of its first appearance; check that every other
+        # appearance matches, to within roundoff
+        n_nodes = (n_0 + 1) * (n_1 + 1)
+        node_coords = np.empty((n_nodes, 2), dtype=np.float64)
+        for corner in reversed(range(4)):
+            node_coords[elem_conn[:, corner], 0] = self.corner_lons[:, corner]
+            node_coords[elem_conn[:, corner], 1] = self.corner_lats[:, corner]
+        for corner in range(4):
+            for coord, corners in enumerate([self.corner_lons, self.corner_lats]):
+                if not np.allclose(
+                    node_coords[elem_conn[:, corner], coord],
+                    corners[:, corner],
+                    rtol=0.0,
+                    atol=NODE_COORD_TOLERANCE,
+                ):
+                    return None
+
+        # ... and that different nodes don't have the same coordinates
+        if np.unique(_pair_keys(node_coords)).size != n_nodes:
+            return None
+
+        return node_coords, elem_conn + 1
+
+    def _number_nodes_by_coords(self):
+        """
+        Number the nodes of any grid by matching the coordinates of the corners
+        """
+        n_corners = self.corner_lats.shape[1]
+        corner_pairs = np.stack(
+            [self.corner_lons.T.reshape((-1,)), self.corner_lats.T.reshape((-1,))], axis=1
+        )
+        first, inverse = _unique_pairs(corner_pairs)
+        node_coords = corner_pairs[first]
+        elem_conn = inverse.reshape((n_corners, -1)).T + 1
+        return node_coords, elem_conn
+
     def are_corners_set(self):
         """Check if the corners have been set for this object"""
         if isinstance(self.corner_lons, int):
@@ -424,45 +519,12 @@ class MeshType:
         Calculate element connectivity (for 'elementConn' in ESMF mesh).
         In ESMF mesh, 'elementConn' describes how the nodes are connected together.
         """
-        # corners = dd.concat(
-        #    [
-        #        dd.from_dask_array(corner)
-        #        for corner in [
-        #            self.corner_lons.T.reshape((-1,)).T,
-        #            self.corner_lats.T.reshape((-1,)).T,
-        #        ]
-        #    ],
-        #    axis=1,
-        # )
-        # corners.columns = ["lon", "lat"]
-
-        # elem_conn = corners.compute().groupby(["lon", "lat"], sort=False).ngroup() + 1
-        # elem_conn = da.from_array(elem_conn.to_numpy())
-
-        ## -- reshape to write to ESMF
-        # self.elem_conn = elem_conn.T.reshape((4, -1)).T
-
         # Check that corners are set
         if not self.are_corners_set():
             abort("Corners have not been set in the mesh object")
 
-        corners = pandas.concat(
-            [
-                pandas.DataFrame(corner)
-                for corner in [
-                    self.corner_lons.T.reshape((-1,)).T,
-                    self.corner_lats.T.reshape((-1,)).T,
-                ]
-            ],
-            axis=1,
-        )
-        corners.columns = ["lon", "lat"]
-
-        elem_conn = corners.groupby(["lon", "lat"], sort=False).ngroup() + 1
-        elem_conn = elem_conn.to_numpy()
-
         # -- reshape to write to ESMF
-        self.elem_conn = elem_conn.T.reshape((4, -1)).T
+        _, self.elem_conn = self.number_nodes()
 
     def are_nodes_set(self):
         """Check if the nodes have been set for this object"""
@@ -496,7 +558,7 @@ class MeshType:
             axis=1,
         )
 
-    def create_esmf(self, mesh_fname):
+    def create_esmf(self, mesh_fname, block_size=None, compression_level=None):
         """
         Create an ESMF mesh file for the mesh
 
@@ -504,10 +566,23 @@ class MeshType:
         ----------
         mesh_fname : str
             The path to write the ESMF meshfile
-
+        block_size : int, optional
+            If given, write the file block_size (at least 1) nodes or elements at a time (see
+            write_esmf_blocks()) instead of building the whole mesh as an xarray Dataset
+        compression_level : int, optional
+            If given, write the file block-wise, with variables chunked and compressed at this
+            level (1-9)
         """
         if not self.are_nodes_set():
             abort("Nodes  have not been set in the mesh object")
+        if block_size is not None and block_size < 1:
+            abort(f"block_size must be at least 1, not {block_size}")
+
+        if mesh_fname is not None and (block_size or compression_level):
+            self.write_esmf_blocks(
+                mesh_fname, block_size or DEFAULT_BLOCK_SIZE, compression_level=compression_level
+            )
+            return
 
         # create output Xarray dataset
         ds_out = xr.Dataset()
@@ -572,17 +647,176 @@ class MeshType:
                 ds_out[var].encoding["_FillValue"] = None
 
         # -- add global attributes
-        if self.mesh_name:
-            ds_out.attrs["title"] = "ESMF unstructured grid file  " + self.mesh_name
-        else:
-            ds_out.attrs["title"] = "ESMF unstructured grid file  "
-        ds_out.attrs["gridType"] = "unstructured mesh"
-        ds_out.attrs["version"] = "0.9"
-        ds_out.attrs["conventions"] = "ESMFMESH"
-        ds_out.attrs["date_created"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ds_out.attrs.update(self.esmf_global_attrs())
 
         # -- write Xarray dataset to file
         if mesh_fname is not None:
             logger.info("Writing ESMF Mesh file to : %s", mesh_fname)
             ds_out.to_netcdf(mesh_fname)
             logger.info("Successfully created ESMF Mesh file : %s", mesh_fname)
+
+    def esmf_global_attrs(self):
+        """
+        Get the global attributes of the ESMF mesh file
+        """
+        if self.mesh_name:
+            title = "ESMF unstructured grid file  " + self.mesh_name
+        else:
+            title = "ESMF unstructured grid file  "
+        return {
+            "title": title,
+            "gridType": "unstructured mesh",
+            "version": "0.9",
+            "conventions": "ESMFMESH",
+            "date_created": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def write_esmf_blocks(self, mesh_fname, block_size, compression_level=None):
+        """
+        Write the ESMF mesh file block_size nodes or elements at a time, with the same variables
+        and attributes as create_esmf().
+
+        All the variables are defined up front and then filled in blocks. Per-element variables
+        (centerCoords, elementMask, elementArea) are taken block by block from the 2d grid arrays,
+        so that only the node coordinates and element connectivity are ever held whole.
+
+        Parameters
+        ----------
+        mesh_fname : str
+            The path to write the ESMF meshfile
+        block_size : int
+            Number of nodes or elements to write at a time
+        compression_level : int, optional
+            If given, chunk variables by block and compress them at this level (1-9)
+        """
+        from_grid = isinstance(self.center_lon2d, np.ndarray)
+        n_nodes, n_coords = np.shape(self.node_coords)
+        n_elem, max_nodes = np.shape(self.elem_conn)
+
+        logger.info("Writing ESMF Mesh file to : %s", mesh_fname)
+        with netCDF4.Dataset(mesh_fname, "w", format="NETCDF4") as nc_out:
+
+            def create_variable(name, dtype, dims, attrs, fill_value=None):
+                kwargs = {}
+                if compression_level:
+                    shape = [len(nc_out.dimensions[dim]) for dim in dims]
+                    kwargs = {
+                        "zlib": True,
+                        "complevel": compression_level,
+                        "chunksizes": [min(block_size, shape[0])] + shape[1:],
+                    }
+                nc_var = nc_out.createVariable(name, dtype, dims, fill_value=fill_value, **kwargs)
+                nc_var.setncatts(attrs)
+                return nc_var
+
+            # -- define the file
+            if from_grid:
+                nc_out.createDimension("origGridRank", np.ndim(self.center_lon2d))
+            nc_out.createDimension("nodeCount", n_nodes)
+            nc_out.createDimension("coordDim", n_coords)
+            nc_out.createDimension("elementCount", n_elem)
+            nc_out.createDimension("maxNodePElement", max_nodes)
+
+            if from_grid:
+                orig_grid_dims = nc_out.createVariable("origGridDims", np.int32, ("origGridRank",))
+                orig_grid_dims[:] = np.array(self.center_lon2d.shape, dtype=np.int32)
+            node_coords = create_variable(
+                "nodeCoords", np.float64, ("nodeCount", "coordDim"), {"units": self.unit}
+            )
+            elem_conn = create_variable(
+                "elementConn",
+                np.int32,
+                ("elementCount", "maxNodePElement"),
+                {"long_name": "Node indices that define the element connectivity"},
+                fill_value=-1,
+            )
+            if from_grid:
+                num_elem_conn_dtype = np.int32
+            else:
+                num_elem_conn_dtype = np.asarray(self.num_elem_conn).dtype
+            num_elem_conn = create_variable(
+                "numElementConn",
+                num_elem_conn_dtype,
+                ("elementCount",),
+                {"long_name": "Number of nodes per element"},
+            )
+            center_coords = create_variable(
+                "centerCoords", np.float64, ("elementCount", "coordDim"), {"units": self.unit}
+            )
+            elem_mask = create_variable(
+                "elementMask", np.int32, ("elementCount",), {"units": "unitless"}, fill_value=-9999
+            )
+            if self.area is not None:
+                elem_area = create_variable(
+                    "elementArea",
+                    np.asarray(self.area).dtype,
+                    ("elementCount",),
+                    {"units": "radians^2", "long_name": "area weights"},
+                )
+            nc_out.setncatts(self.esmf_global_attrs())
+
+            # -- fill in the nodes
+            for start in range(0, n_nodes, block_size):
+                stop = min(start + block_size, n_nodes)
+                node_coords[start:stop] = np.asarray(self.node_coords[start:stop])
+
+            # -- fill in the elements
+            for start in range(0, n_elem, block_size):
+                stop = min(start + block_size, n_elem)
+                block = np.asarray(self.elem_conn[start:stop])
+                if block.dtype.kind == "f":
+                    block = np.where(np.isnan(block), -1, block)
+                elem_conn[start:stop] = block.astype(np.int32)
+                if from_grid:
+                    num_elem_conn[start:stop] = np.full(stop - start, 4, dtype=np.int32)
+                    center_coords[start:stop] = np.stack(
+                        [
+                            _element_values(self.center_lon2d, start, stop),
+                            _element_values(self.center_lat2d, start, stop),
+                        ],
+                        axis=1,
+                    )
+                else:
+                    num_elem_conn[start:stop] = np.asarray(self.num_elem_conn[start:stop])
+                    center_coords[start:stop] = np.asarray(self.center_coords[start:stop])
+                elem_mask[start:stop] = _element_values(self.mask, start, stop)
+                if self.area is not None:
+                    elem_area[start:stop] = _element_values(self.area, start, stop)
+        logger.info("Successfully created ESMF Mesh file : %s", mesh_fname)
+
+
+def _pair_keys(pairs):
+    """
+    View each row of an (n, 2) array of floats as a single value, for np.unique()
+    """
+    # Adding 0 makes -0.0 match 0.0
+    keys = np.ascontiguousarray(pairs, dtype=np.float64) + 0.0
+    return keys.view(np.dtype((np.void, keys.dtype.itemsize * 2))).ravel()
+
+
+def _unique_pairs(pairs):
+    """
+    Find the unique rows of an (n, 2) array of floats, in order of first appearance. Returns the
+    indices of the first appearance of each unique row, and the (0-based) number of the unique
+    row matching each row.
+    """
+    _, first, inverse = np.unique(_pair_keys(pairs), return_index=True, return_inverse=True)
+
+    # np.unique sorts; renumber in order of first appearance
+    order = np.argsort(first)
+    renumber = np.empty_like(order)
+    renumber[order] = np.arange(order.size)
+    return first[order], renumber[inverse.ravel()]
+
+
+def _element_values(array, start, stop):
+    """
+    Get elements start to stop of a per-element array, which is either 1d or a 2d grid whose
+    elements are numbered as in array.T.reshape((-1,)), without flattening the whole array
+    """
+    array = np.asarray(array)
+    if array.ndim == 1:
+        return array[start:stop]
+    elements = np.arange(start, stop)
+    n_0 = array.shape[0]
+    return array[elements % n_0, elements // n_0]
@@ -51,6 +51,11 @@ import xarray as xr
 from packaging import version
 
 from ctsm.path_utils import path_to_ctsm_root
+from ctsm.netcdf_output import (
+    add_netcdf_output_args,
+    netcdf_output_options_from_args,
+    write_netcdf,
+)
 
 myname = getuser()
 
@@ -139,6 +144,7 @@ def get_parser():
         default=False,
     )
 
+    add_netcdf_output_args(parser)
     return parser
 
 
@@ -700,6 +706,12 @@ def main():
     f_2 = update_metadata(f_2, surf_file, neon_file, zb_flag)
 
     print(f_2.attrs)
-    f_2.to_netcdf(path=wfile, mode="w", format="NETCDF3_64BIT")
+    write_netcdf(
+        f_2,
+        wfile,
+        netcdf_output_options_from_args(args),
+        default_format="NETCDF3_64BIT",
+        mode="w",
+    )
 
     print("Successfully updated surface data file for neon site(" + site_name + "):\n - " + wfile)
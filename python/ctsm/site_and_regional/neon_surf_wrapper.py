@@ -101,127 +101,56 @@ def main():
 
     neon_sites = pd.read_csv("neon_sites_dompft.csv")
 
+    # Write all sites to one sites file, so subset_data only reads the global data once
+    sites_rows = []
+    modify_commands = []
     for _, row in tqdm.tqdm(neon_sites.iterrows()):
         lat = row["Lat"]
         lon = row["Lon"]
         site = row["Site"]
         pft = row["pft"]
         clmsite = "1x1_NEON_" + site
-        print("Now processing site :", site)
-
-        if args.mixed and args.pft_16:
-            # use surface dataset with 16 pfts, and don't overwrite with 100% 1 dominant PFT
-            # don't set crop flag
-            # don't set a dominant pft
-            subset_command = [
-                "./subset_data",
-                "point",
-                "--lat",
-                str(lat),
-                "--lon",
-                str(lon),
-                "--site",
-                clmsite,
-                "--create-surface",
-                "--uniform-snowpack",
-                "--cap-saturation",
-                "--verbose",
-                "--overwrite",
-            ]
-            modify_command = [
-                "./modify_singlept_site_neon",
-                "--neon_site",
-                site,
-                "--surf_dir",
-                "subset_data_single_point",
-                "--16pft",
-            ]
-        elif args.pft_16:
-            # use surface dataset with 16 pfts, but overwrite to 100% 1 dominant PFT
-            # don't set crop flag
-            # set dominant pft
-            subset_command = [
-                "./subset_data",
-                "point",
-                "--lat",
-                str(lat),
-                "--lon",
-                str(lon),
-                "--site",
-                clmsite,
-                "--dompft",
-                str(pft),
-                "--create-surface",
-                "--uniform-snowpack",
-                "--cap-saturation",
-                "--verbose",
-                "--overwrite",
-            ]
-            modify_command = [
-                "./modify_singlept_site_neon",
-                "--neon_site",
-                site,
-                "--surf_dir",
-                "subset_data_single_point",
-                "--16pft",
-            ]
-        elif args.mixed:
-            # use surface dataset with 78 pfts, and don't overwrite with 100% 1 dominant PFT
-            # NOTE: FATES will currently not run with a 78-PFT surface dataset
-            # set crop flag
-            # don't set dominant pft
-            subset_command = [
-                "./subset_data",
-                "point",
-                "--lat",
-                str(lat),
-                "--lon",
-                str(lon),
-                "--site",
-                clmsite,
-                "--crop",
-                "--create-surface",
-                "--uniform-snowpack",
-                "--cap-saturation",
-                "--verbose",
-                "--overwrite",
-            ]
-            modify_command = [
-                "./modify_singlept_site_neon",
-                "--neon_site",
-                site,
-                "--surf_dir",
-                "subset_data_single_point",
-            ]
-        else:
-            # use surface dataset with 78 pfts, and overwrite to 100% 1 dominant PFT
-            # NOTE: FATES will currently not run with a 78-PFT surface dataset
-            # set crop flag
-            # set dominant pft
-            subset_command = [
-                "./subset_data",
-                "point",
-                "--lat",
-                str(lat),
-                "--lon",
-                str(lon),
-                "--site",
-                clmsite,
-                "--crop",
-                "--dompft",
-                str(pft),
-                "--create-surface",
-                "--uniform-snowpack",
-                "--cap-saturation",
-                "--verbose",
-                "--overwrite",
-            ]
-            modify_command = [
-                "./modify_singlept_site_neon",
-                "--neon_site",
-                site,
-                "--surf_dir",
-                "subset_data_single_point",
-            ]
-        execute(subset_command)
+        print("Now adding site :", site)
+
+        sites_row = {"site": clmsite, "lat": lat, "lon": lon}
+        if not args.mixed:
+            # overwrite to 100% 1 dominant PFT
+            sites_row["dompft"] = str(pft)
+        sites_rows.append(sites_row)
+
+        modify_command = [
+            "./modify_singlept_site_neon",
+            "--neon_site",
+            site,
+            "--surf_dir",
+            "subset_data_single_point",
+        ]
+        if args.pft_16:
+            modify_command.append("--16pft")
+        modify_commands.append(modify_command)
+
+    sites_file = "neon_sites_subset_data.csv"
+    pd.DataFrame(sites_rows).to_csv(sites_file, index=False)
+
+    subset_command = [
+        "./subset_data",
+        "point",
+        "--sites-file",
+        sites_file,
+    ]
+    if not args.pft_16:
+        # use surface dataset with 78 pfts
+        # NOTE: FATES will currently not run with a 78-PFT surface dataset
+        # set crop flag
+        subset_command.append("--crop")
+    subset_command += [
+        "--create-surface",
+        "--uniform-snowpack",
+        "--cap-saturation",
+        "--verbose",
+        "--overwrite",
+    ]
+    execute(subset_command)
+
+    for modify_command in modify_commands:
         execute(modify_command)
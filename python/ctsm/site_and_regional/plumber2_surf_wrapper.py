@@ -92,6 +92,8 @@ def main():
 
     plumber2_sites = pd.read_csv("PLUMBER2_sites.csv", skiprows=4)
 
+    # Write all sites to one sites file, so subset_data only reads the global data once
+    sites_rows = []
     for _, row in tqdm.tqdm(plumber2_sites.iterrows()):
         lat = row["Lat"]
         lon = row["Lon"]
@@ -116,67 +118,44 @@ def main():
             cth2 = 0
             cbh2 = 0
         clmsite = "1x1_PLUMBER2_" + site
-        print("Now processing site :", site)
-
+        print("Now adding site :", site)
+
+        sites_row = {
+            "site": clmsite,
+            "lat": lat,
+            "lon": lon,
+            "dompft": f"{int(pft1)} {int(pft2)}",
+            "pctpft": f"{pctpft1} {pctpft2}",
+        }
         if args.pft_16:
             # use surface dataset with 16 pfts, but overwrite to 100% 1 dominant PFT
-            # don't set crop flag
-            # set dominant pft
-            subset_command = [
-                "./subset_data",
-                "point",
-                "--lat",
-                str(lat),
-                "--lon",
-                str(lon),
-                "--site",
-                clmsite,
-                "--dompft",
-                str(pft1),
-                str(pft2),
-                "--pctpft",
-                str(pctpft1),
-                str(pctpft2),
-                "--cth",
-                str(cth1),
-                str(cth2),
-                "--cbh",
-                str(cbh1),
-                str(cbh2),
-                "--create-surface",
-                "--uniform-snowpack",
-                "--cap-saturation",
-                "--verbose",
-                "--overwrite",
-            ]
-        else:
-            # use surface dataset with 78 pfts, and overwrite to 100% 1 dominant PFT
-            # NOTE: FATES will currently not run with a 78-PFT surface dataset
-            # set crop flag
-            # set dominant pft
-            subset_command = [
-                "./subset_data",
-                "point",
-                "--lat",
-                str(lat),
-                "--lon",
-                str(lon),
-                "--site",
-                clmsite,
-                "--crop",
-                "--dompft",
-                str(pft1),
-                str(pft2),
-                "--pctpft",
-                str(pctpft1),
-                str(pctpft2),
-                "--create-surface",
-                "--uniform-snowpack",
-                "--cap-saturation",
-                "--verbose",
-                "--overwrite",
-            ]
-        execute(subset_command)
+            # set canopy heights too
+            sites_row["cth"] = f"{cth1} {cth2}"
+            sites_row["cbh"] = f"{cbh1} {cbh2}"
+        sites_rows.append(sites_row)
+
+    sites_file = "PLUMBER2_sites_subset_data.csv"
+    pd.DataFrame(sites_rows).to_csv(sites_file, index=False)
+
+    subset_command = [
+        "./subset_data",
+        "point",
+        "--sites-file",
+        sites_file,
+    ]
+    if not args.pft_16:
+        # use surface dataset with 78 pfts, and overwrite to 100% 1 dominant PFT
+        # NOTE: FATES will currently not run with a 78-PFT surface dataset
+        # set crop flag
+        subset_command.append("--crop")
+    subset_command += [
+        "--create-surface",
+        "--uniform-snowpack",
+        "--cap-saturation",
+        "--verbose",
+        "--overwrite",
+    ]
+    execute(subset_command)
 
 
 if __name__ == "__main__":
@@ -17,6 +17,7 @@ from ctsm.site_and_regional.base_case import BaseCase, USRDAT_DIR
 from ctsm.site_and_regional.mesh_type import MeshType
 from ctsm.utils import add_tag_to_filename
 from ctsm.utils import abort
+from ctsm.netcdf_output import write_netcdf
 
 logger = logging.getLogger(__name__)
 
@@ -296,9 +297,12 @@ class RegionalCase(BaseCase):
         this_mesh.calculate_nodes()
         this_mesh.create_esmf(self.mesh)
 
-    def create_landuse_at_reg(self, indir, file, user_mods_dir):
+    def create_landuse_at_reg(self, indir, file, user_mods_dir, time_chunk=None):
         """
         Create land use data file for this RegionalCase class.
+
+        If time_chunk is given, the file is read and written that many years at a time, so that
+        memory use is bounded for large regions.
         """
 
         logger.info("Creating landuse file at region: %s", self.tag)
@@ -325,7 +329,7 @@ class RegionalCase(BaseCase):
 
         # mode 'w' overwrites file
         wfile = os.path.join(self.out_dir, fluse_out)
-        self.write_to_netcdf(f_out, wfile)
+        self.write_to_netcdf(f_out, wfile, chunk_size=time_chunk)
         logger.info("Successfully created file (fluse_out) %s", wfile)
         f_in.close()
         f_out.close()
@@ -357,109 +361,108 @@ class RegionalCase(BaseCase):
 
         self.mesh = mesh_out
 
-        node_coords, subset_element, subset_node, conn_dict = self.subset_mesh_at_reg(mesh_in)
+        node_coords, subset_element, subset_node, node_renumber = self.subset_mesh_at_reg(mesh_in)
 
         f_in = xr.open_dataset(mesh_in)
-        self.write_mesh(f_in, node_coords, subset_element, subset_node, conn_dict, mesh_out)
+        self.write_mesh(
+            f_in,
+            node_coords,
+            subset_element,
+            subset_node,
+            node_renumber,
+            mesh_out,
+            output_options=self.output_options,
+        )
+
+    def is_inside_region(self, lons, lats):
+        """
+        Return a boolean array: whether each (lon, lat) point is strictly inside the region bounds
+        given by RegionalCase class.
+        """
+        outside_lon = np.logical_or(lons <= self.lon1, lons >= self.lon2)
+        outside_lat = np.logical_or(lats <= self.lat1, lats >= self.lat2)
+        return ~np.logical_or(outside_lon, outside_lat)
 
     def subset_mesh_at_reg(self, mesh_in):
         """
         This function subsets the mesh based on lat and lon bounds given by RegionalCase class.
+
+        Nodes are kept if they are inside the region; elements are kept if all of their nodes are.
+        Returns the input node coordinates, the (0-based) indices of the elements and nodes to keep,
+        and an array giving the new (1-based) index of each input node (-9999 if not kept).
         """
         f_in = xr.open_dataset(mesh_in)
-        elem_count = len(f_in["elementCount"])
-        elem_conn = f_in["elementConn"]
-        num_elem_conn = f_in["numElementConn"]
-        node_count = len(f_in["nodeCount"])
+        elem_conn = f_in["elementConn"].values
+        num_elem_conn = f_in["numElementConn"].values.astype(int)
         node_coords = f_in["nodeCoords"]
+        node_count = len(f_in["nodeCount"])
 
-        subset_element = []
-        cnt = 0
-
-        for n in range(elem_count):
-            endx = elem_conn[n, : num_elem_conn[n].values].values
-            endx[
-                :,
-            ] -= 1  # convert to zero based index
-            endx = [int(xi) for xi in endx]
-
-            nlon = node_coords[endx, 0].values
-            nlat = node_coords[endx, 1].values
+        # Which nodes are inside the region?
+        node_coords_values = node_coords.values
+        node_mask = self.is_inside_region(node_coords_values[:, 0], node_coords_values[:, 1])
 
-            l1 = np.logical_or(nlon <= self.lon1, nlon >= self.lon2)
-            l2 = np.logical_or(nlat <= self.lat1, nlat >= self.lat2)
+        # Keep elements all of whose nodes are inside the region. Element n only uses the first
+        # numElementConn[n] entries of elementConn[n, :]; the rest are padding.
+        is_conn = np.arange(elem_conn.shape[1])[np.newaxis, :] < num_elem_conn[:, np.newaxis]
+        conn_index = np.where(is_conn, elem_conn, 1).astype(int) - 1  # convert to zero based index
+        elem_mask = np.all(node_mask[conn_index] | ~is_conn, axis=1)
 
-            if np.any(np.logical_or(l1, l2)):
-                pass
-            else:
-                subset_element.append(n)
-                cnt += 1
+        subset_element = np.where(elem_mask)[0]
+        subset_node = np.where(node_mask)[0]
 
-        subset_node = []
-        conn_dict = {}
-        cnt = 1
-        for n in range(node_count):
-            nlon = node_coords[n, 0].values
-            nlat = node_coords[n, 1].values
+        # Renumbering lookup: new 1-based index of each input node, or -9999 if not kept
+        node_renumber = np.full(node_count, -9999)
+        node_renumber[subset_node] = np.arange(1, len(subset_node) + 1)
 
-            l1 = np.logical_or(nlon <= self.lon1, nlon >= self.lon2)
-            l2 = np.logical_or(nlat <= self.lat1, nlat >= self.lat2)
+        return node_coords, subset_element, subset_node, node_renumber
 
-            if np.logical_or(l1, l2):
-                conn_dict[n + 1] = -9999
-            else:
-                subset_node.append(n)
-                conn_dict[n + 1] = cnt
-                cnt += 1
-
-            # -- reverse logic
-            # l1 = np.logical_and(nlon >= self.lon1,nlon <= self.lon2)
-            # l2 = np.logical_and(nlat >= self.lat1,nlat <= self.lat2)
-            # if np.any(l1) and np.any(l2):
-            #    subset_node.append(n)
-            #    conn_dict[n+1] = cnt
-            #    cnt+=1
-            # else:
-            #    conn_dict[n+1] = -9999
-
-        return node_coords, subset_element, subset_node, conn_dict
+    @staticmethod
+    def remap_elem_conn(elem_conn, node_renumber):
+        """
+        Given (1-based) element connectivity and a renumbering lookup from subset_mesh_at_reg(),
+        return the connectivity in terms of the new node indices. Entries that aren't valid node
+        indices (e.g., fill values padding elements with fewer than maxNodePElement nodes) are left
+        unchanged.
+        """
+        elem_conn_out = np.array(elem_conn, dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            is_node = (elem_conn_out >= 1) & (elem_conn_out <= len(node_renumber))
+        elem_conn_out[is_node] = node_renumber[elem_conn_out[is_node].astype(int) - 1]
+        return elem_conn_out
 
     @staticmethod
-    def write_mesh(f_in, node_coords, subset_element, subset_node, conn_dict, mesh_out):
+    def write_mesh(
+        f_in,
+        node_coords,
+        subset_element,
+        subset_node,
+        node_renumber,
+        mesh_out,
+        output_options=None,
+    ):
         # pylint: disable=unused-argument
         """
         This function writes out the subsetted mesh file.
         """
-        corner_pairs = f_in.variables["nodeCoords"][
-            subset_node,
-        ]
+        # Read each variable in full and subset in memory: Much faster than fancy-indexing the file
+        corner_pairs = f_in.variables["nodeCoords"].values[subset_node, :]
         variables = f_in.variables
         global_attributes = f_in.attrs
 
-        max_node_dim = len(f_in["maxNodePElement"])
-
         elem_count = len(subset_element)
-        elem_conn_out = np.empty(shape=[elem_count, max_node_dim])
-        elem_conn_index = f_in.variables["elementConn"][
-            subset_element,
-        ]
-
-        for n in range(elem_count):
-            for m in range(max_node_dim):
-                ndx = int(elem_conn_index[n, m])
-                elem_conn_out[n, m] = conn_dict[ndx]
+        elem_conn_out = RegionalCase.remap_elem_conn(
+            f_in.variables["elementConn"].values[subset_element, :], node_renumber
+        )
 
         num_elem_conn_out = np.empty(
             shape=[
                 elem_count,
             ]
         )
-        num_elem_conn_out[:] = f_in.variables["numElementConn"][
-            subset_element,
-        ]
+        num_elem_conn_out[:] = f_in.variables["numElementConn"].values[subset_element]
 
         center_coords_out = np.empty(shape=[elem_count, 2])
-        center_coords_out[:, :] = f_in.variables["centerCoords"][subset_element, :]
+        center_coords_out[:, :] = f_in.variables["centerCoords"].values[subset_element, :]
 
         if "elementMask" in variables:
             elem_mask_out = np.empty(
@@ -467,9 +470,7 @@ class RegionalCase(BaseCase):
                     elem_count,
                 ]
             )
-            elem_mask_out[:] = f_in.variables["elementMask"][
-                subset_element,
-            ]
+            elem_mask_out[:] = f_in.variables["elementMask"].values[subset_element]
 
         if "elementArea" in variables:
             elem_area_out = np.empty(
@@ -477,9 +478,7 @@ class RegionalCase(BaseCase):
                     elem_count,
                 ]
             )
-            elem_area_out[:] = f_in.variables["elementArea"][
-                subset_element,
-            ]
+            elem_area_out[:] = f_in.variables["elementArea"].values[subset_element]
 
         # -- create output dataset
         f_out = xr.Dataset()
@@ -538,7 +537,7 @@ class RegionalCase(BaseCase):
             "date_created": "{}".format(datetime.now()),
         }
 
-        f_out.to_netcdf(mesh_out)
+        write_netcdf(f_out, mesh_out, output_options, default_format=None)
         logger.info("Successfully created file (mesh_out) %s", mesh_out)
 
     def write_shell_commands(self, namelist):
@@ -7,6 +7,7 @@ This module includes the definition for SinglePointCase class.
 import logging
 import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 # -- 3rd party libraries
 import numpy as np
@@ -14,6 +15,7 @@ import xarray as xr
 
 # -- import local classes for this script
 from ctsm.site_and_regional.base_case import BaseCase, USRDAT_DIR, DatmFiles
+from ctsm.site_and_regional.spatial_index import get_gridcell_index
 from ctsm.utils import add_tag_to_filename, ensure_iterable
 
 logger = logging.getLogger(__name__)
@@ -26,6 +28,56 @@ MAX_PFT = 78  # for runs with explicit crops
 FIRST_MONTH = 1
 LAST_MONTH = 12
 
+# -- names of the (2-d lon, 2-d lat, x dimension, y dimension) of each type of input file
+SURF_COORDS = ("LONGXY", "LATIXY", "lsmlon", "lsmlat")
+DOMAIN_COORDS = ("xc", "yc", "ni", "nj")
+DATM_COORDS = ("LONGXY", "LATIXY", "lon", "lat")
+
+
+def extract_points(filename, coord_names, plons, plats):
+    """
+    Extract the gridcells nearest to many points from one file, reading the file only once.
+
+    Parameters
+    ----------
+        filename (str) : name of the netcdf file
+        coord_names (tuple) : names of the file's 2-d lon and lat variables and x and y dimensions
+            (e.g., SURF_COORDS)
+        plons, plats (array-like) : longitudes and latitudes of the points
+
+    Returns
+    -------
+        f_points (list of xarray Datasets): for each point, its nearest gridcell, in the same form
+            as SinglePointCase.select_nearest_gridcell() would give
+    """
+    lon_varname, lat_varname, x_dim, y_dim = coord_names
+    f_in = BaseCase.create_1d_coord(filename, lon_varname, lat_varname, x_dim, y_dim)
+    gridcell_index = SinglePointCase.get_gridcell_index_for(
+        f_in, lon_varname, lat_varname, x_dim, y_dim
+    )
+    y_index, x_index, _ = gridcell_index.query_many(plons, plats)
+
+    # Read all the points at once
+    f_all = f_in.isel(
+        {y_dim: xr.DataArray(y_index, dims="point"), x_dim: xr.DataArray(x_index, dims="point")}
+    ).load()
+    f_in.close()
+    return [f_all.isel(point=i) for i in range(len(y_index))]
+
+
+def extract_datm_at_points(single_points, file_in, files_out):
+    """
+    Extract one DATM file at many points (reading the file only once) and write each point's
+    gridcell to the corresponding output file. Module-level so that it can be run in worker
+    processes.
+    """
+    plons = [single_point.plon for single_point in single_points]
+    plats = [single_point.plat for single_point in single_points]
+    f_points = extract_points(file_in, DATM_COORDS, plons, plats)
+    for single_point, file_out, f_point in zip(single_points, files_out, f_points):
+        logger.debug(file_out)
+        single_point.extract_datm_at(file_in, file_out, f_point=f_point)
+
 
 class SinglePointCase(BaseCase):
     """
@@ -76,6 +128,13 @@ class SinglePointCase(BaseCase):
         create a tag for single point which is the site name
         or the "lon-lat" format if the site name does not exist.
 
+    get_nearest_index:
+        Get the (y, x) indices of the gridcell of a file nearest to the single point.
+
+    select_nearest_gridcell:
+        Extract the gridcell nearest to the single point, using a cached
+        great-circle spatial index for the grid.
+
     create_domain_at_point
         Create domain file at a single point.
 
@@ -310,7 +369,60 @@ class SinglePointCase(BaseCase):
         logger.info(" - dominant pft(s) : %s", self.dom_pft)
         logger.info(" - percentage of dominant pft(s) : %s", self.pct_pft)
 
-    def create_domain_at_point(self, indir, file):
+    @staticmethod
+    def get_gridcell_index_for(f_in, lon_varname, lat_varname, x_dim, y_dim):
+        """
+        Get the (cached) great-circle spatial index for the grid of a Dataset, given the names of
+        its 2-d longitude and latitude variables and its x and y dimensions.
+        """
+        lon = f_in[lon_varname].transpose(y_dim, x_dim).values
+        lat = f_in[lat_varname].transpose(y_dim, x_dim).values
+        return get_gridcell_index(lon, lat)
+
+    def get_nearest_index(self, filename, coord_names):
+        """
+        Get the (y, x) indices of the gridcell of a file nearest to plon/plat, e.g. to reuse for
+        other files on the same grid (see open_at_point()).
+        """
+        f_in = self.create_1d_coord(filename, *coord_names)
+        gridcell_index = self.get_gridcell_index_for(f_in, *coord_names)
+        f_in.close()
+        return gridcell_index.query(self.plon, self.plat)
+
+    def select_nearest_gridcell(self, f_in, lon_varname, lat_varname, x_dim, y_dim):
+        """
+        Extract the gridcell of a Dataset nearest (by great-circle distance) to plon/plat.
+
+        Unlike sel(method="nearest") on 1-d coordinates, this works on unstructured grids and
+        regardless of whether the grid and point use the same longitude convention.
+        """
+        gridcell_index = self.get_gridcell_index_for(f_in, lon_varname, lat_varname, x_dim, y_dim)
+        y_index, x_index = gridcell_index.query(self.plon, self.plat)
+        return f_in.isel({y_dim: y_index, x_dim: x_index})
+
+    def open_at_point(self, filename, coord_names, f_point=None, point_index=None):
+        """
+        Open a file and extract the gridcell nearest to plon/plat. Returns the opened file (to be
+        closed by the caller) and the extracted gridcell.
+
+        If f_point is given (e.g., from extract_points()), the file isn't read; f_point is returned
+        as both the opened file and the extracted gridcell. If point_index is given (e.g., from
+        get_nearest_index() on another file on the same grid), that (y, x) gridcell is extracted
+        without looking up the nearest gridcell again.
+        """
+        if f_point is not None:
+            return f_point, f_point
+
+        # create 1d coordinate variables to enable sel() method
+        f_in = self.create_1d_coord(filename, *coord_names)
+
+        # extract gridcell closest to plon/plat
+        if point_index is not None:
+            _, _, x_dim, y_dim = coord_names
+            return f_in, f_in.isel({y_dim: point_index[0], x_dim: point_index[1]})
+        return f_in, self.select_nearest_gridcell(f_in, *coord_names)
+
+    def create_domain_at_point(self, indir, file, f_point=None):
         """
         Create domain file for this SinglePointCase class.
         """
@@ -323,11 +435,8 @@ class SinglePointCase(BaseCase):
         logger.info("fdomain_in:  %s", fdomain_in)
         logger.info("fdomain_out: %s", os.path.join(self.out_dir, fdomain_out))
 
-        # create 1d coordinate variables to enable sel() method
-        f_in = self.create_1d_coord(fdomain_in, "xc", "yc", "ni", "nj")
-
         # extract gridcell closest to plon/plat
-        f_out = f_in.sel(ni=self.plon, nj=self.plat, method="nearest")
+        f_in, f_out = self.open_at_point(fdomain_in, DOMAIN_COORDS, f_point)
 
         # expand dimensions
         f_out = f_out.expand_dims(["nj", "ni"])
@@ -342,9 +451,11 @@ class SinglePointCase(BaseCase):
         f_in.close()
         f_out.close()
 
-    def create_landuse_at_point(self, indir, file, user_mods_dir):
+    def create_landuse_at_point(self, indir, file, user_mods_dir, f_point=None, time_chunk=None):
         """
         Create landuse file at a single point.
+
+        If time_chunk is given, the file is read and written that many years at a time.
         """
         logger.info("----------------------------------------------------------------------")
         logger.info(
@@ -359,11 +470,8 @@ class SinglePointCase(BaseCase):
         logger.info("fluse_in:  %s", fluse_in)
         logger.info("fluse_out: %s", os.path.join(self.out_dir, fluse_out))
 
-        # create 1d coordinate variables to enable sel() method
-        f_in = self.create_1d_coord(fluse_in, "LONGXY", "LATIXY", "lsmlon", "lsmlat")
-
         # extract gridcell closest to plon/plat
-        f_out = f_in.sel(lsmlon=self.plon, lsmlat=self.plat, method="nearest")
+        f_in, f_out = self.open_at_point(fluse_in, SURF_COORDS, f_point)
 
         # expand dimensions
         f_out = f_out.expand_dims(["lsmlat", "lsmlon"])
@@ -383,7 +491,7 @@ class SinglePointCase(BaseCase):
         f_out.attrs["Created_from"] = fluse_in
 
         wfile = os.path.join(self.out_dir, fluse_out)
-        self.write_to_netcdf(f_out, wfile)
+        self.write_to_netcdf(f_out, wfile, chunk_size=time_chunk)
         logger.info("Successfully created file (fluse_out), %s", wfile)
         f_in.close()
         f_out.close()
@@ -394,11 +502,17 @@ class SinglePointCase(BaseCase):
                 line = "flanduse_timeseries = '${}'".format(os.path.join(USRDAT_DIR, fluse_out))
                 self.write_to_file(line, nl_clm)
 
-    def modify_surfdata_atpoint(self, f_orig):
+    def modify_surfdata_atpoint(self, f_orig, in_place=False):
         """
         Function to modify surface dataset based on the user flags chosen.
+
+        If in_place, f_orig (which must already be loaded into memory) is modified and returned
+        instead of a copy of it.
         """
-        f_mod = f_orig.copy(deep=True)
+        if in_place:
+            f_mod = f_orig
+        else:
+            f_mod = f_orig.copy(deep=True)
 
         # -- modify surface data properties
         if self.dom_pft is not None:
@@ -473,7 +587,7 @@ class SinglePointCase(BaseCase):
 
         return f_mod
 
-    def create_surfdata_at_point(self, indir, file, user_mods_dir, specify_fsurf_out):
+    def create_surfdata_at_point(self, indir, file, user_mods_dir, specify_fsurf_out, f_point=None):
         """
         Create surface data file at a single point.
         """
@@ -494,16 +608,14 @@ class SinglePointCase(BaseCase):
         logger.info("fsurf_in:  %s", fsurf_in)
         logger.info("fsurf_out: %s", os.path.join(self.out_dir, fsurf_out))
 
-        # create 1d coordinate variables to enable sel() method
-        f_in = self.create_1d_coord(fsurf_in, "LONGXY", "LATIXY", "lsmlon", "lsmlat")
-
         # extract gridcell closest to plon/plat
-        f_tmp = f_in.sel(lsmlon=self.plon, lsmlat=self.plat, method="nearest")
+        f_in, f_tmp = self.open_at_point(fsurf_in, SURF_COORDS, f_point)
 
-        # expand dimensions
-        f_tmp = f_tmp.expand_dims(["lsmlat", "lsmlon"]).copy(deep=True)
+        # read just this gridcell from each variable (one hyperslab read per variable), then expand
+        # dimensions. The copy makes the (small) arrays writeable, so they can be modified in place.
+        f_tmp = f_tmp.load().expand_dims(["lsmlat", "lsmlon"]).copy(deep=True)
 
-        f_out = self.modify_surfdata_atpoint(f_tmp)
+        f_out = self.modify_surfdata_atpoint(f_tmp, in_place=True)
 
         # specify dimension order
         f_out = f_out.transpose(
@@ -546,7 +658,7 @@ class SinglePointCase(BaseCase):
                 line = "fsurdat = '${}'".format(os.path.join(USRDAT_DIR, fsurf_out))
                 self.write_to_file(line, nl_clm)
 
-    def create_datmdomain_at_point(self, datm_tuple: DatmFiles):
+    def create_datmdomain_at_point(self, datm_tuple: DatmFiles, f_point=None):
         """
         Create DATM domain file at a single point
         """
@@ -564,11 +676,8 @@ class SinglePointCase(BaseCase):
         logger.info("fdatmdomain_in:  %s", fdatmdomain_in)
         logger.info("fdatmdomain out: %s", os.path.join(self.out_dir, fdatmdomain_out))
 
-        # create 1d coordinate variables to enable sel() method
-        f_in = self.create_1d_coord(fdatmdomain_in, "xc", "yc", "ni", "nj")
-
         # extract gridcell closest to plon/plat
-        f_out = f_in.sel(ni=self.plon, nj=self.plat, method="nearest")
+        f_in, f_out = self.open_at_point(fdatmdomain_in, DOMAIN_COORDS, f_point)
 
         # expand dimensions
         f_out = f_out.expand_dims(["nj", "ni"])
@@ -583,15 +692,12 @@ class SinglePointCase(BaseCase):
         f_in.close()
         f_out.close()
 
-    def extract_datm_at(self, file_in, file_out):
+    def extract_datm_at(self, file_in, file_out, f_point=None, point_index=None):
         """
         Create a DATM dataset at a point.
         """
-        # create 1d coordinate variables to enable sel() method
-        f_in = self.create_1d_coord(file_in, "LONGXY", "LATIXY", "lon", "lat")
-
         # extract gridcell closest to plon/plat
-        f_out = f_in.sel(lon=self.plon, lat=self.plat, method="nearest")
+        f_in, f_out = self.open_at_point(file_in, DATM_COORDS, f_point, point_index)
 
         # expand dimensions
         f_out = f_out.expand_dims(["lat", "lon"])
@@ -637,19 +743,19 @@ class SinglePointCase(BaseCase):
         self.write_to_file("{}:mapalgo=none".format(streamname), file)
         self.write_to_file("{}:meshfile=none".format(streamname), file)
 
-    def create_datm_at_point(self, datm_tuple: DatmFiles, datm_syr, datm_eyr, datm_streams_file):
+    def get_datm_files(self, datm_tuple: DatmFiles, datm_syr, datm_eyr):
         """
-        Create all of a DATM dataset at a point.
-        """
-        logger.info("----------------------------------------------------------------------")
-        logger.info("Creating DATM files at %s, %s", self.plon.__str__(), self.plat.__str__())
+        Get the lists of DATM files to subset for this point.
 
-        # --  create data files
+        Returns the input files, the corresponding output files, (for the
+        user_nl_datm_streams file) the lists of solar, precipitation, and TPQW output files
+        relative to $CLM_USRDAT_DIR, and the index of each input file's stream in that tuple of
+        lists.
+        """
         infile = []
         outfile = []
-        solarfiles = []
-        precfiles = []
-        tpqwfiles = []
+        file_streams = []
+        stream_files = ([], [], [])
         for year in range(datm_syr, datm_eyr + 1):
             ystr = str(year)
             for month in range(FIRST_MONTH, LAST_MONTH + 1):
@@ -679,29 +785,76 @@ class SinglePointCase(BaseCase):
                 ftpqw2 = "{}{}.{}.nc".format(datm_tuple.tag_tpqw, self.tag, dtag)
 
                 outdir = os.path.join(self.out_dir, datm_tuple.outdir)
-                infile += [fsolar, fprecip, ftpqw]
-                outfile += [
-                    os.path.join(outdir, fsolar2),
-                    os.path.join(outdir, fprecip2),
-                    os.path.join(outdir, ftpqw2),
+                for stream, (file_in, file_out) in enumerate(
+                    [(fsolar, fsolar2), (fprecip, fprecip2), (ftpqw, ftpqw2)]
+                ):
+                    infile.append(file_in)
+                    outfile.append(os.path.join(outdir, file_out))
+                    file_streams.append(stream)
+                    stream_files[stream].append(
+                        os.path.join("${}".format(USRDAT_DIR), datm_tuple.outdir, file_out)
+                    )
+
+        return infile, outfile, stream_files, file_streams
+
+    def write_datm_streams(self, datm_tuple: DatmFiles, stream_files, datm_streams_file):
+        """
+        Write the lines for all DATM streams to the user_nl_datm_streams file, if creating user
+        mods. stream_files is as returned by get_datm_files().
+        """
+        if self.create_user_mods:
+            solarfiles, precfiles, tpqwfiles = stream_files
+            with open(datm_streams_file, "a") as file:
+                self.write_datm_streams_lines(datm_tuple.name_solar, solarfiles, file)
+                self.write_datm_streams_lines(datm_tuple.name_prec, precfiles, file)
+                self.write_datm_streams_lines(datm_tuple.name_tpqw, tpqwfiles, file)
+
+    def create_datm_at_point(
+        self, datm_tuple: DatmFiles, datm_syr, datm_eyr, datm_streams_file, jobs=1
+    ):
+        """
+        Create all of a DATM dataset at a point.
+
+        The nearest gridcell is looked up once per stream (in the first month's file) and reused
+        for all the other months. With jobs > 1, files are extracted in that many worker
+        processes.
+        """
+        logger.info("----------------------------------------------------------------------")
+        logger.info("Creating DATM files at %s, %s", self.plon.__str__(), self.plat.__str__())
+
+        # --  create data files
+        infile, outfile, stream_files, file_streams = self.get_datm_files(
+            datm_tuple, datm_syr, datm_eyr
+        )
+
+        # Nearest gridcell in each stream, looked up in its first file
+        point_indices = {}
+        for file_in, stream in zip(infile, file_streams):
+            if stream not in point_indices:
+                point_indices[stream] = self.get_nearest_index(file_in, DATM_COORDS)
+
+        if jobs > 1:
+            logger.info("Extracting DATM files with %d worker processes", jobs)
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [
+                    executor.submit(
+                        self.extract_datm_at,
+                        infile[idx],
+                        out_f,
+                        point_index=point_indices[file_streams[idx]],
+                    )
+                    for idx, out_f in enumerate(outfile)
                 ]
-                solarfiles.append(
-                    os.path.join("${}".format(USRDAT_DIR), datm_tuple.outdir, fsolar2)
-                )
-                precfiles.append(
-                    os.path.join("${}".format(USRDAT_DIR), datm_tuple.outdir, fprecip2)
+                for future in futures:
+                    future.result()
+        else:
+            for idx, out_f in enumerate(outfile):
+                logger.debug(out_f)
+                self.extract_datm_at(
+                    infile[idx], out_f, point_index=point_indices[file_streams[idx]]
                 )
-                tpqwfiles.append(os.path.join("${}".format(USRDAT_DIR), datm_tuple.outdir, ftpqw2))
-
-        for idx, out_f in enumerate(outfile):
-            logger.debug(out_f)
-            self.extract_datm_at(infile[idx], out_f)
 
         logger.info("All DATM files are created in: %s", datm_tuple.outdir)
 
         # write to user_nl_datm_streams if specified
-        if self.create_user_mods:
-            with open(datm_streams_file, "a") as file:
-                self.write_datm_streams_lines(datm_tuple.name_solar, solarfiles, file)
-                self.write_datm_streams_lines(datm_tuple.name_prec, precfiles, file)
-                self.write_datm_streams_lines(datm_tuple.name_tpqw, tpqwfiles, file)
+        self.write_datm_streams(datm_tuple, stream_files, datm_streams_file)
@@ -0,0 +1,124 @@
+"""
+This module includes the definition for the GridcellIndex class, a great-circle spatial index for
+finding the gridcell nearest to a point.
+
+Gridcell centers are converted to points on the unit sphere and put into a KD-tree. For points on
+the unit sphere, the straight-line (chord) distance increases monotonically with the great-circle
+distance, so the nearest point in the KD-tree is the nearest gridcell along the Earth's surface.
+This works the same for rectilinear and unstructured (e.g., ne or mpas) grids, at the poles, and
+regardless of whether longitudes are given in [0, 360) or [-180, 180).
+
+Building the index is the expensive part, so indices are cached per grid (see
+get_gridcell_index()): every file on the same grid in one subset_data invocation shares one index.
+Only the most recently used few are kept, since an index for a fine grid can take hundreds of MB.
+"""
+# -- Import libraries
+# -- Import Python Standard Libraries
+import hashlib
+import logging
+from collections import OrderedDict
+
+# -- 3rd party libraries
+import numpy as np
+from scipy.spatial import cKDTree
+
+logger = logging.getLogger(__name__)
+
+# Mean radius of the Earth (km), for reporting distances
+EARTH_RADIUS_KM = 6371.0
+
+# Cache of GridcellIndex objects, keyed on the hash of the grid's coordinate arrays. Only the most
+# recently used GRIDCELL_INDEX_CACHE_SIZE indices are kept.
+GRIDCELL_INDEX_CACHE_SIZE = 4
+_GRIDCELL_INDEX_CACHE = OrderedDict()
+
+
+def lonlat_to_xyz(lon, lat):
+    """
+    Convert longitude and latitude (degrees) to Cartesian coordinates on the unit sphere. Returns an
+    array with shape (..., 3).
+    """
+    lon_rad = np.deg2rad(np.asarray(lon, dtype=np.float64))
+    lat_rad = np.deg2rad(np.asarray(lat, dtype=np.float64))
+    cos_lat = np.cos(lat_rad)
+    return np.stack(
+        [cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)], axis=-1
+    )
+
+
+class GridcellIndex:
+    """
+    Great-circle nearest-gridcell index for a grid with 2-d (y, x) longitude and latitude arrays.
+
+    ...
+
+    Attributes
+    ----------
+    shape : tuple
+        shape (ny, nx) of the grid
+
+    Methods
+    -------
+    query(plon, plat)
+        Get the (y, x) indices of the gridcell nearest to a point
+    query_many(plons, plats)
+        Get the (y, x) indices of the gridcells nearest to many points, and their distances
+    """
+
+    def __init__(self, lon, lat):
+        """
+        Initializes GridcellIndex with 2-d (or 1-d, for a single row) arrays of gridcell center
+        longitudes and latitudes (degrees).
+        """
+        lon = np.atleast_2d(lon)
+        lat = np.atleast_2d(lat)
+        if lon.shape != lat.shape:
+            raise ValueError(f"lon and lat shapes differ: {lon.shape} vs. {lat.shape}")
+        self.shape = lon.shape
+        self._tree = cKDTree(lonlat_to_xyz(lon.ravel(), lat.ravel()))
+
+    def query_many(self, plons, plats):
+        """
+        Get the (y, x) indices of the gridcells nearest to each of many points.
+
+        Returns the y indices, the x indices, and the great-circle distances (km) from each point
+        to its nearest gridcell center.
+        """
+        chord, flat_index = self._tree.query(lonlat_to_xyz(plons, plats))
+        y_index, x_index = np.unravel_index(flat_index, self.shape)
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+        return y_index, x_index, distance
+
+    def query(self, plon, plat):
+        """
+        Get the (y, x) indices of the gridcell nearest to one point.
+        """
+        y_index, x_index, _ = self.query_many(plon, plat)
+        return int(y_index), int(x_index)
+
+
+def _hash_array(array):
+    """
+    Hash the contents, dtype, and shape of a numpy array
+    """
+    array = np.ascontiguousarray(array)
+    hasher = hashlib.sha256(array.tobytes())
+    hasher.update(str((array.dtype, array.shape)).encode())
+    return hasher.hexdigest()
+
+
+def get_gridcell_index(lon, lat):
+    """
+    Get the GridcellIndex for a grid, given its 2-d longitude and latitude arrays. Indices are
+    cached on the hash of those arrays (keeping the most recently used GRIDCELL_INDEX_CACHE_SIZE),
+    so files sharing a grid only build the index once.
+    """
+    key = (_hash_array(lon), _hash_array(lat))
+    if key in _GRIDCELL_INDEX_CACHE:
+        _GRIDCELL_INDEX_CACHE.move_to_end(key)
+    else:
+        logger.debug("Building spatial index for grid of shape %s", np.shape(lon))
+        _GRIDCELL_INDEX_CACHE[key] = GridcellIndex(lon, lat)
+        while len(_GRIDCELL_INDEX_CACHE) > GRIDCELL_INDEX_CACHE_SIZE:
+            _GRIDCELL_INDEX_CACHE.popitem(last=False)
+    return _GRIDCELL_INDEX_CACHE[key]
@@ -38,6 +38,9 @@ To run this script the following packages are required:
 To run the script for a single point:
     ./subset_data.py point
 
+To run the script for many single points at once (reading each global file only once):
+    ./subset_data.py point --sites-file sites.csv
+
 To run the script for a region:
     ./subset_data.py region
 
@@ -53,21 +56,30 @@ To remove NPL from your environment on Cheyenne/Casper:
 
 # -- standard libraries
 import os
+import csv
 import logging
 import textwrap
 import configparser
 
 from getpass import getuser
+from concurrent.futures import ProcessPoolExecutor
 import argparse
 from argparse import ArgumentParser
 
 # -- import local classes for this script
 from ctsm.site_and_regional.base_case import DatmFiles
-from ctsm.site_and_regional.single_point_case import SinglePointCase
+from ctsm.site_and_regional.single_point_case import (
+    SinglePointCase,
+    extract_points,
+    extract_datm_at_points,
+    SURF_COORDS,
+    DOMAIN_COORDS,
+)
 from ctsm.site_and_regional.regional_case import RegionalCase
 from ctsm.args_utils import plon_type, plat_type
 from ctsm.path_utils import path_to_ctsm_root
 from ctsm.utils import abort
+from ctsm.netcdf_output import add_netcdf_output_args, netcdf_output_options_from_args
 
 # -- import ctsm logging flags
 from ctsm.ctsm_logging import (
@@ -128,6 +140,18 @@ def get_parser():
         type=str,
         default="",
     )
+    pt_parser.add_argument(
+        "--sites-file",
+        help="CSV file of sites to extract in one pass, instead of a single --lat/--lon. "
+        "Must have columns site, lat, and lon; may also have columns dompft, pctpft, cth, and "
+        "cbh (with multiple values separated by spaces), which override the command-line "
+        "options for that site. Each global input file is only read once for all sites.",
+        action="store",
+        dest="sites_file",
+        required=False,
+        type=str,
+        default=None,
+    )
     pt_parser.add_argument(
         "--uniform-snowpack",
         help="Modify surface data to have a uniform snow fraction.",
@@ -193,6 +217,16 @@ def get_parser():
         default=None,
         nargs="*",
     )
+    pt_parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of worker processes to use for extracting DATM files in parallel. Output "
+        "is identical to that of the default serial extraction. [default: %(default)s]",
+        action="store",
+        dest="jobs",
+        type=int,
+        default=1,
+    )
 
     # -- region-specific parser options
     rg_parser.add_argument(
@@ -282,6 +316,17 @@ def get_parser():
             dest="create_landuse",
             required=False,
         )
+        subparser.add_argument(
+            "--landuse-time-chunk",
+            help="Read and write the landuse file this many years at a time, to bound memory "
+            "use (e.g., for large regions of high-resolution landuse files). "
+            "[default: all years at once]",
+            action="store",
+            dest="landuse_time_chunk",
+            required=False,
+            type=int,
+            default=None,
+        )
         subparser.add_argument(
             "--create-datm",
             help="Create DATM forcing data at a single point/region.",
@@ -388,6 +433,7 @@ def get_parser():
             type=str,
             default="defaults.cfg",
         )
+        add_netcdf_output_args(subparser)
         add_logging_args(subparser)
 
     # -- print help for both subparsers
@@ -479,6 +525,25 @@ def check_args(args):
         )
         raise argparse.ArgumentError(None, err_msg)
 
+    if getattr(args, "sites_file", None):
+        if not os.path.exists(args.sites_file):
+            err_msg = textwrap.dedent(
+                """\
+                    \n ------------------------------------
+                    \n Entered sites file does not exist"
+                    """
+            )
+            raise argparse.ArgumentError(None, err_msg)
+        if args.out_surface:
+            err_msg = textwrap.dedent(
+                """\
+                    \n ------------------------------------
+                    \n out-surface option can not be used with --sites-file
+                    \n (each site gets its own surface dataset)"
+                    """
+            )
+            raise argparse.ArgumentError(None, err_msg)
+
     if args.out_surface and os.path.exists(args.out_surface) and not args.overwrite:
         err_msg = textwrap.dedent(
             """\
@@ -680,6 +745,7 @@ def subset_point(args, file_dict: dict):
         out_dir=args.out_dir,
         overwrite=args.overwrite,
     )
+    single_point.output_options = netcdf_output_options_from_args(args)
 
     logger.debug(single_point)
 
@@ -695,7 +761,10 @@ def subset_point(args, file_dict: dict):
     # --  Create CTSM transient landuse data file
     if single_point.create_landuse:
         single_point.create_landuse_at_point(
-            file_dict["fluse_dir"], file_dict["fluse_in"], args.user_mods_dir
+            file_dict["fluse_dir"],
+            file_dict["fluse_in"],
+            args.user_mods_dir,
+            time_chunk=args.landuse_time_chunk,
         )
 
     # --  Create single point atmospheric forcing data
@@ -706,7 +775,7 @@ def subset_point(args, file_dict: dict):
         # subset the DATM data
         nl_datm = os.path.join(args.user_mods_dir, "user_nl_datm_streams")
         single_point.create_datm_at_point(
-            file_dict["datm_tuple"], args.datm_syr, args.datm_eyr, nl_datm
+            file_dict["datm_tuple"], args.datm_syr, args.datm_eyr, nl_datm, jobs=args.jobs
         )
 
     # -- Write shell commands
@@ -717,6 +786,175 @@ def subset_point(args, file_dict: dict):
     logger.info("Successfully ran script for single point.")
 
 
+def read_sites_file(sites_file, args):
+    """
+    Read a CSV file of sites for subset_points().
+
+    Returns a list of dicts, one per site, with the SinglePointCase arguments that vary by site:
+    plat, plon, site_name, dom_pft, pct_pft, cth, and cbh. Columns other than site, lat, and lon are
+    optional; where missing or empty, the command-line value is used.
+    """
+    # Optional columns: (SinglePointCase argument, type of each value)
+    list_columns = {
+        "dompft": ("dom_pft", int),
+        "pctpft": ("pct_pft", float),
+        "cth": ("cth", float),
+        "cbh": ("cbh", float),
+    }
+
+    sites = []
+    with open(sites_file, "r", newline="") as csv_file:
+        reader = csv.DictReader(csv_file)
+        missing = {"site", "lat", "lon"} - set(reader.fieldnames or [])
+        if missing:
+            abort(f"Sites file {sites_file} is missing column(s): {', '.join(sorted(missing))}")
+        for row in reader:
+            site = {
+                "plat": plat_type(row["lat"]),
+                "plon": plon_type(row["lon"]),
+                "site_name": row["site"].strip(),
+            }
+            for column, (arg_name, arg_type) in list_columns.items():
+                value = (row.get(column) or "").strip()
+                if value:
+                    site[arg_name] = [arg_type(x) for x in value.split()]
+                else:
+                    site[arg_name] = getattr(args, arg_name)
+            sites.append(site)
+
+    if not sites:
+        abort(f"No sites found in {sites_file}")
+    site_names = [site["site_name"] for site in sites]
+    if len(set(site_names)) != len(site_names):
+        abort(f"Site names in {sites_file} must be unique")
+    return sites
+
+
+def subset_points(args, file_dict: dict, sites, cesmroot):
+    """
+    Subsets surface, land use, and/or DATM files at many single points (sites).
+
+    Each global input file is opened once, and all the sites' gridcells are read from it at once
+    (see extract_points()). Each site's output files are tagged with its name and written to
+    args.out_dir; if creating user mods, each site gets its own subdirectory of args.user_mods_dir.
+    """
+
+    logger.info("----------------------------------------------------------------------------")
+    logger.info("This script extracts %d single points from the global CTSM datasets.", len(sites))
+
+    num_pft = int(determine_num_pft(args.crop_flag))
+
+    # --  Create SinglePoint Objects
+    single_points = []
+    user_mods_dirs = []
+    for site in sites:
+        single_point = SinglePointCase(
+            plat=site["plat"],
+            plon=site["plon"],
+            site_name=site["site_name"],
+            create_domain=args.create_domain,
+            create_surfdata=args.create_surfdata,
+            create_landuse=args.create_landuse,
+            create_datm=args.create_datm,
+            create_user_mods=args.create_user_mods,
+            dom_pft=site["dom_pft"],
+            evenly_split_cropland=args.evenly_split_cropland,
+            pct_pft=site["pct_pft"],
+            num_pft=num_pft,
+            cth=site["cth"],
+            cbh=site["cbh"],
+            include_nonveg=args.include_nonveg,
+            uni_snow=args.uni_snow,
+            cap_saturation=args.cap_saturation,
+            out_dir=args.out_dir,
+            overwrite=args.overwrite,
+        )
+        single_point.output_options = netcdf_output_options_from_args(args)
+        logger.debug(single_point)
+        single_points.append(single_point)
+
+        user_mods_dir = os.path.join(args.user_mods_dir, single_point.tag)
+        if args.create_user_mods:
+            setup_user_mods(user_mods_dir, cesmroot)
+        user_mods_dirs.append(user_mods_dir)
+
+    plons = [single_point.plon for single_point in single_points]
+    plats = [single_point.plat for single_point in single_points]
+
+    # --  Create CTSM surface data files
+    if args.create_surfdata:
+        fsurf_in = os.path.join(file_dict["fsurf_dir"], file_dict["fsurf_in"])
+        f_points = extract_points(fsurf_in, SURF_COORDS, plons, plats)
+        for single_point, user_mods_dir, f_point in zip(single_points, user_mods_dirs, f_points):
+            single_point.create_surfdata_at_point(
+                file_dict["fsurf_dir"],
+                file_dict["fsurf_in"],
+                user_mods_dir,
+                specify_fsurf_out=None,
+                f_point=f_point,
+            )
+
+    # --  Create CTSM transient landuse data files
+    if args.create_landuse:
+        fluse_in = os.path.join(file_dict["fluse_dir"], file_dict["fluse_in"])
+        f_points = extract_points(fluse_in, SURF_COORDS, plons, plats)
+        for single_point, user_mods_dir, f_point in zip(single_points, user_mods_dirs, f_points):
+            single_point.create_landuse_at_point(
+                file_dict["fluse_dir"],
+                file_dict["fluse_in"],
+                user_mods_dir,
+                f_point=f_point,
+                time_chunk=args.landuse_time_chunk,
+            )
+
+    # --  Create single point atmospheric forcing data
+    if args.create_datm:
+        datm_tuple = file_dict["datm_tuple"]
+
+        # subset DATM domain file
+        fdatmdomain_in = os.path.join(datm_tuple.indir, datm_tuple.fdomain_in)
+        f_points = extract_points(fdatmdomain_in, DOMAIN_COORDS, plons, plats)
+        for single_point, f_point in zip(single_points, f_points):
+            single_point.create_datmdomain_at_point(datm_tuple, f_point=f_point)
+
+        # subset the DATM data, one input file (and all sites) at a time
+        datm_files = [
+            single_point.get_datm_files(datm_tuple, args.datm_syr, args.datm_eyr)
+            for single_point in single_points
+        ]
+        infiles = datm_files[0][0]
+        outfiles = [
+            [outfile[idx] for _, outfile, _, _ in datm_files] for idx in range(len(infiles))
+        ]
+        if args.jobs > 1:
+            logger.info("Extracting DATM files with %d worker processes", args.jobs)
+            with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                futures = [
+                    executor.submit(extract_datm_at_points, single_points, infile, files_out)
+                    for infile, files_out in zip(infiles, outfiles)
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            for infile, files_out in zip(infiles, outfiles):
+                extract_datm_at_points(single_points, infile, files_out)
+        logger.info("All DATM files are created in: %s", datm_tuple.outdir)
+
+        for single_point, user_mods_dir, (_, _, stream_files, _) in zip(
+            single_points, user_mods_dirs, datm_files
+        ):
+            nl_datm = os.path.join(user_mods_dir, "user_nl_datm_streams")
+            single_point.write_datm_streams(datm_tuple, stream_files, nl_datm)
+
+    # -- Write shell commands
+    if args.create_user_mods:
+        for single_point, user_mods_dir in zip(single_points, user_mods_dirs):
+            shell_commands_file = os.path.join(user_mods_dir, "shell_commands")
+            single_point.write_shell_commands(shell_commands_file, args.datm_syr, args.datm_eyr)
+
+    logger.info("Successfully ran script for %d single points.", len(sites))
+
+
 def subset_region(args, file_dict: dict):
     """
     Subsets surface, domain, land use, and/or DATM files for a region
@@ -741,6 +979,7 @@ def subset_region(args, file_dict: dict):
         out_dir=args.out_dir,
         overwrite=args.overwrite,
     )
+    region.output_options = netcdf_output_options_from_args(args)
 
     logger.debug(region)
 
@@ -760,7 +999,10 @@ def subset_region(args, file_dict: dict):
     # --  Create CTSM transient landuse data file
     if region.create_landuse:
         region.create_landuse_at_reg(
-            file_dict["fluse_dir"], file_dict["fluse_in"], args.user_mods_dir
+            file_dict["fluse_dir"],
+            file_dict["fluse_in"],
+            args.user_mods_dir,
+            time_chunk=args.landuse_time_chunk,
         )
 
     # -- Write shell commands
@@ -811,7 +1053,10 @@ def main():
     # create files and folders necessary and return dictionary of file/folder locations
     file_dict = setup_files(args, defaults, cesmroot)
 
-    if args.run_type == "point":
+    if args.run_type == "point" and args.sites_file:
+        sites = read_sites_file(args.sites_file, args)
+        subset_points(args, file_dict, sites, cesmroot)
+    elif args.run_type == "point":
         subset_point(args, file_dict)
     elif args.run_type == "region":
         subset_region(args, file_dict)
@@ -125,6 +125,37 @@ class TestRegridGgcmiShdates(unittest.TestCase):
         )
         np.testing.assert_array_equal(expected_mat_dates, regrid_out_ds["maturity_day"].values)
 
+    @unittest.skipUnless(shutil.which("cdo"), "cdo not found")
+    def test_regrid_ggcmi_shdates_native_matches_cdo(self):
+        """
+        Tests that the native regridding engine gives the same result as cdo
+        """
+        sys.argv = self._function_call_list
+        args = regrid_ggcmi_shdates_arg_process()
+        regrid_out_ds = {}
+        for engine in ["native", "cdo"]:
+            output_directory = os.path.join(self._regridded_cropcals, engine)
+            regrid_ggcmi_shdates(
+                args.regrid_resolution,
+                args.regrid_template_file,
+                args.regrid_input_directory,
+                output_directory,
+                args.regrid_extension,
+                args.crop_list,
+                engine=engine,
+            )
+            regrid_out_ds[engine] = xr.open_dataset(
+                os.path.join(
+                    output_directory,
+                    "swh_rf_ggcmi_crop_calendar_phase3_v1.01_nninterp-5x5amazon.nc4",
+                )
+            )
+
+        for var in ["planting_day", "maturity_day", "growing_season_length"]:
+            np.testing.assert_array_equal(
+                regrid_out_ds["native"][var].values, regrid_out_ds["cdo"][var].values
+            )
+
 
 if __name__ == "__main__":
     unit_testing.setup_for_tests()
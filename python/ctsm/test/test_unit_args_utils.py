@@ -16,7 +16,7 @@ _CTSM_PYTHON = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pard
 sys.path.insert(1, _CTSM_PYTHON)
 
 # pylint: disable=wrong-import-position
-from ctsm.args_utils import plon_type, plat_type
+from ctsm.args_utils import plon_type, plat_type, positive_int_type
 from ctsm import unit_testing
 from ctsm.test.test_unit_utils import wrong_lon_type_error_regex
 
@@ -129,6 +129,33 @@ class TestArgsPlat(unittest.TestCase):
             _ = plat_type(-91)
 
 
+class TestArgsPositiveInt(unittest.TestCase):
+    """
+    Tests for positive_int_type in args_util.py
+    """
+
+    def test_positiveIntType(self):
+        """
+        Test of positive_int_type for a positive integer
+        """
+        self.assertEqual(positive_int_type("5"), 5)
+
+    def test_positiveIntType_zeroAndNegative(self):
+        """
+        Test of positive_int_type for 0 and negative integers
+        """
+        for value in ["0", "-5"]:
+            with self.assertRaisesRegex(argparse.ArgumentTypeError, "should be at least 1"):
+                _ = positive_int_type(value)
+
+    def test_positiveIntType_notInt(self):
+        """
+        Test of positive_int_type for a non-integer
+        """
+        with self.assertRaisesRegex(argparse.ArgumentTypeError, "is not an integer"):
+            _ = positive_int_type("2.5")
+
+
 if __name__ == "__main__":
     unit_testing.setup_for_tests()
     unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""Unit tests for check_constant_vars
+"""
+
+import unittest
+
+import numpy as np
+import xarray as xr
+
+from ctsm import unit_testing
+from ctsm.crop_calendars import check_constant_vars as ccv
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+
+class TestFindVaryingPatches(unittest.TestCase):
+    """Tests of find_varying_patches"""
+
+    def setUp(self):
+        nan = np.nan
+        # Patches: constant; varies; starts late then constant; only final timestep; NaN later
+        self._values_tp = np.array(
+            [
+                [1.0, 1.0, nan, nan, 5.0],
+                [1.0, 2.0, 3.0, nan, nan],
+                [1.0, 2.0, 3.0, 4.0, 5.0],
+            ]
+        )
+
+    def test_find_varying_patches(self):
+        """A NaN after the first value should count as varying unless ignore_nan"""
+        varies_p, time_1_p, time_2_p = ccv.find_varying_patches(self._values_tp, False)
+        np.testing.assert_array_equal(varies_p, [False, True, False, False, True])
+        np.testing.assert_array_equal(time_1_p, [0, 0, 1, -1, 0])
+        np.testing.assert_array_equal(time_2_p, [-1, 1, -1, -1, 1])
+
+    def test_find_varying_patches_ignore_nan(self):
+        """With ignore_nan, NaN values should never count as varying"""
+        varies_p, _, _ = ccv.find_varying_patches(self._values_tp, True)
+        np.testing.assert_array_equal(varies_p, [False, True, False, False, False])
+
+
+class TestGetRxGridIndices(unittest.TestCase):
+    """Tests of get_rx_grid_indices"""
+
+    def test_get_rx_grid_indices(self):
+        """Should find the nearest gridcell within tolerance, even in an unsorted grid"""
+        rx_coord = np.array([10.0, -10.0, 0.0])
+        patches1d_coord = np.array([0.0, 10.00001, -10.0, 0.0])
+        result = ccv.get_rx_grid_indices(patches1d_coord, rx_coord, "lat")
+        np.testing.assert_array_equal(result, [2, 0, 1, 2])
+
+    def test_get_rx_grid_indices_missing(self):
+        """Should error if a patch is too far from any gridcell"""
+        with self.assertRaisesRegex(RuntimeError, "lon 5.0 not in rx dataset"):
+            ccv.get_rx_grid_indices(np.array([5.0]), np.array([0.0, 10.0]), "lon")
+
+
+class TestGetRxValues(unittest.TestCase):
+    """Tests of get_rx_values"""
+
+    def test_get_rx_values(self):
+        """Should look up each patch's prescribed value by vegetation type and location"""
+        this_ds = xr.Dataset(
+            {
+                "patches1d_lon": ("patch", np.array([0.0, 10.0, 10.0])),
+                "patches1d_lat": ("patch", np.array([5.0, -5.0, 5.0])),
+                "patches1d_itype_veg": ("patch", np.array([17, 17, 19])),
+            }
+        )
+        rx_ds = xr.Dataset(
+            {
+                "gs1_17": (("lat", "lon"), np.array([[1.0, 2.0], [3.0, 4.0]])),
+                "gs1_19": (("lat", "lon"), np.array([[5.0, 6.0], [7.0, -1.0]])),
+            },
+            coords={"lat": [-5.0, 5.0], "lon": [0.0, 10.0]},
+        )
+        result = ccv.get_rx_values(this_ds, rx_ds, np.array([0, 1, 2]))
+        np.testing.assert_array_equal(result, [3.0, 2.0, -1.0])
+
+    def test_get_rx_values_nan(self):
+        """NaN prescribed values should be returned, not treated as time-varying"""
+        this_ds = xr.Dataset(
+            {
+                "patches1d_lon": ("patch", np.array([0.0, 10.0, 0.0])),
+                "patches1d_lat": ("patch", np.array([5.0, 5.0, 5.0])),
+                "patches1d_itype_veg": ("patch", np.array([17, 17, 19])),
+            }
+        )
+        rx_ds = xr.Dataset(
+            {
+                "gs1_17": (("lat", "lon"), np.array([[np.nan, 5.0]])),
+                "gs1_19": (("time", "lat", "lon"), np.array([[[np.nan, 1.0]], [[np.nan, 1.0]]])),
+            },
+            coords={"lat": [5.0], "lon": [0.0, 10.0]},
+        )
+        result = ccv.get_rx_values(this_ds, rx_ds, np.array([0, 1, 2]))
+        np.testing.assert_array_equal(result, [np.nan, 5.0, np.nan])
+
+    def test_get_rx_values_time_varying(self):
+        """Prescribed values that differ over time should raise an error"""
+        this_ds = xr.Dataset(
+            {
+                "patches1d_lon": ("patch", np.array([0.0])),
+                "patches1d_lat": ("patch", np.array([5.0])),
+                "patches1d_itype_veg": ("patch", np.array([17])),
+            }
+        )
+        rx_ds = xr.Dataset(
+            {"gs1_17": (("time", "lat", "lon"), np.array([[[np.nan]], [[1.0]]]))},
+            coords={"lat": [5.0], "lon": [0.0]},
+        )
+        with self.assertRaisesRegex(RuntimeError, "time-varying prescribed values"):
+            ccv.get_rx_values(this_ds, rx_ds, np.array([0]))
+
+
+class TestCheckConstantVars(unittest.TestCase):
+    """Tests of check_constant_vars"""
+
+    def _make_ds(self):
+        this_ds = xr.Dataset(
+            {
+                "SDATES": (("gs", "patch"), np.array([[100.0, 100.0], [100.0, 120.0]])),
+                "patches1d_lon": ("patch", np.array([0.0, 10.0])),
+                "patches1d_lat": ("patch", np.array([0.0, 0.0])),
+                "patches1d_itype_veg": ("patch", np.array([17, 19])),
+                "patches1d_itype_veg_str": ("patch", np.array(["temperate_corn", "spring_wheat"])),
+            },
+            coords={"gs": [2000, 2001]},
+        )
+        return this_ds
+
+    def test_check_constant_vars_report(self):
+        """Varying patches should be listed in the report"""
+        bad_patches, any_bad, report = ccv.check_constant_vars(
+            self._make_ds(), "SDATES", ignore_nan=False, verbose=True, throw_error=False
+        )
+        self.assertEqual(bad_patches, [1])
+        self.assertTrue(any_bad)
+        self.assertEqual(report.sizes["row"], 1)
+        self.assertEqual(report["patch"].values[0], 1)
+        self.assertEqual(report["time_2"].values[0], 2001)
+        self.assertEqual(report["value_2"].values[0], 120.0)
+
+    def test_check_constant_vars_throw_error(self):
+        """Varying patches should cause an error if throw_error"""
+        with self.assertRaisesRegex(RuntimeError, "failed check_constant_vars"):
+            ccv.check_constant_vars(self._make_ds(), "SDATES", ignore_nan=False, verbose=False)
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""Unit tests for convert_axis_time2gs
+"""
+
+import unittest
+
+import cftime
+import numpy as np
+import xarray as xr
+
+from ctsm import unit_testing
+from ctsm.crop_calendars import convert_axis_time2gs as t2gs
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+
+def make_ds(hdates_yp, sdates_yp):
+    """
+    Make a Dataset with one sowing and (at most) one harvest per year, with mxharvests 2
+    """
+    n_time, n_patch = hdates_yp.shape
+    hdates_ymp = np.full((n_time, 2, n_patch), -1.0)
+    hdates_ymp[:, 0, :] = hdates_yp
+    sdates_perharv_ymp = np.full((n_time, 2, n_patch), -1.0)
+    sdates_perharv_ymp[:, 0, :] = sdates_yp
+    time = [cftime.DatetimeNoLeap(2000 + y, 1, 1) for y in range(n_time)]
+    this_ds = xr.Dataset(
+        {
+            "HDATES": (t2gs.YMP_DIMS, hdates_ymp, {"units": "day of year"}),
+            "SDATES_PERHARV": (t2gs.YMP_DIMS, sdates_perharv_ymp, {"units": "day of year"}),
+            "SDATES": (
+                ("time", "mxsowings", "patch"),
+                np.expand_dims(sdates_yp, 1),
+                {"units": "day of year"},
+            ),
+        },
+        coords={"time": time, "patch": np.arange(n_patch)},
+    )
+    this_ds["time"].attrs["long_name"] = "time at end of time step"
+    return this_ds
+
+
+class TestConvertAxisTime2gs(unittest.TestCase):
+    """Tests of convert_axis_time2gs"""
+
+    def test_indexer(self):
+        """Valid elements should be gathered into (patch, gs) order, with non-seasons NaN"""
+        is_valid_ymp = np.array(
+            [
+                [[True, False], [False, True]],
+                [[True, True], [False, False]],
+                [[False, False], [False, False]],
+            ]
+        )
+        is_fake_ymp = np.full(is_valid_ymp.shape, False)
+        is_fake_ymp[1, 0, 1] = True
+        indexer = t2gs.GrowingSeasonIndexer(is_valid_ymp, is_fake_ymp)
+        values_ymp = np.arange(is_valid_ymp.size).reshape(is_valid_ymp.shape)
+        np.testing.assert_array_equal(indexer.gather(values_ymp), [[0, 4], [3, 5]])
+        result = indexer.apply(values_ymp)
+        self.assertEqual(result.dtype, np.float64)
+        np.testing.assert_array_equal(result, [[0, 4], [3, np.nan]])
+
+    def test_same_year_seasons(self):
+        """Crops harvested the year they're sown: The last year's season should be dropped"""
+        hdates_yp = np.array([[250.0, 300.0]] * 4)
+        sdates_yp = np.array([[100.0, 120.0]] * 4)
+        this_ds_gs = t2gs.convert_axis_time2gs(make_ds(hdates_yp, sdates_yp))
+        np.testing.assert_array_equal(this_ds_gs["HDATES"].values, hdates_yp[:-1, :].T)
+        np.testing.assert_array_equal(this_ds_gs["SDATES"].values, sdates_yp[:-1, :].T)
+        self.assertEqual(this_ds_gs.sizes["gs"], 3)
+
+    def test_cross_year_seasons(self):
+        """Crops harvested the year after they're sown: The first year's harvest should be dropped"""
+        hdates_yp = np.array([[50.0]] * 4)
+        sdates_yp = np.array([[300.0]] * 4)
+        this_ds_gs = t2gs.convert_axis_time2gs(make_ds(hdates_yp, sdates_yp))
+        np.testing.assert_array_equal(this_ds_gs["HDATES"].values, [[50.0, 50.0, 50.0]])
+
+    def test_no_sowing_is_nan(self):
+        """A year with no sowing should be a NaN season"""
+        hdates_yp = np.array([[250.0], [-1.0], [250.0], [250.0]])
+        sdates_yp = np.array([[100.0], [-1.0], [100.0], [100.0]])
+        this_ds_gs = t2gs.convert_axis_time2gs(make_ds(hdates_yp, sdates_yp))
+        np.testing.assert_array_equal(this_ds_gs["HDATES"].values, [[250.0, np.nan, 250.0]])
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
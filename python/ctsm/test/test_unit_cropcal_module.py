@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""Unit tests for cropcal_module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import xarray as xr
+
+from ctsm import unit_testing
+from ctsm.crop_calendars import cropcal_module as cc
+from ctsm.crop_calendars.cropcal_utils import define_pftlist
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+
+class TestOpenLuDs(unittest.TestCase):
+    """Tests of open_lu_ds"""
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self._cft = np.arange(15, 21)
+        pct_cft = 100 * rng.random((4, len(self._cft), 2, 3))
+        pct_cft[1, 0, 0, 0] = np.nan
+        self._lu_file = os.path.join(self._tempdir, "landuse.nc")
+        xr.Dataset(
+            {
+                "AREA": (("lsmlat", "lsmlon"), rng.random((2, 3))),
+                "LANDFRAC_PFT": (("lsmlat", "lsmlon"), rng.random((2, 3))),
+                "PCT_CROP": (("time", "lsmlat", "lsmlon"), 100 * rng.random((4, 2, 3))),
+                "PCT_CFT": (("time", "cft", "lsmlat", "lsmlon"), pct_cft),
+            },
+            coords={"time": np.arange(2000, 2004), "cft": self._cft},
+        ).to_netcdf(self._lu_file)
+
+        # 5 patches; the first and last are in the same gridcell
+        ixy = np.array([1, 3, 2, 3, 1])
+        jxy = np.array([1, 2, 2, 1, 1])
+        ivt = np.array([15.0, 16.0, 20.0, 15.0, 16.0])
+        self._existing_ds = xr.Dataset(
+            {
+                "patches1d_ixy": ("patch", ixy.astype(float)),
+                "patches1d_jxy": ("patch", jxy.astype(float)),
+                "patches1d_itype_veg": ("patch", ivt),
+                "patches1d_itype_veg_str": (
+                    "patch",
+                    np.array([define_pftlist()[int(x)] for x in ivt]),
+                ),
+                "patches1d_gi": ("patch", (jxy - 1) * 3 + ixy),
+                "patches1d_lon": ("patch", ixy * 10.0),
+                "GRAINC_TO_FOOD_ANN": (("time", "patch"), np.zeros((2, 5))),
+            },
+            coords={
+                "lon": [10.0, 20.0, 30.0],
+                "lat": [-5.0, 5.0],
+                "time": xr.cftime_range("2001-01-01", periods=2, freq="YS"),
+            },
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def test_open_lu_ds_ungrid(self):
+        """Ungridded variables should be each patch's values for its gridcell and cft"""
+        this_ds = cc.open_lu_ds(self._lu_file, 2001, 2002, self._existing_ds)
+        with xr.open_dataset(self._lu_file) as lu_ds:
+            lu_ds = lu_ds.sel(time=slice(2001, 2002))
+            for patch, (ixy, jxy, ivt) in enumerate([(1, 1, 15), (3, 2, 16), (2, 2, 20)]):
+                icft = list(self._cft).index(ivt)
+                np.testing.assert_array_equal(
+                    this_ds.PCT_CFT.isel(patch=patch),
+                    lu_ds.PCT_CFT.isel(cft=icft, lsmlat=jxy - 1, lsmlon=ixy - 1),
+                )
+                np.testing.assert_array_equal(
+                    this_ds.AREA.isel(patch=patch), lu_ds.AREA.isel(lsmlat=jxy - 1, lsmlon=ixy - 1)
+                )
+        self.assertEqual(this_ds.PCT_CFT.dims, ("time", "patch"))
+        self.assertTrue(np.isnan(this_ds.PCT_CFT.isel(time=0, patch=0)))
+
+        # 16 and 20 are irrigated types
+        np.testing.assert_array_equal(this_ds.IRRIGATED, [0, 1, 1, 0, 1])
+
+    def test_open_lu_ds_irrigated_area_grid(self):
+        """Irrigated area per gridcell should match a groupby sum over patches"""
+        this_ds = cc.open_lu_ds(self._lu_file, 2001, 2002, self._existing_ds)
+        expected = (
+            this_ds["IRRIGATED_AREA_CFT"]
+            .groupby(this_ds["patches1d_gi"])
+            .sum()
+            .rename({"patches1d_gi": "gridcell"})
+        )
+        expected.attrs = this_ds["IRRIGATED_AREA_GRID"].attrs
+        expected.name = "IRRIGATED_AREA_GRID"
+        xr.testing.assert_identical(this_ds["IRRIGATED_AREA_GRID"], expected)
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
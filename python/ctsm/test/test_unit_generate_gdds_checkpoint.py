@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""Unit tests for generate_gdds_checkpoint
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ctsm import unit_testing
+from ctsm.crop_calendars.generate_gdds_checkpoint import (
+    GddCheckpointStore,
+    FINGERPRINT_SAMPLE_BYTES,
+    get_file_fingerprint,
+)
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+
+class TestGenerateGddsCheckpoint(unittest.TestCase):
+    """Tests of generate_gdds_checkpoint"""
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._store = GddCheckpointStore(
+            os.path.join(self._tempdir, "checkpoints"), "runkey", run_inputs={"first_season": 2000}
+        )
+        self._seasons = [2001, 2002, 2003]
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _save_years(self, year_keys, gddaccum_yp_list, gddharv_yp_list):
+        for year_index, key in enumerate(year_keys):
+            self._store.save(
+                key,
+                year_index,
+                gddaccum_yp_list,
+                gddharv_yp_list,
+                np.array([3]),
+                [[0, 1, 2], None],
+                False,
+                ["corn", "wheat"],
+                np.array([17, 17, 17, 19]),
+                1,
+                self._seasons[year_index],
+            )
+
+    def test_year_keys_chained(self):
+        """A change to one year's fingerprint should change the keys of it and all later years"""
+        keys_a = self._store.get_year_keys(["a", "b", "c"])
+        keys_b = self._store.get_year_keys(["a", "x", "c"])
+        self.assertEqual(keys_a[0], keys_b[0])
+        self.assertNotEqual(keys_a[1], keys_b[1])
+        self.assertNotEqual(keys_a[2], keys_b[2])
+
+    def test_count_available_stops_at_gap(self):
+        """count_available() should only count consecutive years from the first"""
+        year_keys = self._store.get_year_keys(["a", "b", "c"])
+        gddaccum_yp_list = [np.zeros((4, 3)), None]
+        self._save_years(year_keys, gddaccum_yp_list, gddaccum_yp_list)
+        os.remove(self._store.get_path(year_keys[1]))
+        self.assertEqual(self._store.count_available(year_keys, self._seasons), 1)
+
+    def test_directory_created_on_save(self):
+        """The checkpoint directory should only be created when a shard is saved"""
+        self.assertFalse(os.path.exists(self._store.directory))
+        year_keys = self._store.get_year_keys(["a"])
+        self._save_years(year_keys, [np.zeros((2, 3))], [np.zeros((2, 3))])
+        self.assertTrue(os.path.exists(self._store.get_path(year_keys[0])))
+
+    def test_discard_stale(self):
+        """Shards from runs with different inputs should be discarded, not restored"""
+        year_keys = self._store.get_year_keys(["a", "b", "c"])
+        gddaccum_yp_list = [np.zeros((4, 3)), None]
+        self._save_years(year_keys, gddaccum_yp_list, gddaccum_yp_list)
+
+        # Same run, but the second year's inputs changed: Its shard and later ones are stale
+        new_year_keys = self._store.get_year_keys(["a", "x", "c"])
+        self.assertEqual(self._store.discard_stale(new_year_keys, self._seasons), 2)
+        self.assertEqual(self._store.count_available(new_year_keys, self._seasons), 1)
+
+        # Different run inputs: Every shard is stale
+        other_store = GddCheckpointStore(
+            self._store.directory, "runkey", run_inputs={"first_season": 1990}
+        )
+        self.assertEqual(other_store.count_available(year_keys[:1], self._seasons), 0)
+        self.assertEqual(other_store.discard_stale(year_keys, self._seasons), 1)
+        self.assertEqual(os.listdir(self._store.directory), [])
+
+    def test_count_available_checks_season(self):
+        """A shard saved for a different season shouldn't count as available"""
+        year_keys = self._store.get_year_keys(["a"])
+        gddaccum_yp_list = [np.zeros((2, 3))]
+        self._save_years(year_keys, gddaccum_yp_list, gddaccum_yp_list)
+        self.assertEqual(self._store.count_available(year_keys, [2001]), 1)
+        self.assertEqual(self._store.count_available(year_keys, [1999]), 0)
+
+    def test_save_restore_roundtrip(self):
+        """Restoring all saved years should reproduce the year-by-patch arrays"""
+        year_keys = self._store.get_year_keys(["a", "b", "c"])
+        gddaccum_yp = np.arange(12, dtype=float).reshape(4, 3)
+        gddaccum_yp[3, :] = np.nan
+        gddharv_yp = gddaccum_yp * 2
+        self._save_years(year_keys, [gddaccum_yp, None], [gddharv_yp, None])
+
+        (
+            gddaccum_yp_list,
+            gddharv_yp_list,
+            skip_patches,
+            active_patch_indices_list,
+            incorrectly_daily,
+            incl_vegtypes_str,
+            _,
+            mxsowings,
+        ) = self._store.restore(year_keys, 3)
+
+        np.testing.assert_array_equal(gddaccum_yp_list[0], gddaccum_yp)
+        np.testing.assert_array_equal(gddharv_yp_list[0], gddharv_yp)
+        self.assertIsNone(gddaccum_yp_list[1])
+        np.testing.assert_array_equal(skip_patches, [3])
+        self.assertEqual(active_patch_indices_list, [[0, 1, 2], None])
+        self.assertFalse(incorrectly_daily)
+        self.assertEqual(incl_vegtypes_str, ["corn", "wheat"])
+        self.assertEqual(mxsowings, 1)
+
+    def test_restore_into_longer_run(self):
+        """Restoring into a run with more seasons should leave the new years NaN"""
+        year_keys = self._store.get_year_keys(["a", "b"])
+        gddaccum_yp = np.ones((3, 2))
+        self._save_years(year_keys, [gddaccum_yp, None], [gddaccum_yp, None])
+        gddaccum_yp_list = self._store.restore(year_keys, 4)[0]
+        self.assertEqual(gddaccum_yp_list[0].shape, (5, 2))
+        np.testing.assert_array_equal(gddaccum_yp_list[0][:2, :], 1)
+        self.assertTrue(np.all(np.isnan(gddaccum_yp_list[0][2:, :])))
+
+    def test_file_fingerprint_ignores_directory(self):
+        """Copies of a file in different directories should have the same fingerprint"""
+        file1 = os.path.join(self._tempdir, "file.nc")
+        os.makedirs(os.path.join(self._tempdir, "other"))
+        file2 = os.path.join(self._tempdir, "other", "file.nc")
+        for file in [file1, file2]:
+            with open(file, "wb") as f:
+                f.write(b"abc" * 1000)
+            os.utime(file, ns=(0, 10**18))
+        self.assertEqual(get_file_fingerprint(file1), get_file_fingerprint(file2))
+
+    def test_file_fingerprint_catches_middle_change(self):
+        """A regenerated file differing only in the middle should get a new fingerprint"""
+        file = os.path.join(self._tempdir, "file.nc")
+        size = 3 * FINGERPRINT_SAMPLE_BYTES
+        with open(file, "wb") as f:
+            f.write(b"a" * size)
+        os.utime(file, ns=(0, 10**18))
+        fingerprint = get_file_fingerprint(file)
+        with open(file, "r+b") as f:
+            f.seek(size // 2)
+            f.write(b"b")
+        os.utime(file, ns=(0, 10**18 + 1))
+        self.assertNotEqual(get_file_fingerprint(file), fingerprint)
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""Unit tests for generate_gdds_functions
+"""
+
+import unittest
+
+import numpy as np
+
+from ctsm import unit_testing
+from ctsm.crop_calendars import generate_gdds_functions as gddfn
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+
+class TestGetValuesAtRxHdates(unittest.TestCase):
+    """Tests of get_values_at_rx_hdates"""
+
+    def test_get_values_at_rx_hdates(self):
+        """Each patch's value should come from the day before its (1-based) harvest date"""
+        values_tp = np.arange(365 * 4, dtype=float).reshape(365, 4)
+        hdates_rx_p = np.array([1.0, 365.0, 100.0, 1.0])
+        result = gddfn.get_values_at_rx_hdates(values_tp, hdates_rx_p)
+        expected = np.array([values_tp[int(h) - 1, p] for p, h in enumerate(hdates_rx_p)])
+        np.testing.assert_array_equal(result, expected)
+
+    def test_get_values_at_rx_hdates_nan(self):
+        """NaN values should be passed through"""
+        values_tp = np.full((365, 2), np.nan)
+        values_tp[9, 1] = 5
+        result = gddfn.get_values_at_rx_hdates(values_tp, np.array([10, 10]))
+        np.testing.assert_array_equal(result, [np.nan, 5])
+
+
+class TestGetPatchIndices(unittest.TestCase):
+    """Tests of get_patch_indices"""
+
+    def test_get_patch_indices(self):
+        """Should match list.index() for each patch"""
+        patchlist = np.array([3, 8, 12, 40, 41])
+        patches = np.array([8, 40, 41])
+        result = gddfn.get_patch_indices(patchlist, patches)
+        np.testing.assert_array_equal(result, [list(patchlist).index(x) for x in patches])
+
+    def test_get_patch_indices_unsorted(self):
+        """Should work even if patchlist isn't sorted"""
+        patchlist = np.array([12, 3, 41, 8])
+        result = gddfn.get_patch_indices(patchlist, np.array([3, 41]))
+        np.testing.assert_array_equal(result, [1, 2])
+
+    def test_get_patch_indices_missing(self):
+        """Should return None if any patch is missing from patchlist"""
+        patchlist = np.array([3, 8, 12])
+        self.assertIsNone(gddfn.get_patch_indices(patchlist, np.array([8, 9])))
+        self.assertIsNone(gddfn.get_patch_indices(patchlist, np.array([13])))
+
+
+class TestProcess1Crop(unittest.TestCase):
+    """Tests of process_1crop"""
+
+    def _process(self, year_index, gddaccum_tp, gddaccum_lastyr_p, last_year_active_patch_indices):
+        # Patch 10 is sown and harvested in the same year; patch 12's season crosses the new year
+        return gddfn.process_1crop(
+            "temperate_corn",
+            year_index,
+            False,
+            False,
+            np.array([10, 12]),
+            np.array([10, 11, 12]),
+            gddaccum_tp,
+            None,
+            np.array([200.0, 50.0]),
+            np.array([100.0, 300.0]),
+            gddaccum_lastyr_p,
+            None,
+            last_year_active_patch_indices,
+            np.array([False, True, False]),
+            gddfn._LogBuffer(),  # pylint: disable=protected-access
+        )
+
+    def test_process_1crop_rows(self):
+        """Only last year's and this year's rows should be returned, with seasons filled in"""
+        gddaccum_tp = np.arange(365 * 2, dtype=float).reshape(365, 2)
+        lastyr_p, thisyr_p, _, _, active = self._process(0, gddaccum_tp, None, None)
+        self.assertIsNone(lastyr_p)
+        np.testing.assert_array_equal(thisyr_p, [gddaccum_tp[199, 0], np.nan, np.nan])
+        np.testing.assert_array_equal(active, [0, 2])
+
+        lastyr_p, thisyr_p, _, _, _ = self._process(1, gddaccum_tp + 1000, thisyr_p, active)
+        np.testing.assert_array_equal(
+            lastyr_p, [gddaccum_tp[199, 0], np.nan, gddaccum_tp[49, 1] + 1000]
+        )
+        np.testing.assert_array_equal(thisyr_p, [gddaccum_tp[199, 0] + 1000, np.nan, np.nan])
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
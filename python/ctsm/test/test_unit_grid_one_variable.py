@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""Unit tests for grid_one_variable
+"""
+
+import unittest
+
+import numpy as np
+import xarray as xr
+
+from ctsm import unit_testing
+from ctsm.crop_calendars.grid_one_variable import grid_one_variable, grid_variables
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+
+def make_ds():
+    """
+    Make a Dataset with 3 patches on a 2x3 grid and some patch-level variables
+    """
+    return xr.Dataset(
+        {
+            "patches1d_ixy": ("patch", np.array([1, 3, 3])),
+            "patches1d_jxy": ("patch", np.array([2, 1, 1])),
+            "VAR1": (("time", "patch"), np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])),
+            "VAR2": (("time", "patch"), np.array([[7.0, 8.0, 9.0], [10.0, 11.0, 12.0]])),
+            "VAR3": ("patch", np.array([13.0, 14.0, 15.0]), {"_FillValue": -1.0}),
+        },
+        coords={"time": [2000, 2001], "lat": [-5.0, 5.0], "lon": [0.0, 10.0, 20.0]},
+    )
+
+
+class TestGridVariables(unittest.TestCase):
+    """Tests of grid_variables"""
+
+    def test_grid_variables(self):
+        """Each patch's values should go in its gridcell, the last patch winning in shared ones"""
+        this_ds = make_ds()
+        result = grid_variables(this_ds, ["VAR1", "VAR2", "VAR3"])
+        nan = np.nan
+        coords = {"time": [2000, 2001], "lat": [-5.0, 5.0], "lon": [0.0, 10.0, 20.0]}
+        expected = {
+            "VAR1": xr.DataArray(
+                [[[nan, nan, 3.0], [1.0, nan, nan]], [[nan, nan, 6.0], [4.0, nan, nan]]],
+                dims=("time", "lat", "lon"),
+                coords=coords,
+                name="VAR1",
+            ),
+            "VAR2": xr.DataArray(
+                [[[nan, nan, 9.0], [7.0, nan, nan]], [[nan, nan, 12.0], [10.0, nan, nan]]],
+                dims=("time", "lat", "lon"),
+                coords=coords,
+                name="VAR2",
+            ),
+            "VAR3": xr.DataArray(
+                [[-1.0, -1.0, 15.0], [13.0, -1.0, -1.0]],
+                dims=("lat", "lon"),
+                coords={"lat": coords["lat"], "lon": coords["lon"]},
+                attrs={"_FillValue": -1.0},
+                name="VAR3",
+            ),
+        }
+        for var, expected_da in expected.items():
+            xr.testing.assert_identical(result[var], expected_da)
+            xr.testing.assert_identical(grid_one_variable(this_ds, var), expected_da)
+
+    def test_grid_variables_float32(self):
+        """Should be able to grid into float32 arrays"""
+        result = grid_variables(make_ds(), ["VAR1", "VAR2"], dtype=np.float32)
+        self.assertEqual(result["VAR2"].dtype, np.float32)
+        self.assertEqual(result["VAR2"].values[1, 1, 0], 10.0)
+        self.assertTrue(np.isnan(result["VAR2"].values[1, 0, 0]))
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
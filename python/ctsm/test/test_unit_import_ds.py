@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""Unit tests for import_ds
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import xarray as xr
+
+from ctsm import unit_testing
+from ctsm.crop_calendars import import_ds
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+
+class TestImportDs(unittest.TestCase):
+    """Tests of import_ds"""
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _write_file(self, year, unlimited_time=True):
+        """Write a small history-like file with one timestep per month"""
+        n_patch = 4
+        time = xr.cftime_range(f"{year}-01-01", periods=12, freq="MS", calendar="noleap")
+        this_ds = xr.Dataset(
+            {
+                "GDDACCUM": (["time", "pft"], np.arange(12 * n_patch, dtype=float).reshape(12, -1)),
+                "pfts1d_itype_veg": (["pft"], np.array([17, 17, 19, 75])),
+            },
+            coords={"time": time},
+        )
+        filename = os.path.join(self._tempdir, f"test.h2.{year}-01-01-00000.nc")
+        unlimited_dims = ["time"] if unlimited_time else []
+        this_ds.to_netcdf(filename, format="NETCDF3_64BIT", unlimited_dims=unlimited_dims)
+        return filename
+
+    def test_get_chunks_passthrough(self):
+        """Non-strategy chunks should be returned unchanged"""
+        self.assertEqual(import_ds.get_chunks({"time": 3}, "dummy.nc"), {"time": 3})
+        self.assertIsNone(import_ds.get_chunks(None, "dummy.nc"))
+
+    def test_get_chunks_bad_strategy(self):
+        """An unknown strategy should raise an error"""
+        with self.assertRaisesRegex(ValueError, "Unknown chunking strategy"):
+            import_ds.get_chunks("lat", "dummy.nc")
+
+    def test_get_chunks_strategies(self):
+        """Strategies should be converted to chunks for the dimensions in the file"""
+        filename = self._write_file(2000)
+        self.assertEqual(import_ds.get_chunks("time", filename), {"time": 1})
+        self.assertEqual(
+            import_ds.get_chunks("patch", filename),
+            {"time": -1, "pft": import_ds.PATCH_CHUNK_SIZE},
+        )
+        # Unchunked file with time as record dimension
+        self.assertEqual(import_ds.get_chunks("auto", filename), {"time": 1})
+
+    def test_get_chunks_auto_fixed_time(self):
+        """auto should let dask decide for an unchunked file without a time record dimension"""
+        filename = self._write_file(2000, unlimited_time=False)
+        self.assertEqual(import_ds.get_chunks("auto", filename), "auto")
+
+    def test_manual_mfdataset(self):
+        """Files should be concatenated along time after selecting vegtypes and timesteps"""
+        filelist = [self._write_file(year) for year in [2000, 2001, 2002]]
+        result = import_ds.manual_mfdataset(
+            filelist,
+            ["GDDACCUM"],
+            ["temperate_corn"],
+            slice("2000-06-01", "2002-02-01"),
+        )
+        self.assertEqual(result.sizes["time"], 7 + 12 + 2)
+        self.assertEqual(result.sizes["patch"], 2)
+        np.testing.assert_array_equal(
+            result["patches1d_itype_veg_str"].values, ["temperate_corn"] * 2
+        )
+
+    def test_get_patch_metadata(self):
+        """Patch metadata should select the right patches and vegetation types"""
+        metadata = import_ds.get_patch_metadata(np.array([17, 19, 17, 75]), ["temperate_corn"])
+        np.testing.assert_array_equal(metadata["patch_indices"], [0, 2])
+        self.assertEqual(sum(metadata["ivt_mask"]), 1)
+        np.testing.assert_array_equal(
+            metadata["patches1d_itype_veg_str"].values[[0, 1]], ["temperate_corn", "spring_wheat"]
+        )
+        self.assertIsNone(import_ds.get_patch_metadata(np.array([17, 19]), None)["patch_indices"])
+
+    def test_get_patch_metadata_memoized(self):
+        """Identical patch layouts should only be parsed once"""
+        metadata1 = import_ds.get_patch_metadata(np.array([17, 19, 17, 75]), [19])
+        metadata2 = import_ds.get_patch_metadata(np.array([17, 19, 17, 75]), ["spring_wheat"])
+        metadata3 = import_ds.get_patch_metadata(np.array([17, 19, 19, 75]), [19])
+        self.assertIs(metadata1, metadata2)
+        self.assertIsNot(metadata1, metadata3)
+
+    def test_get_patch_metadata_cache_bounded(self):
+        """The patch metadata cache should keep only the most recently used layouts"""
+        n_layouts = import_ds.PATCH_METADATA_CACHE_SIZE + 2
+        first = import_ds.get_patch_metadata(np.array([17]), None)
+        for n_patches in range(2, n_layouts + 1):
+            import_ds.get_patch_metadata(np.full(n_patches, 17), None)
+        self.assertLessEqual(
+            len(import_ds._PATCH_METADATA_CACHE),  # pylint: disable=protected-access
+            import_ds.PATCH_METADATA_CACHE_SIZE,
+        )
+        self.assertIsNot(import_ds.get_patch_metadata(np.array([17]), None), first)
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
@@ -8,6 +8,8 @@ You can run this by:
 
 import os
 import sys
+import shutil
+import tempfile
 import unittest
 import numpy as np
 import xarray as xr
@@ -70,6 +72,112 @@ class TestMeshType(unittest.TestCase):
             self.mesh.read_file(ds)
 
 
+class TestMeshTypeNodes(unittest.TestCase):
+    """
+    Tests of calculating the nodes of a MeshType
+    """
+
+    @staticmethod
+    def _make_mesh(lat0, lon0):
+        lats = xr.DataArray(np.asarray(lat0, dtype=float), dims="lat")
+        lons = xr.DataArray(np.asarray(lon0, dtype=float), dims="lon")
+        mesh = MeshType(lats, lons)
+        mesh.calculate_corners()
+        return mesh
+
+    def test_calculate_nodes_shares_corners(self):
+        """Neighboring elements should share nodes, numbered in order of first appearance"""
+        mesh = self._make_mesh([10.0, 11.0], [100.0, 101.0, 102.0])
+        mesh.calculate_nodes()
+        self.assertEqual(mesh.node_coords.shape, (12, 2))
+        np.testing.assert_array_equal(
+            mesh.elem_conn,
+            [
+                [1, 2, 5, 4],
+                [2, 3, 6, 5],
+                [3, 7, 8, 6],
+                [4, 5, 9, 12],
+                [5, 6, 10, 9],
+                [6, 8, 11, 10],
+            ],
+        )
+        np.testing.assert_array_equal(mesh.node_coords[mesh.elem_conn - 1, 0], mesh.corner_lons)
+        np.testing.assert_array_equal(mesh.node_coords[mesh.elem_conn - 1, 1], mesh.corner_lats)
+
+    def test_number_nodes_matches_by_coords(self):
+        """The direct numbering should match numbering by coordinates, when corners match"""
+        mesh = self._make_mesh(np.arange(-10.5, 10, 1.0), np.arange(0.5, 30, 1.0))
+        node_coords, elem_conn = mesh.number_nodes()
+        # pylint: disable=protected-access
+        node_coords_by_coords, elem_conn_by_coords = mesh._number_nodes_by_coords()
+        np.testing.assert_array_equal(node_coords, node_coords_by_coords)
+        np.testing.assert_array_equal(elem_conn, elem_conn_by_coords)
+
+    def test_calculate_nodes_roundoff(self):
+        """Nodes should be shared even if the corners of neighboring elements differ by roundoff"""
+        mesh = self._make_mesh(np.linspace(10.1, 40.3, 37), np.linspace(200.7, 260.3, 53))
+        mesh.calculate_nodes()
+        self.assertEqual(mesh.node_coords.shape, (38 * 54, 2))
+        np.testing.assert_allclose(mesh.node_coords[mesh.elem_conn - 1, 0], mesh.corner_lons)
+        np.testing.assert_allclose(mesh.node_coords[mesh.elem_conn - 1, 1], mesh.corner_lats)
+
+    def test_calculate_nodes_pole_fails(self):
+        """A grid with a point at the pole has degenerate elements, so should fail"""
+        mesh = self._make_mesh(np.linspace(-90, 90, 7), np.arange(0, 360, 30.0))
+        with self.assertRaisesRegex(SystemExit, "Expected size for element connections is wrong"):
+            mesh.calculate_nodes()
+
+
+class TestMeshTypeCreateEsmf(unittest.TestCase):
+    """
+    Tests of writing ESMF mesh files
+    """
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        lats = xr.DataArray(np.arange(-10.5, 10, 1.0), dims="lat")
+        lons = xr.DataArray(np.arange(0.5, 30, 1.0), dims="lon")
+        rng = np.random.default_rng(0)
+        mask = xr.DataArray((rng.random((lons.size, lats.size)) > 0.5).astype(np.float32))
+        area = rng.random((lons.size, lats.size))
+        self.mesh = MeshType(lats, lons, mask=mask, area=area)
+        self.mesh.calculate_corners()
+        self.mesh.calculate_nodes()
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _create_esmf(self, name, **kwargs):
+        mesh_fname = os.path.join(self._tempdir, name)
+        self.mesh.create_esmf(mesh_fname, **kwargs)
+        ds = xr.open_dataset(mesh_fname, decode_cf=False).load()
+        del ds.attrs["date_created"]
+        return ds
+
+    def test_create_esmf_blocks(self):
+        """Writing the mesh file in blocks should give the same file"""
+        ds = self._create_esmf("all.nc")
+        ds_blocks = self._create_esmf("blocks.nc", block_size=7)
+        xr.testing.assert_identical(ds, ds_blocks)
+        self.assertEqual(ds_blocks["elementConn"].dtype, np.int32)
+
+    def test_create_esmf_compressed(self):
+        """Writing a compressed mesh file should give the same data"""
+        ds = self._create_esmf("all.nc")
+        ds_compressed = self._create_esmf("compressed.nc", block_size=100, compression_level=4)
+        xr.testing.assert_identical(ds, ds_compressed)
+        self.assertTrue(ds_compressed["elementConn"].encoding["zlib"])
+        self.assertEqual(ds_compressed["elementConn"].encoding["chunksizes"], (100, 4))
+
+    def test_create_esmf_bad_block_size(self):
+        """Block sizes less than 1 should abort rather than write an empty mesh"""
+        for block_size in [0, -5]:
+            mesh_fname = os.path.join(self._tempdir, f"bad_{block_size}.nc")
+            with self.assertRaisesRegex(SystemExit, "block_size must be at least 1"):
+                self.mesh.create_esmf(mesh_fname, block_size=block_size)
+            self.assertFalse(os.path.exists(mesh_fname))
+
+
 if __name__ == "__main__":
     unit_testing.setup_for_tests()
     unittest.main()
@@ -4,6 +4,10 @@
 Unit tests for _get_rectangle
 """
 
+import json
+import os
+import shutil
+import tempfile
 import unittest
 
 import numpy as np
@@ -13,6 +17,7 @@ from ctsm import unit_testing
 from ctsm.config_utils import lon_range_0_to_360
 from ctsm.modify_input_files.modify_fsurdat import ModifyFsurdat
 from ctsm.test.test_unit_utils import wrong_lon_type_error_regex
+from ctsm.utils import write_output
 
 # Allow test names that pylint doesn't like; otherwise hard to make them
 # readable
@@ -117,6 +122,53 @@ class TestModifyFsurdat(unittest.TestCase):
         self.modify_fsurdat.setvar_lev2("var_lev2", val_for_rectangle, self.cols - 1, self.rows - 1)
         np.testing.assert_array_equal(self.modify_fsurdat.file.var_lev2, comp_lev2)
 
+    def test_setvar_in_rectangle_all_levels(self):
+        """
+        Tests that setting all levels at once with setvar_in_rectangle gives
+        the same result as setting one level at a time with setvar_lev1 and
+        setvar_lev2
+        """
+        vals = np.arange(self.rows) * 10.0
+        original = self.modify_fsurdat.file.copy(deep=True)
+        for lev1 in range(self.cols):
+            self.modify_fsurdat.setvar_lev1("var_lev1", vals[lev1], lev1_dim=lev1)
+            for lev2 in range(self.rows):
+                self.modify_fsurdat.setvar_lev2("var_lev2", vals[lev2], lev1, lev2)
+        expected = self.modify_fsurdat.file[["var_lev1", "var_lev2"]].copy(deep=True)
+
+        self.modify_fsurdat.file = original
+        self.modify_fsurdat.setvar_in_rectangle("var_lev1", vals[: self.cols], (slice(None),))
+        self.modify_fsurdat.setvar_in_rectangle(
+            "var_lev2", vals[:, np.newaxis], lev_index=(slice(None), slice(None))
+        )
+        xr.testing.assert_identical(self.modify_fsurdat.file[["var_lev1", "var_lev2"]], expected)
+
+    def test_setvar_in_rectangle_promotes_dtype(self):
+        """
+        Tests that, like xarray's where(), setting a float value in an integer
+        variable promotes it to float, but an integer value doesn't
+        """
+        self.modify_fsurdat.file["int_var"] = self.modify_fsurdat.file.var_lev0.astype(np.int32)
+        self.modify_fsurdat.setvar_lev0("int_var", 3)
+        self.assertEqual(self.modify_fsurdat.file.int_var.dtype, np.int32)
+        self.modify_fsurdat.setvar_lev0("int_var", 3.5)
+        self.assertEqual(self.modify_fsurdat.file.int_var.dtype, np.float64)
+        self.assertEqual(
+            np.count_nonzero(self.modify_fsurdat.file.int_var == 3.5),
+            np.count_nonzero(self.modify_fsurdat.rectangle),
+        )
+
+    def test_setvar_in_rectangle_copies(self):
+        """
+        Tests that setvar_in_rectangle doesn't change arrays shared with a
+        shallow copy of the dataset
+        """
+        shallow = self.modify_fsurdat.file.copy(deep=False)
+        expected = shallow.var_lev0.values.copy()
+        self.modify_fsurdat.setvar_lev0("var_lev0", -1.0)
+        np.testing.assert_array_equal(shallow.var_lev0.values, expected)
+        self.assertTrue(np.any(self.modify_fsurdat.file.var_lev0 == -1.0))
+
     def test_getNotRectangle_lon1leLon2Lat1leLat2(self):
         """
         Tests that not_rectangle is True and False in the grid cells expected
@@ -471,6 +523,72 @@ class TestModifyFsurdat(unittest.TestCase):
         ):
             self.modify_fsurdat.check_varlist(settings, allow_uppercase_vars=True)
 
+    def test_region_file(self):
+        """
+        Test that a GeoJSON region_file replaces the rectangle with the
+        gridcells inside its polygon
+        """
+        tempdir = tempfile.mkdtemp()
+        try:
+            region_file = os.path.join(tempdir, "region.geojson")
+            with open(region_file, "w", encoding="utf-8") as geojson:
+                json.dump(
+                    {
+                        "type": "Polygon",
+                        "coordinates": [[[2.5, 3.5], [6.5, 3.5], [2.5, 7.5], [2.5, 3.5]]],
+                    },
+                    geojson,
+                )
+            modify_fsurdat = ModifyFsurdat(
+                my_data=self.modify_fsurdat.file,
+                lon_1=self.lon_1,
+                lon_2=self.lon_2,
+                lat_1=self.lat_1,
+                lat_2=self.lat_2,
+                landmask_file=None,
+                lat_dimname=None,
+                lon_dimname=None,
+                region_file=region_file,
+            )
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+        longxy = self.modify_fsurdat.file.LONGXY.values
+        latixy = self.modify_fsurdat.file.LATIXY.values
+        expected = (longxy > 2.5) & (latixy > 3.5) & (longxy + latixy < 10)
+        np.testing.assert_array_equal(modify_fsurdat.rectangle, expected)
+        np.testing.assert_array_equal(modify_fsurdat.not_rectangle, ~expected)
+
+    def test_landmask_regions(self):
+        """
+        Test that landmask_regions selects the union of the listed region ids in
+        mod_lnd_props, and that mod_lnd_props must otherwise be 0 or 1
+        """
+        tempdir = tempfile.mkdtemp()
+        try:
+            landmask_file = os.path.join(tempdir, "landmask.nc")
+            region_ids = np.arange(self.rows * self.cols).reshape(self.rows, self.cols) % 4
+            xr.Dataset({"mod_lnd_props": (["lsmlat", "lsmlon"], region_ids)}).to_netcdf(
+                landmask_file
+            )
+            kwargs = {
+                "my_data": self.modify_fsurdat.file,
+                "lon_1": self.lon_1,
+                "lon_2": self.lon_2,
+                "lat_1": self.lat_1,
+                "lat_2": self.lat_2,
+                "landmask_file": landmask_file,
+                "lat_dimname": None,
+                "lon_dimname": None,
+            }
+            modify_fsurdat = ModifyFsurdat(**kwargs, landmask_regions=[1, 3])
+            with self.assertRaisesRegex(AssertionError, "not 0 or 1 at row, col, value = 0 2 2"):
+                ModifyFsurdat(**kwargs)
+            with self.assertRaisesRegex(SystemExit, "Only one of landmask_file and region_file"):
+                ModifyFsurdat(**kwargs, region_file=landmask_file)
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+        np.testing.assert_array_equal(modify_fsurdat.rectangle, region_ids % 2 == 1)
+
     def _get_longxy_latixy(self, _min_lon, _max_lon, _min_lat, _max_lat):
         """
         Return longxy, latixy, cols, rows
@@ -497,6 +615,107 @@ class TestModifyFsurdat(unittest.TestCase):
         return longxy, latixy, cols, rows
 
 
+class TestModifyFsurdatCopyOnWrite(unittest.TestCase):
+    """Tests of restrict_to_index_box and write_output_in_place"""
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._fsurdat_in = os.path.join(self._tempdir, "fsurdat_in.nc")
+        rng = np.random.default_rng(0)
+        longxy, latixy = np.meshgrid(np.arange(0.5, 20), np.arange(-9.5, 10))
+        pct_natveg = rng.random((20, 20)) * 100
+        pct_natveg[0, 0] = np.nan
+        xr.Dataset(
+            data_vars={
+                "LONGXY": (["lsmlat", "lsmlon"], longxy),
+                "LATIXY": (["lsmlat", "lsmlon"], latixy),
+                "PCT_NATVEG": (["lsmlat", "lsmlon"], pct_natveg, {"units": "%"}),
+                "PCT_CROP": (["lsmlat", "lsmlon"], 100 - np.nan_to_num(pct_natveg)),
+                "SOIL_COLOR": (["lsmlat", "lsmlon"], rng.integers(1, 20, (20, 20))),
+                "PCT_NAT_PFT": (["natpft", "lsmlat", "lsmlon"], rng.random((3, 20, 20))),
+                "PCT_CFT": (["cft", "lsmlat", "lsmlon"], rng.random((2, 20, 20))),
+                "MONTHLY_LAI": (["time", "lsmpft", "lsmlat", "lsmlon"], rng.random((2, 5, 20, 20))),
+                "urbdens": (["numurbl"], np.arange(3)),
+            },
+            coords={"natpft": np.arange(3), "cft": np.arange(3, 5), "time": [1, 2]},
+            attrs={"history": "made for a test", "Conventions": "CF-1.0"},
+        ).to_netcdf(self._fsurdat_in, format="NETCDF3_64BIT")
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _modify(self, copy_on_write):
+        """Make the same edits, writing the whole file or just the index box"""
+        modify_fsurdat = ModifyFsurdat.init_from_file(
+            self._fsurdat_in,
+            lon_1=3,
+            lon_2=7,
+            lat_1=-2,
+            lat_2=4,
+            landmask_file=None,
+            lat_dimname=None,
+            lon_dimname=None,
+        )
+        if copy_on_write:
+            modify_fsurdat.restrict_to_index_box()
+        modify_fsurdat.set_dom_pft(dom_pft=3, lai=None, sai=None, hgt_top=None, hgt_bot=None)
+        modify_fsurdat.setvar_lev0("SOIL_COLOR", 15)
+        modify_fsurdat.setvar_lev2("MONTHLY_LAI", 2.5, lev1_dim=1, lev2_dim=0)
+        fsurdat_out = os.path.join(self._tempdir, f"fsurdat_out_{copy_on_write}.nc")
+        if copy_on_write:
+            modify_fsurdat.write_output_in_place(self._fsurdat_in, fsurdat_out)
+        else:
+            write_output(modify_fsurdat.file, self._fsurdat_in, fsurdat_out, "fsurdat")
+        return modify_fsurdat, fsurdat_out
+
+    def test_restrict_to_index_box(self):
+        """The index box should be the smallest one containing the rectangle"""
+        modify_fsurdat, _ = self._modify(copy_on_write=True)
+        self.assertEqual(modify_fsurdat.index_box, {"lsmlat": slice(8, 14), "lsmlon": slice(3, 7)})
+        self.assertEqual(
+            dict(modify_fsurdat.file["PCT_CFT"].sizes), {"cft": 2, "lsmlat": 6, "lsmlon": 4}
+        )
+        self.assertEqual(
+            modify_fsurdat.modified_vars,
+            {"PCT_CROP", "PCT_NATVEG", "PCT_CFT", "SOIL_COLOR", "MONTHLY_LAI"},
+        )
+
+    def test_write_output_in_place_matches_write_output(self):
+        """Copy-on-write output should have the same data as rewriting the whole file"""
+        _, fsurdat_full = self._modify(copy_on_write=False)
+        _, fsurdat_in_place = self._modify(copy_on_write=True)
+        with xr.open_dataset(fsurdat_full) as f_full, xr.open_dataset(fsurdat_in_place) as f_cow:
+            xr.testing.assert_equal(f_full, f_cow)
+            self.assertEqual(f_cow.attrs["title"], "Modified fsurdat file")
+            self.assertNotIn("history", f_cow.attrs)
+            self.assertEqual(f_cow["PCT_NATVEG"].attrs["units"], "%")
+            self.assertTrue(np.isnan(f_cow["PCT_NATVEG"].values[0, 0]))
+            self.assertEqual(f_cow["SOIL_COLOR"].values[10, 5], 15)
+        with xr.open_dataset(self._fsurdat_in) as f_in:
+            self.assertNotEqual(f_in["SOIL_COLOR"].values[10, 5], 15)
+
+    def test_write_output_in_place_dtype_change_fails(self):
+        """A variable promoted to a wider dtype can't be written into the copy of fsurdat_in"""
+        modify_fsurdat = ModifyFsurdat.init_from_file(
+            self._fsurdat_in, 3, 7, -2, 4, None, None, None
+        )
+        modify_fsurdat.restrict_to_index_box()
+        modify_fsurdat.setvar_lev0("SOIL_COLOR", 15.5)
+        fsurdat_out = os.path.join(self._tempdir, "fsurdat_out.nc")
+        with self.assertRaisesRegex(SystemExit, r"SOIL_COLOR changed from int\d+ to float64"):
+            modify_fsurdat.write_output_in_place(self._fsurdat_in, fsurdat_out)
+        self.assertFalse(os.path.exists(fsurdat_out))
+
+    def test_evenly_split_cropland_copy_on_write_fails(self):
+        """evenly_split_cropland changes every gridcell, so can't be written in place"""
+        modify_fsurdat = ModifyFsurdat.init_from_file(
+            self._fsurdat_in, 3, 7, -2, 4, None, None, None
+        )
+        modify_fsurdat.restrict_to_index_box()
+        with self.assertRaisesRegex(SystemExit, "evenly_split_cropland"):
+            modify_fsurdat.evenly_split_cropland()
+
+
 if __name__ == "__main__":
     unit_testing.setup_for_tests()
     unittest.main()
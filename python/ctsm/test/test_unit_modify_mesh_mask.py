@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""Unit tests for modify_mesh_mask
+"""
+
+import os
+import unittest
+import tempfile
+import shutil
+
+import numpy as np
+import xarray as xr
+
+from ctsm import unit_testing
+from ctsm.modify_input_files.modify_mesh_mask import ModifyMeshMask
+
+# Allow test names that pylint doesn't like; otherwise hard to make them
+# readable
+# pylint: disable=invalid-name
+
+
+class TestModifyMeshMask(unittest.TestCase):
+    """Tests of ModifyMeshMask.set_mesh_mask"""
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._landmask_file = os.path.join(self._tempdir, "landmask.nc")
+        lat = np.array([-10.0, 0.0, 10.0])
+        lon = np.array([100.0, 110.0, 120.0, 130.0])
+        self.lon2d, self.lat2d = np.meshgrid(lon, lat)
+        self.landmask = np.array([[1, 0, 0, 1], [1, 1, 0, 0], [0, 0, 0, 1]], dtype=float)
+        self.mod_lnd_props = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=float)
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _make_modify_mesh_mask(self):
+        xr.Dataset(
+            {
+                "LATIXY": (("lsmlat", "lsmlon"), self.lat2d),
+                "LONGXY": (("lsmlat", "lsmlon"), self.lon2d),
+                "landmask": (("lsmlat", "lsmlon"), self.landmask),
+                "mod_lnd_props": (("lsmlat", "lsmlon"), self.mod_lnd_props),
+            }
+        ).to_netcdf(self._landmask_file)
+        mesh = xr.Dataset(
+            {
+                "centerCoords": (
+                    ("elementCount", "coordDim"),
+                    np.stack([self.lon2d.ravel(), self.lat2d.ravel()], axis=1),
+                ),
+                "elementMask": ("elementCount", np.ones(self.lat2d.size)),
+            }
+        )
+        return ModifyMeshMask(mesh, self._landmask_file, "lsmlat", "lsmlon", "LATIXY", "LONGXY")
+
+    def test_set_mesh_mask(self):
+        """The mesh mask should be the flattened ocean mask"""
+        modify_mesh_mask = self._make_modify_mesh_mask()
+        modify_mesh_mask.set_mesh_mask("elementMask")
+        np.testing.assert_array_equal(
+            modify_mesh_mask.file["elementMask"], [0, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 0]
+        )
+
+    def test_set_mesh_mask_bad_landmask(self):
+        """A landmask that isn't 0 or 1 should fail, listing the offending cells"""
+        self.landmask[1, 2] = 0.5
+        self.landmask[2, 0] = 2
+        modify_mesh_mask = self._make_modify_mesh_mask()
+        with self.assertRaisesRegex(
+            AssertionError, r"landmask not 0 or 1 at 2 cell\(s\), starting at .* \(1, 2\) \(2, 0\)"
+        ):
+            modify_mesh_mask.set_mesh_mask("elementMask")
+
+    def test_set_mesh_mask_mod_lnd_props_not_land(self):
+        """mod_lnd_props should only be 1 where landmask is 1"""
+        self.mod_lnd_props[0, 1] = 1
+        modify_mesh_mask = self._make_modify_mesh_mask()
+        with self.assertRaisesRegex(AssertionError, r"landmask = 0 at 1 cell\(s\).* \(0, 1\)"):
+            modify_mesh_mask.set_mesh_mask("elementMask")
+
+    def test_set_mesh_mask_coords_differ(self):
+        """The landmask file and mesh should have the same coordinates"""
+        modify_mesh_mask = self._make_modify_mesh_mask()
+        modify_mesh_mask.file["centerCoords"][5, 1] += 0.1
+        with self.assertRaisesRegex(AssertionError, r"Must be equal: latvar .* \(1, 1\)"):
+            modify_mesh_mask.set_mesh_mask("elementMask")
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for netcdf_output
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+
+import netCDF4
+import numpy as np
+import xarray as xr
+
+from ctsm import unit_testing
+from ctsm.netcdf_output import (
+    NetcdfOutputOptions,
+    add_netcdf_output_args,
+    netcdf_output_options_from_args,
+    write_netcdf,
+)
+
+# Allow test names that pylint doesn't like; otherwise hard to make them
+# readable
+# pylint: disable=invalid-name
+
+
+def make_dataset():
+    """
+    Small surface-dataset-like Dataset
+    """
+    lons, lats = np.meshgrid(np.arange(0.5, 8.0), np.arange(0.5, 6.0))
+    return xr.Dataset(
+        {
+            "LONGXY": (("lsmlat", "lsmlon"), lons),
+            "LATIXY": (("lsmlat", "lsmlon"), lats),
+            "PCT_NATVEG": (("lsmlat", "lsmlon"), np.full(lons.shape, 50.0)),
+            "PCT_NAT_PFT": (("natpft", "lsmlat", "lsmlon"), np.full((3,) + lons.shape, 1 / 3)),
+            "mxsoil_color": ((), 20),
+        },
+        coords={"natpft": np.arange(3.0)},
+    )
+
+
+class TestNetcdfOutput(unittest.TestCase):
+    """Tests of netcdf_output"""
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._file = os.path.join(self._tempdir, "out.nc")
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def test_default_format_unchanged(self):
+        """With no options, the tool's default format is written without compression"""
+        write_netcdf(make_dataset(), self._file, default_format="NETCDF3_CLASSIC")
+        with netCDF4.Dataset(self._file) as nc_file:
+            self.assertEqual(nc_file.data_model, "NETCDF3_CLASSIC")
+
+    def test_compression_and_chunks(self):
+        """Compression and chunking switch a netCDF-3 default to NETCDF4_CLASSIC"""
+        options = NetcdfOutputOptions(compression_level=4, chunks={"lsmlat": 2, "lsmlon": 100})
+        ds = make_dataset()
+        write_netcdf(ds, self._file, options)
+        with netCDF4.Dataset(self._file) as nc_file:
+            self.assertEqual(nc_file.data_model, "NETCDF4_CLASSIC")
+            var = nc_file["PCT_NAT_PFT"]
+            self.assertEqual(var.filters()["zlib"], True)
+            self.assertEqual(var.filters()["complevel"], 4)
+            self.assertEqual(var.chunking(), [3, 2, 8])
+        with xr.open_dataset(self._file) as ds_out:
+            xr.testing.assert_identical(ds_out, ds)
+
+    def test_float32(self):
+        """float32 downcasts data variables but not LONGXY, LATIXY, or coordinates"""
+        write_netcdf(make_dataset(), self._file, NetcdfOutputOptions(float32=True))
+        with netCDF4.Dataset(self._file) as nc_file:
+            self.assertEqual(nc_file["PCT_NATVEG"].dtype, np.float32)
+            self.assertEqual(nc_file["PCT_NAT_PFT"].dtype, np.float32)
+            self.assertEqual(nc_file["LONGXY"].dtype, np.float64)
+            self.assertEqual(nc_file["LATIXY"].dtype, np.float64)
+            self.assertEqual(nc_file["natpft"].dtype, np.float64)
+
+    def test_tool_encoding_takes_precedence(self):
+        """Encoding given by the tool overrides that from the options"""
+        write_netcdf(
+            make_dataset(),
+            self._file,
+            NetcdfOutputOptions(float32=True),
+            encoding={"PCT_NATVEG": {"dtype": "float64"}},
+        )
+        with netCDF4.Dataset(self._file) as nc_file:
+            self.assertEqual(nc_file["PCT_NATVEG"].dtype, np.float64)
+            self.assertEqual(nc_file["PCT_NAT_PFT"].dtype, np.float32)
+
+    def test_netcdf3_compression_aborts(self):
+        """Asking for compression with a netCDF-3 format should abort"""
+        with self.assertRaisesRegex(SystemExit, "compression and chunking need format"):
+            NetcdfOutputOptions(nc_format="NETCDF3_64BIT", compression="zlib")
+
+    def test_options_from_args(self):
+        """Command-line options should be parsed into NetcdfOutputOptions"""
+        parser = argparse.ArgumentParser()
+        add_netcdf_output_args(parser)
+        options = netcdf_output_options_from_args(
+            parser.parse_args(["--nc-chunk", "lsmlat=100", "--nc-chunk", "lsmlon=50"])
+        )
+        self.assertEqual(options.chunks, {"lsmlat": 100, "lsmlon": 50})
+        self.assertEqual(options.get_format("NETCDF3_64BIT"), "NETCDF4_CLASSIC")
+        self.assertTrue(netcdf_output_options_from_args(parser.parse_args([])).is_default())
+        with self.assertRaisesRegex(SystemExit, "DIM=SIZE"):
+            netcdf_output_options_from_args(parser.parse_args(["--nc-chunk", "lsmlat"]))
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""Unit tests for patch_grid_index
+"""
+
+import unittest
+
+import numpy as np
+import xarray as xr
+
+from ctsm import unit_testing
+from ctsm.crop_calendars.patch_grid_index import PatchGridIndex, get_patch_grid_index
+
+# Allow names that pylint doesn't like, because otherwise I find it hard
+# to make readable unit test names
+# pylint: disable=invalid-name
+
+
+def make_ds():
+    """
+    Make a Dataset with 3 patches on a 2x3 grid
+    """
+    return xr.Dataset(
+        {
+            "patches1d_ixy": ("patch", np.array([1, 3, 3])),
+            "patches1d_jxy": ("patch", np.array([2, 1, 1])),
+            "patches1d_lon": ("patch", np.array([0.0, 20.0, 20.0])),
+            "patches1d_lat": ("patch", np.array([5.0, -5.0, -5.0])),
+            "patches1d_itype_veg": ("patch", np.array([17, 17, 19])),
+        },
+        coords={"lat": [-5.0, 5.0], "lon": [0.0, 10.0, 20.0], "ivt": [17, 19]},
+    )
+
+
+class TestPatchGridIndex(unittest.TestCase):
+    """Tests of PatchGridIndex"""
+
+    def test_grid(self):
+        """Gridding should keep leading axes and put each patch at its ivt, lat, and lon"""
+        grid_index = PatchGridIndex.from_dataset(make_ds())
+        values = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+        gridded = grid_index.grid(values)
+        self.assertEqual(gridded.shape, (2, 2, 2, 3))
+        self.assertEqual(gridded[0, 0, 1, 0], 1.0)
+        self.assertEqual(gridded[1, 0, 0, 2], 5.0)
+        self.assertEqual(gridded[1, 1, 0, 2], 6.0)
+        self.assertEqual(np.sum(~np.isnan(gridded)), values.size)
+
+    def test_grid_without_ivt(self):
+        """Gridding without ivt should give (..., lat, lon) with the given fill value"""
+        grid_index = PatchGridIndex.from_dataset(make_ds())
+        gridded = grid_index.grid(np.array([1, 2, 2]), fill_value=-1, include_ivt=False)
+        np.testing.assert_array_equal(gridded, [[-1, -1, 2], [1, -1, -1]])
+
+    def test_ungrid_roundtrip(self):
+        """Ungridding a gridded array should give back the original values"""
+        grid_index = PatchGridIndex.from_dataset(make_ds())
+        values = np.arange(12.0).reshape(4, 3)
+        gridded = grid_index.grid(values)
+        np.testing.assert_array_equal(grid_index.ungrid(gridded, include_ivt=True), values)
+        np.testing.assert_array_equal(
+            grid_index.ungrid(gridded, include_ivt=True, patches=[2]), values[:, [2]]
+        )
+
+    def test_from_lonlat(self):
+        """Building from lon/lat values should match building from ixy/jxy"""
+        this_ds = make_ds()
+        grid_index = PatchGridIndex.from_lonlat(
+            this_ds.patches1d_lon, this_ds.patches1d_lat, this_ds.lon, this_ds.lat
+        )
+        np.testing.assert_array_equal(grid_index.lon_index, [0, 2, 2])
+        np.testing.assert_array_equal(grid_index.lat_index, [1, 0, 0])
+
+    def test_from_lonlat_missing(self):
+        """Building from lon/lat values not on the grid should error"""
+        with self.assertRaisesRegex(RuntimeError, "lon value"):
+            PatchGridIndex.from_lonlat([5.0], [5.0], [0.0, 10.0], [5.0])
+
+    def test_cached_per_dataset(self):
+        """The index should be built once per Dataset object"""
+        this_ds = make_ds()
+        grid_index = get_patch_grid_index(this_ds)
+        self.assertIs(get_patch_grid_index(this_ds), grid_index)
+        subset_ds = this_ds.isel(patch=[0])
+        self.assertEqual(get_patch_grid_index(subset_ds).n_patch, 1)
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
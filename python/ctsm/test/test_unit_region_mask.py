@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for region_mask
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ctsm import unit_testing
+from ctsm.modify_input_files import region_mask
+
+# Allow test names that pylint doesn't like; otherwise hard to make them
+# readable
+# pylint: disable=invalid-name
+
+
+def make_grid(lon1d, lat1d):
+    """
+    Make 2-d (lat, lon) LONGXY and LATIXY arrays from 1-d ones
+    """
+    longxy, latixy = np.meshgrid(lon1d, lat1d)
+    return longxy, latixy
+
+
+def square(lon_1, lon_2, lat_1, lat_2):
+    """
+    Closed ring around a lon/lat box, as in GeoJSON
+    """
+    return [[lon_1, lat_1], [lon_2, lat_1], [lon_2, lat_2], [lon_1, lat_2], [lon_1, lat_1]]
+
+
+class TestRasterizePolygons(unittest.TestCase):
+    """Tests of rasterize_polygons"""
+
+    def test_rasterize_box_matches_bounds(self):
+        """A box polygon should select the gridcells whose centers are inside it"""
+        longxy, latixy = make_grid(np.arange(0.5, 360, 1.0), np.arange(-89.5, 90, 1.0))
+        polygon = [np.array(square(10, 20, -5, 5), dtype=float)]
+        mask = region_mask.rasterize_polygons([polygon], longxy, latixy)
+        expected = (longxy > 10) & (longxy < 20) & (latixy > -5) & (latixy < 5)
+        np.testing.assert_array_equal(mask, expected)
+
+    def test_rasterize_triangle(self):
+        """Gridcells on either side of a sloping edge should be classified correctly"""
+        longxy, latixy = make_grid(np.arange(0.5, 10, 1.0), np.arange(0.5, 10, 1.0))
+        polygon = [np.array([[0, 0], [10, 0], [0, 10]], dtype=float)]
+        mask = region_mask.rasterize_polygons([polygon], longxy, latixy)
+        np.testing.assert_array_equal(mask, longxy + latixy < 10)
+
+    def test_rasterize_hole(self):
+        """Gridcells inside a hole should not be selected"""
+        longxy, latixy = make_grid(np.arange(0.5, 10, 1.0), np.arange(0.5, 10, 1.0))
+        polygon = [
+            np.array(ring, dtype=float) for ring in (square(0, 10, 0, 10), square(3, 7, 3, 7))
+        ]
+        mask = region_mask.rasterize_polygons([polygon], longxy, latixy)
+        hole = (longxy > 3) & (longxy < 7) & (latixy > 3) & (latixy < 7)
+        np.testing.assert_array_equal(mask, ~hole)
+
+    def test_rasterize_lon_conventions(self):
+        """Polygons in -180 to 180 should select the same gridcells on a 0-360 grid"""
+        longxy, latixy = make_grid(np.arange(0.5, 360, 1.0), np.arange(-9.5, 10, 1.0))
+        polygon = [np.array(square(-5, 5, -3, 3), dtype=float)]
+        mask = region_mask.rasterize_polygons([polygon], longxy, latixy)
+        expected = ((longxy < 5) | (longxy > 355)) & (np.abs(latixy) < 3)
+        np.testing.assert_array_equal(mask, expected)
+        mask_180 = region_mask.rasterize_polygons([polygon], longxy - 180, latixy)
+        np.testing.assert_array_equal(mask_180, (np.abs(longxy - 180) < 5) & (np.abs(latixy) < 3))
+
+    def test_rasterize_lon_beyond_360(self):
+        """Polygons with longitudes past 360 should select the same gridcells as wrapped ones"""
+        longxy, latixy = make_grid(np.arange(-179.5, 180, 1.0), np.arange(-9.5, 10, 1.0))
+        expected = region_mask.rasterize_polygons(
+            [[np.array(square(-5, 5, -3, 3), dtype=float)]], longxy, latixy
+        )
+        for lon_1, lon_2 in [(355, 365), (715, 725), (-365, -355)]:
+            polygon = [np.array(square(lon_1, lon_2, -3, 3), dtype=float)]
+            mask = region_mask.rasterize_polygons([polygon], longxy, latixy)
+            np.testing.assert_array_equal(mask, expected)
+
+
+class TestGetRegionMask(unittest.TestCase):
+    """Tests of reading regions from files and caching the masks"""
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def test_get_region_mask_geojson(self):
+        """All the (multi)polygons in a GeoJSON file should be selected, and the mask cached"""
+        region_file = os.path.join(self._tempdir, "regions.geojson")
+        with open(region_file, "w", encoding="utf-8") as geojson:
+            json.dump(
+                {
+                    "type": "FeatureCollection",
+                    "features": [
+                        {
+                            "type": "Feature",
+                            "properties": {},
+                            "geometry": {"type": "Polygon", "coordinates": [square(1, 3, 1, 3)]},
+                        },
+                        {
+                            "type": "Feature",
+                            "properties": {},
+                            "geometry": {
+                                "type": "MultiPolygon",
+                                "coordinates": [[square(6, 8, 6, 8)], [square(6, 8, 1, 2)]],
+                            },
+                        },
+                    ],
+                },
+                geojson,
+            )
+        longxy, latixy = make_grid(np.arange(0.5, 10, 1.0), np.arange(0.5, 10, 1.0))
+        mask = region_mask.get_region_mask(region_file, longxy, latixy)
+        expected = np.zeros(longxy.shape, dtype=bool)
+        expected[1:3, 1:3] = True
+        expected[6:8, 6:8] = True
+        expected[1, 6:8] = True
+        np.testing.assert_array_equal(mask, expected)
+
+        # Changing the returned mask shouldn't change the cached one
+        mask[:] = False
+        np.testing.assert_array_equal(
+            region_mask.get_region_mask(region_file, longxy.copy(), latixy.copy()), expected
+        )
+
+    def test_get_region_mask_cache_bounded(self):
+        """Masks for a list of files should be combined, and the cache should not grow unbounded"""
+        region_files = []
+        for i in range(region_mask.REGION_MASK_CACHE_SIZE + 2):
+            region_file = os.path.join(self._tempdir, f"region{i}.geojson")
+            with open(region_file, "w", encoding="utf-8") as geojson:
+                json.dump({"type": "Polygon", "coordinates": [square(i, i + 1, 0, 1)]}, geojson)
+            region_files.append(region_file)
+        longxy, latixy = make_grid(np.arange(0.5, 20, 1.0), np.arange(0.5, 2, 1.0))
+        mask = region_mask.get_region_mask(region_files, longxy, latixy)
+        expected = np.zeros(longxy.shape, dtype=bool)
+        expected[0, : len(region_files)] = True
+        np.testing.assert_array_equal(mask, expected)
+        self.assertLessEqual(
+            len(region_mask._REGION_MASK_CACHE),  # pylint: disable=protected-access
+            region_mask.REGION_MASK_CACHE_SIZE,
+        )
+
+    def test_read_polygons_bad_extension(self):
+        """Should abort for files that aren't GeoJSON or shapefiles"""
+        region_file = os.path.join(self._tempdir, "regions.txt")
+        with open(region_file, "w", encoding="utf-8") as txt:
+            txt.write("")
+        with self.assertRaisesRegex(SystemExit, "must be GeoJSON"):
+            region_mask.read_polygons(region_file)
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
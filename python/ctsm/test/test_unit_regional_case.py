@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Unit tests for RegionalCase
+
+You can run this by:
+    python -m unittest test_unit_regional_case.py
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+import numpy as np
+import xarray as xr
+
+# -- add python/ctsm  to path (needed if we want to run the test stand-alone)
+_CTSM_PYTHON = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, os.pardir)
+sys.path.insert(1, _CTSM_PYTHON)
+
+# pylint: disable=wrong-import-position
+from ctsm import unit_testing
+from ctsm.site_and_regional.regional_case import RegionalCase
+
+# pylint: disable=invalid-name
+
+
+class TestRegionalCaseMesh(unittest.TestCase):
+    """
+    Tests of RegionalCase mesh subsetting
+    """
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+
+        # 4x3 nodes at lon 0-3, lat 0-2, making 3x2 quad elements. Element 0 is a triangle, padded
+        # with a fill value.
+        lons, lats = np.meshgrid(np.arange(4.0), np.arange(3.0))
+        node_ids = np.arange(12).reshape(3, 4) + 1
+        elem_conn = np.stack(
+            [
+                node_ids[:-1, :-1].ravel(),
+                node_ids[:-1, 1:].ravel(),
+                node_ids[1:, 1:].ravel(),
+                node_ids[1:, :-1].ravel(),
+            ],
+            axis=1,
+        )
+        num_elem_conn = np.full(6, 4)
+        num_elem_conn[0] = 3
+        elem_conn[0, 3] = -1
+        self._mesh_in = os.path.join(self._tempdir, "mesh_in.nc")
+        xr.Dataset(
+            {
+                "nodeCoords": (
+                    ("nodeCount", "coordDim"),
+                    np.stack([lons.ravel(), lats.ravel()], 1),
+                ),
+                "elementConn": (("elementCount", "maxNodePElement"), elem_conn),
+                "numElementConn": ("elementCount", num_elem_conn),
+                "centerCoords": (("elementCount", "coordDim"), np.zeros((6, 2))),
+            }
+        ).to_netcdf(self._mesh_in)
+
+        # Region containing the nodes at lon 1-3 and lat 0-1
+        self._regional_case = RegionalCase(
+            lat1=-0.5,
+            lat2=1.5,
+            lon1=0.5,
+            lon2=3.5,
+            reg_name=None,
+            create_domain=False,
+            create_surfdata=False,
+            create_landuse=False,
+            create_datm=False,
+            create_user_mods=False,
+            create_mesh=True,
+            out_dir=self._tempdir,
+            overwrite=False,
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def test_subset_mesh_at_reg(self):
+        """
+        Test that subset_mesh_at_reg keeps nodes inside the region and elements all of whose nodes
+        are inside the region, and renumbers the kept nodes
+        """
+        _, subset_element, subset_node, node_renumber = self._regional_case.subset_mesh_at_reg(
+            self._mesh_in
+        )
+        np.testing.assert_array_equal(subset_element, [1, 2])
+        np.testing.assert_array_equal(subset_node, [1, 2, 3, 5, 6, 7])
+        np.testing.assert_array_equal(
+            node_renumber, [-9999, 1, 2, 3, -9999, 4, 5, 6, -9999, -9999, -9999, -9999]
+        )
+
+    def test_remap_elem_conn(self):
+        """
+        Test that remap_elem_conn renumbers nodes but leaves fill values unchanged
+        """
+        node_renumber = np.array([-9999, 1, 2, 3])
+        elem_conn = np.array([[2, 3, 4, -1], [4, 3, 2, np.nan]])
+        result = RegionalCase.remap_elem_conn(elem_conn, node_renumber)
+        np.testing.assert_array_equal(result, [[1, 2, 3, -1], [3, 2, 1, np.nan]])
+
+    def test_write_mesh(self):
+        """
+        Test that write_mesh writes the subset mesh with renumbered connectivity
+        """
+        mesh_out = os.path.join(self._tempdir, "mesh_out.nc")
+        (
+            node_coords,
+            subset_element,
+            subset_node,
+            node_renumber,
+        ) = self._regional_case.subset_mesh_at_reg(self._mesh_in)
+        with xr.open_dataset(self._mesh_in) as f_in:
+            RegionalCase.write_mesh(
+                f_in, node_coords, subset_element, subset_node, node_renumber, mesh_out
+            )
+        with xr.open_dataset(mesh_out) as f_out:
+            np.testing.assert_array_equal(f_out["elementConn"], [[1, 2, 5, 4], [2, 3, 6, 5]])
+            self.assertEqual(f_out.sizes["nodeCount"], 6)
+
+
+class TestRegionalCaseLanduse(unittest.TestCase):
+    """
+    Tests of RegionalCase landuse subsetting
+    """
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        n_time = 7
+        lons, lats = np.meshgrid(np.arange(0.5, 10.0), np.arange(0.5, 5.0))
+        pct_nat_pft = np.random.default_rng(0).random((n_time, 2, 5, 10))
+        pct_nat_pft[1, 0, 0, 0] = np.nan
+        self._file = "landuse.timeseries_10x10_hist_1850_c200101.nc"
+        xr.Dataset(
+            {
+                "LONGXY": (("lsmlat", "lsmlon"), lons),
+                "LATIXY": (("lsmlat", "lsmlon"), lats),
+                "PCT_NAT_PFT": (("time", "natpft", "lsmlat", "lsmlon"), pct_nat_pft),
+                "YEAR": ("time", np.arange(1850, 1850 + n_time)),
+            }
+        ).to_netcdf(os.path.join(self._tempdir, self._file), unlimited_dims=["time"])
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _create_landuse(self, out_dir, time_chunk):
+        os.makedirs(out_dir)
+        regional_case = RegionalCase(
+            lat1=1.0,
+            lat2=4.0,
+            lon1=2.0,
+            lon2=6.0,
+            reg_name="test",
+            create_domain=False,
+            create_surfdata=False,
+            create_landuse=True,
+            create_datm=False,
+            create_user_mods=False,
+            create_mesh=False,
+            out_dir=out_dir,
+            overwrite=False,
+        )
+        regional_case.create_landuse_at_reg(self._tempdir, self._file, None, time_chunk=time_chunk)
+        (fluse_out,) = os.listdir(out_dir)
+        f_out = xr.open_dataset(os.path.join(out_dir, fluse_out), decode_cf=False).load()
+        del f_out.attrs["Created_on"]
+        return f_out
+
+    def test_create_landuse_at_reg_time_chunk(self):
+        """
+        Test that writing the landuse file a few years at a time gives the same file
+        """
+        f_out = self._create_landuse(os.path.join(self._tempdir, "all"), None)
+        f_out_chunked = self._create_landuse(os.path.join(self._tempdir, "chunked"), 3)
+        self.assertEqual(dict(f_out.sizes), {"lsmlat": 3, "lsmlon": 4, "time": 7, "natpft": 2})
+        xr.testing.assert_identical(f_out, f_out_chunked)
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
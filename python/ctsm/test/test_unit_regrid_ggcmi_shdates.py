@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+"""Unit tests for regrid_ggcmi_shdates
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import xarray as xr
+
+from ctsm import unit_testing
+from ctsm.crop_calendars.regrid_ggcmi_shdates import (
+    REGRID_ENGINE_ATTR,
+    NearestNeighborRegridder,
+    is_up_to_date,
+    regrid_ggcmi_shdates,
+)
+
+# Allow test names that pylint doesn't like; otherwise hard to make them
+# readable
+# pylint: disable=invalid-name
+
+
+def great_circle_nearest(lon, lat, lons, lats):
+    """
+    Index of the point in (lons, lats) nearest to (lon, lat), by brute force
+    """
+    lon, lat, lons, lats = [np.deg2rad(x) for x in (lon, lat, lons, lats)]
+    cos_angle = np.sin(lat) * np.sin(lats) + np.cos(lat) * np.cos(lats) * np.cos(lons - lon)
+    return np.argmax(cos_angle)
+
+
+class TestNearestNeighborRegridder(unittest.TestCase):
+    """Tests of NearestNeighborRegridder"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Irregular spacing, so that no two source gridcells are equally near any point
+        self._src_lon = np.sort(rng.uniform(-180, 180, 36))
+        self._src_lat = np.sort(rng.uniform(-90, 90, 18))[::-1]
+        self._values = rng.random((len(self._src_lat), len(self._src_lon)))
+        self._values[rng.random(self._values.shape) < 0.5] = np.nan
+        self._dst_lon = np.arange(3.0, 360, 17.0)
+        self._dst_lat = np.arange(-87.0, 90, 13.0)
+
+    def test_regrid_matches_brute_force(self):
+        """Each destination gridcell should get its nearest source value, missing ones filled"""
+        regridder = NearestNeighborRegridder(
+            self._src_lon, self._src_lat, self._dst_lon, self._dst_lat
+        )
+        result = regridder.regrid(self._values)
+
+        src_lons, src_lats = [x.ravel() for x in np.meshgrid(self._src_lon, self._src_lat)]
+        values = self._values.ravel()
+        is_valid = ~np.isnan(values)
+        expected = np.empty((len(self._dst_lat), len(self._dst_lon)))
+        for j, lat in enumerate(self._dst_lat):
+            for i, lon in enumerate(self._dst_lon):
+                nearest = great_circle_nearest(lon, lat, src_lons, src_lats)
+                if not is_valid[nearest]:
+                    nearest_valid = great_circle_nearest(
+                        src_lons[nearest], src_lats[nearest], src_lons[is_valid], src_lats[is_valid]
+                    )
+                    nearest = np.nonzero(is_valid)[0][nearest_valid]
+                expected[j, i] = values[nearest]
+        np.testing.assert_array_equal(result, expected)
+
+    def test_regrid_all_missing(self):
+        """A variable with no valid values should regrid to all missing"""
+        regridder = NearestNeighborRegridder(
+            self._src_lon, self._src_lat, self._dst_lon, self._dst_lat
+        )
+        result = regridder.regrid(np.full(self._values.shape, np.nan))
+        self.assertTrue(np.all(np.isnan(result)))
+
+    def test_regrid_ties_go_to_first(self):
+        """Destination gridcells halfway between source gridcells should get the first one's value"""
+        src_lon = np.array([0.0, 2.0, 4.0])
+        src_lat = np.array([1.0, -1.0])
+        values = np.arange(6.0).reshape((2, 3))
+        regridder = NearestNeighborRegridder(
+            src_lon, src_lat, np.array([1.0, 3.0]), np.array([0.0])
+        )
+        np.testing.assert_array_equal(regridder.regrid(values), [[0.0, 1.0]])
+
+
+class TestRegridGgcmiShdatesNative(unittest.TestCase):
+    """Tests of regrid_ggcmi_shdates with the native engine"""
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._input_dir = os.path.join(self._tempdir, "in")
+        self._output_dir = os.path.join(self._tempdir, "out")
+        os.makedirs(self._input_dir)
+
+        lon = np.arange(-179.75, 180, 0.5)
+        lat = np.arange(89.75, -90, -0.5)
+        planting_day = np.full((len(lat), len(lon)), 120, dtype=np.float32)
+        planting_day[lat < 0, :] = 300
+        attrs = {"units": "day of year"}
+        encoding = {"dtype": "float32", "_FillValue": 1e20}
+        for crop in ["mai_rf", "swh_rf"]:
+            xr.Dataset(
+                {
+                    "planting_day": (("lat", "lon"), planting_day, attrs),
+                    "maturity_day": (("lat", "lon"), planting_day + 100, attrs),
+                },
+                coords={"lat": lat, "lon": lon},
+            ).to_netcdf(
+                os.path.join(self._input_dir, f"{crop}_ggcmi_crop_calendar.nc4"),
+                encoding={"planting_day": encoding, "maturity_day": encoding},
+            )
+
+        # Destination grid with 2-d LONGXY and LATIXY, like a surface dataset
+        longxy, latixy = np.meshgrid(np.arange(280.0, 300, 5.0), np.arange(-10.0, 11, 5.0))
+        self._template_file = os.path.join(self._tempdir, "template.nc")
+        xr.Dataset(
+            {
+                "LONGXY": (
+                    ("lsmlat", "lsmlon"),
+                    longxy,
+                    {"long_name": "longitude", "units": "degrees east"},
+                ),
+                "LATIXY": (
+                    ("lsmlat", "lsmlon"),
+                    latixy,
+                    {"long_name": "latitude", "units": "degrees north"},
+                ),
+            }
+        ).to_netcdf(self._template_file)
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _regrid(self, **kwargs):
+        regrid_ggcmi_shdates(
+            "test",
+            self._template_file,
+            self._input_dir,
+            self._output_dir,
+            ".nc4",
+            "swh_rf",
+            engine="native",
+            **kwargs,
+        )
+        return os.path.join(self._output_dir, "swh_rf_ggcmi_crop_calendar_nninterp-test.nc4")
+
+    def test_regrid_ggcmi_shdates_native(self):
+        """Only the requested crops should be regridded, with latitude descending"""
+        file_out = self._regrid()
+        self.assertEqual(os.listdir(self._output_dir), [os.path.basename(file_out)])
+        with xr.open_dataset(file_out) as ds_out:
+            np.testing.assert_array_equal(ds_out["lat"], [10, 5, 0, -5, -10])
+            np.testing.assert_array_equal(ds_out["lon"], [280, 285, 290, 295])
+            np.testing.assert_array_equal(
+                ds_out["planting_day"].values[:, 0], [120, 120, 120, 300, 300]
+            )
+            self.assertEqual(ds_out["maturity_day"].attrs["units"], "day of year")
+            self.assertEqual(ds_out["maturity_day"].encoding["dtype"], np.float32)
+            self.assertEqual(ds_out.attrs[REGRID_ENGINE_ATTR], "native")
+
+    def test_regrid_ggcmi_shdates_skips_up_to_date(self):
+        """Files whose output is newer than their inputs should be skipped unless overwrite"""
+        file_out = self._regrid()
+        os.utime(file_out, (0, os.path.getmtime(self._template_file) + 10))
+        mtime = os.path.getmtime(file_out)
+        self._regrid()
+        self.assertEqual(os.path.getmtime(file_out), mtime)
+        self._regrid(overwrite=True)
+        self.assertNotEqual(os.path.getmtime(file_out), mtime)
+
+    def test_is_up_to_date_checks_engine(self):
+        """Output made by a different engine, or by an unknown one, shouldn't be up to date"""
+        file_out = self._regrid()
+        files_in = [os.path.join(self._input_dir, "swh_rf_ggcmi_crop_calendar.nc4")]
+        template_mtime = os.path.getmtime(self._template_file)
+        self.assertTrue(is_up_to_date(file_out, files_in, template_mtime, "native"))
+        self.assertFalse(is_up_to_date(file_out, files_in, template_mtime, "cdo"))
+        with xr.open_dataset(file_out) as ds_out:
+            ds_out = ds_out.load()
+        del ds_out.attrs[REGRID_ENGINE_ATTR]
+        ds_out.to_netcdf(file_out)
+        self.assertFalse(is_up_to_date(file_out, files_in, template_mtime, "native"))
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
@@ -17,6 +17,7 @@ sys.path.insert(1, _CTSM_PYTHON)
 
 # pylint: disable=wrong-import-position
 from ctsm import unit_testing
+from ctsm.site_and_regional.base_case import DatmFiles
 from ctsm.site_and_regional.single_point_case import SinglePointCase
 
 # pylint: disable=invalid-name
@@ -360,6 +361,61 @@ class TestSinglePointCase(unittest.TestCase):
         single_point.check_pct_pft()
         self.assertEqual(single_point.pct_pft, [50, 40, 10])
 
+    def test_get_datm_files_streams(self):
+        """
+        Test that get_datm_files gives the stream of each input file, matching the stream
+        file lists
+        """
+        single_point = SinglePointCase(
+            plat=self.plat,
+            plon=self.plon,
+            site_name=self.site_name,
+            create_domain=self.create_domain,
+            create_surfdata=self.create_surfdata,
+            create_landuse=self.create_landuse,
+            create_datm=self.create_datm,
+            create_user_mods=self.create_user_mods,
+            dom_pft=self.dom_pft,
+            evenly_split_cropland=self.evenly_split_cropland,
+            pct_pft=self.pct_pft,
+            num_pft=self.num_pft,
+            cth=self.cth,
+            cbh=self.cbh,
+            include_nonveg=self.include_nonveg,
+            uni_snow=self.uni_snow,
+            cap_saturation=self.cap_saturation,
+            out_dir=self.out_dir,
+            overwrite=self.overwrite,
+        )
+        single_point.create_tag()
+        datm_tuple = DatmFiles(
+            "indir",
+            "outdir",
+            "domain.nc",
+            "Solar",
+            "Precip",
+            "TPHWL",
+            "solar.",
+            "prec.",
+            "tpqw.",
+            "CLMGSWP3v1.Solar",
+            "CLMGSWP3v1.Precip",
+            "CLMGSWP3v1.TPQW",
+        )
+        infile, outfile, stream_files, file_streams = single_point.get_datm_files(
+            datm_tuple, 2000, 2001
+        )
+        self.assertEqual(len(infile), 2 * 12 * 3)
+        self.assertEqual(len(outfile), len(infile))
+        for stream, stream_dir in enumerate(["Solar", "Precip", "TPHWL"]):
+            stream_infiles = [f for f, s in zip(infile, file_streams) if s == stream]
+            stream_outfiles = [f for f, s in zip(outfile, file_streams) if s == stream]
+            self.assertTrue(all(os.sep + stream_dir + os.sep in f for f in stream_infiles))
+            self.assertEqual(
+                [os.path.basename(f) for f in stream_outfiles],
+                [os.path.basename(f) for f in stream_files[stream]],
+            )
+
 
 if __name__ == "__main__":
     unit_testing.setup_for_tests()
@@ -204,6 +204,42 @@ class TestSinglePointCaseSurfaceNoCrop(unittest.TestCase):
         # self.assertEqual(ds_out['PCT_NAT_PFT'].data[:,:,5], 100)
         np.testing.assert_array_equal(ds_out["PCT_NAT_PFT"].data, expected_out)
 
+    def test_modify_surfdata_atpoint_in_place(self):
+        """
+        Test modify_surfdata_atpoint with in_place
+        Checks that the input Dataset is modified and returned, and that the default is a copy
+        """
+        single_point = SinglePointCase(
+            plat=self.plat,
+            plon=self.plon,
+            site_name=self.site_name,
+            create_domain=self.create_domain,
+            create_surfdata=self.create_surfdata,
+            create_landuse=self.create_landuse,
+            create_datm=self.create_datm,
+            create_user_mods=self.create_user_mods,
+            dom_pft=self.dom_pft,
+            evenly_split_cropland=self.evenly_split_cropland,
+            pct_pft=self.pct_pft,
+            num_pft=self.num_pft,
+            cth=self.cth,
+            cbh=self.cbh,
+            include_nonveg=self.include_nonveg,
+            uni_snow=self.uni_snow,
+            cap_saturation=self.cap_saturation,
+            out_dir=self.out_dir,
+            overwrite=self.overwrite,
+        )
+        single_point.dom_pft = [5]
+        ds_in = self.ds_test.copy(deep=True)
+        ds_copy = single_point.modify_surfdata_atpoint(ds_in)
+        self.assertIsNot(ds_copy, ds_in)
+        xr.testing.assert_identical(ds_in, self.ds_test)
+
+        ds_out = single_point.modify_surfdata_atpoint(ds_in, in_place=True)
+        self.assertIs(ds_out, ds_in)
+        xr.testing.assert_identical(ds_out, ds_copy)
+
     def test_modify_surfdata_atpoint_nocrop_1pft_pctnatveg(self):
         """
         Test modify_surfdata_atpoint
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Unit tests for spatial_index
+
+You can run this by:
+    python -m unittest test_unit_spatial_index.py
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+import numpy as np
+import xarray as xr
+
+# -- add python/ctsm  to path (needed if we want to run the test stand-alone)
+_CTSM_PYTHON = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, os.pardir)
+sys.path.insert(1, _CTSM_PYTHON)
+
+# pylint: disable=wrong-import-position
+from ctsm import unit_testing
+from ctsm.site_and_regional import spatial_index
+from ctsm.site_and_regional.single_point_case import (
+    SinglePointCase,
+    extract_points,
+    SURF_COORDS,
+)
+
+# pylint: disable=invalid-name
+
+
+def make_lonlat(lon1d, lat1d):
+    """
+    Make 2-d (lat, lon) longitude and latitude arrays from 1-d ones
+    """
+    lon2d, lat2d = np.meshgrid(lon1d, lat1d)
+    return lon2d, lat2d
+
+
+class TestGridcellIndex(unittest.TestCase):
+    """
+    Tests of GridcellIndex
+    """
+
+    def test_query_rectilinear(self):
+        """Should find the nearest gridcell on a rectilinear grid"""
+        lon, lat = make_lonlat(np.arange(0.5, 360, 1.0), np.arange(-89.5, 90, 1.0))
+        gridcell_index = spatial_index.GridcellIndex(lon, lat)
+        self.assertEqual(gridcell_index.query(287.8, 42.5), (132, 287))
+
+    def test_query_wraparound(self):
+        """Should find the nearest gridcell across the 0/360 (or -180/180) boundary"""
+        lon, lat = make_lonlat(np.arange(-179.5, 180, 1.0), np.arange(-89.5, 90, 1.0))
+        gridcell_index = spatial_index.GridcellIndex(lon, lat)
+        self.assertEqual(gridcell_index.query(287.8, 42.5), (132, 107))
+        self.assertEqual(gridcell_index.query(180.3, 0.2), (90, 0))
+
+    def test_query_unstructured(self):
+        """Should find the nearest gridcell on an unstructured (1 x ncol) grid"""
+        lon = np.array([[10.0, 200.0, 100.0, 350.0]])
+        lat = np.array([[0.0, 45.0, -30.0, 89.0]])
+        gridcell_index = spatial_index.GridcellIndex(lon, lat)
+        self.assertEqual(gridcell_index.query(150.0, 88.0), (0, 3))
+        self.assertEqual(gridcell_index.query(-160.0, 40.0), (0, 1))
+
+    def test_query_many(self):
+        """Batch lookups should give the same results as one at a time, plus distances"""
+        lon, lat = make_lonlat(np.arange(0.5, 360, 1.0), np.arange(-89.5, 90, 1.0))
+        gridcell_index = spatial_index.GridcellIndex(lon, lat)
+        plons = np.array([287.8, 10.0, 180.5])
+        plats = np.array([42.5, -60.2, 0.5])
+        y_index, x_index, distance = gridcell_index.query_many(plons, plats)
+        for i, (plon, plat) in enumerate(zip(plons, plats)):
+            self.assertEqual(gridcell_index.query(plon, plat), (y_index[i], x_index[i]))
+        self.assertAlmostEqual(distance[2], 0.0)
+        self.assertLess(distance[0], 100.0)
+
+    def test_get_gridcell_index_cached(self):
+        """The index should be built once per grid"""
+        lon, lat = make_lonlat(np.arange(0.5, 10, 1.0), np.arange(0.5, 5, 1.0))
+        gridcell_index = spatial_index.get_gridcell_index(lon, lat)
+        self.assertIs(spatial_index.get_gridcell_index(lon.copy(), lat.copy()), gridcell_index)
+        self.assertIsNot(spatial_index.get_gridcell_index(lon + 1, lat), gridcell_index)
+
+    def test_get_gridcell_index_cache_bounded(self):
+        """Only the most recently used indices should be kept"""
+        lon, lat = make_lonlat(np.arange(0.5, 10, 1.0), np.arange(0.5, 5, 1.0))
+        gridcell_index = spatial_index.get_gridcell_index(lon, lat)
+        for i in range(spatial_index.GRIDCELL_INDEX_CACHE_SIZE):
+            spatial_index.get_gridcell_index(lon + i + 1, lat)
+        self.assertLessEqual(
+            len(spatial_index._GRIDCELL_INDEX_CACHE),  # pylint: disable=protected-access
+            spatial_index.GRIDCELL_INDEX_CACHE_SIZE,
+        )
+        self.assertIsNot(spatial_index.get_gridcell_index(lon, lat), gridcell_index)
+
+
+class TestSelectNearestGridcell(unittest.TestCase):
+    """
+    Tests of SinglePointCase.select_nearest_gridcell
+    """
+
+    def _make_case(self, plon, plat):
+        return SinglePointCase(
+            plat=plat,
+            plon=plon,
+            site_name=None,
+            create_domain=True,
+            create_surfdata=True,
+            create_landuse=True,
+            create_datm=True,
+            create_user_mods=True,
+            dom_pft=[8],
+            evenly_split_cropland=False,
+            pct_pft=None,
+            num_pft=16,
+            cth=0.9,
+            cbh=0.1,
+            include_nonveg=False,
+            uni_snow=True,
+            cap_saturation=True,
+            out_dir=os.getcwd(),
+            overwrite=False,
+        )
+
+    def test_select_nearest_gridcell_matches_sel(self):
+        """On a rectilinear grid, should match sel(method="nearest") away from cell edges"""
+        lon1d = np.arange(0.5, 360, 1.0)
+        lat1d = np.arange(-89.5, 90, 1.0)
+        lon, lat = make_lonlat(lon1d, lat1d)
+        f_in = xr.Dataset(
+            {
+                "LONGXY": (("lsmlat", "lsmlon"), lon),
+                "LATIXY": (("lsmlat", "lsmlon"), lat),
+                "VAR": (("lsmlat", "lsmlon"), np.arange(lon.size).reshape(lon.shape)),
+            },
+            coords={"lsmlon": lon1d, "lsmlat": lat1d},
+        )
+        single_point = self._make_case(287.8, 42.6)
+        result = single_point.select_nearest_gridcell(f_in, "LONGXY", "LATIXY", "lsmlon", "lsmlat")
+        expected = f_in.sel(lsmlon=287.8, lsmlat=42.6, method="nearest")
+        xr.testing.assert_identical(result, expected)
+
+    def test_extract_points_matches_select_nearest_gridcell(self):
+        """Extracting many points at once should give the same results as one at a time"""
+        tempdir = tempfile.mkdtemp()
+        try:
+            lon, lat = make_lonlat(np.arange(5.0, 360, 10.0), np.arange(-85.0, 90, 10.0))
+            filename = os.path.join(tempdir, "surf.nc")
+            xr.Dataset(
+                {
+                    "LONGXY": (("lsmlat", "lsmlon"), lon),
+                    "LATIXY": (("lsmlat", "lsmlon"), lat),
+                    "VAR": (("lsmlat", "lsmlon"), np.arange(lon.size).reshape(lon.shape)),
+                }
+            ).to_netcdf(filename)
+            plons = [287.8, 25.0, 359.0]
+            plats = [42.5, 66.0, -89.0]
+            f_points = extract_points(filename, SURF_COORDS, plons, plats)
+            for plon, plat, f_point in zip(plons, plats, f_points):
+                single_point = self._make_case(plon, plat)
+                f_in, f_out = single_point.open_at_point(filename, SURF_COORDS)
+                xr.testing.assert_identical(f_point, f_out.load())
+                f_in.close()
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+    def test_open_at_point_with_point_index(self):
+        """Reusing the nearest index from get_nearest_index should give the same gridcell"""
+        tempdir = tempfile.mkdtemp()
+        try:
+            lon, lat = make_lonlat(np.arange(5.0, 360, 10.0), np.arange(-85.0, 90, 10.0))
+            filename = os.path.join(tempdir, "surf.nc")
+            xr.Dataset(
+                {
+                    "LONGXY": (("lsmlat", "lsmlon"), lon),
+                    "LATIXY": (("lsmlat", "lsmlon"), lat),
+                    "VAR": (("lsmlat", "lsmlon"), np.arange(lon.size).reshape(lon.shape)),
+                }
+            ).to_netcdf(filename)
+            single_point = self._make_case(287.8, 42.5)
+            point_index = single_point.get_nearest_index(filename, SURF_COORDS)
+            self.assertEqual(point_index, (13, 28))
+            f_in, f_out = single_point.open_at_point(filename, SURF_COORDS)
+            f_in2, f_out2 = single_point.open_at_point(
+                filename, SURF_COORDS, point_index=point_index
+            )
+            xr.testing.assert_identical(f_out.load(), f_out2.load())
+            f_in.close()
+            f_in2.close()
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unit_testing.setup_for_tests()
+    unittest.main()
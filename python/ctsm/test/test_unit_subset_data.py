@@ -11,6 +11,8 @@ import configparser
 import argparse
 import os
 import sys
+import tempfile
+import shutil
 
 # -- add python/ctsm  to path (needed if we want to run the test stand-alone)
 _CTSM_PYTHON = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, os.pardir)
@@ -18,7 +20,7 @@ sys.path.insert(1, _CTSM_PYTHON)
 
 # pylint: disable=wrong-import-position
 from ctsm import unit_testing
-from ctsm.subset_data import get_parser, setup_files, check_args
+from ctsm.subset_data import get_parser, setup_files, check_args, read_sites_file
 from ctsm.path_utils import path_to_ctsm_root
 from ctsm.test.test_unit_utils import wrong_lon_type_error_regex
 
@@ -300,6 +302,70 @@ class TestSubsetData(unittest.TestCase):
             self.args = self.parser.parse_args()
 
 
+class TestSubsetDataSitesFile(unittest.TestCase):
+    """
+    Tests of subset_data's --sites-file option
+    """
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._sites_file = os.path.join(self._tempdir, "sites.csv")
+        with open(self._sites_file, "w") as sites_file:
+            sites_file.write("site,lat,lon,dompft,pctpft\n")
+            sites_file.write("AA,42.5,287.8,1 2,40 60\n")
+            sites_file.write("BB,-33.1,5.0,,\n")
+        self.parser = get_parser()
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def test_read_sites_file(self):
+        """
+        Test that read_sites_file reads each site, using command-line values for empty columns
+        """
+        args = self.parser.parse_args(
+            ["point", "--create-surface", "--sites-file", self._sites_file, "--dompft", "7"]
+        )
+        sites = read_sites_file(args.sites_file, args)
+        self.assertEqual([site["site_name"] for site in sites], ["AA", "BB"])
+        self.assertEqual(sites[0]["plon"], 287.8)
+        self.assertEqual(sites[0]["dom_pft"], [1, 2])
+        self.assertEqual(sites[0]["pct_pft"], [40.0, 60.0])
+        self.assertEqual(sites[1]["plat"], -33.1)
+        self.assertEqual(sites[1]["dom_pft"], [7])
+        self.assertIsNone(sites[1]["pct_pft"])
+        self.assertIsNone(sites[1]["cth"])
+
+    def test_read_sites_file_missing_column(self):
+        """
+        Test that read_sites_file errors if a required column is missing
+        """
+        with open(self._sites_file, "w") as sites_file:
+            sites_file.write("site,lat\nAA,42.5\n")
+        args = self.parser.parse_args(["point", "--create-surface"])
+        with self.assertRaisesRegex(SystemExit, "missing column.*lon"):
+            read_sites_file(self._sites_file, args)
+
+    def test_check_args_sites_file_with_out_surface(self):
+        """
+        Test that check args does not allow --out-surface with --sites-file
+        """
+        args = self.parser.parse_args(
+            [
+                "point",
+                "--create-surface",
+                "--sites-file",
+                self._sites_file,
+                "--out-surface",
+                "out.nc",
+            ]
+        )
+        with self.assertRaisesRegex(
+            argparse.ArgumentError, "out-surface option can not be used with --sites-file"
+        ):
+            check_args(args)
+
+
 if __name__ == "__main__":
     unit_testing.setup_for_tests()
     unittest.main()
@@ -172,7 +172,7 @@ def update_metadata(file, title, summary, contact, data_script, description):
             del file.attrs[attr]
 
 
-def write_output(file, file_in, file_out, file_type):
+def write_output(file, file_in, file_out, file_type, output_options=None):
     """
     Description
     -----------
@@ -186,7 +186,12 @@ def write_output(file, file_in, file_out, file_type):
         (str) User-defined entry of output file
     file_type:
         (str) examples: mesh, fsurdat
+    output_options:
+        (NetcdfOutputOptions) format, compression, etc. of the output file;
+        default NETCDF3_64BIT
     """
+    # Imported here because netcdf_output uses abort() from this module
+    from ctsm.netcdf_output import write_netcdf  # pylint: disable=import-outside-toplevel
 
     # update attributes
     title = "Modified " + file_type + " file"
@@ -204,7 +209,7 @@ def write_output(file, file_in, file_out, file_type):
     )
 
     # mode 'w' overwrites file if it exists
-    file.to_netcdf(path=file_out, mode="w", format="NETCDF3_64BIT")
+    write_netcdf(file, file_out, output_options, default_format="NETCDF3_64BIT", mode="w")
     logger.info("Successfully created: %s", file_out)
     file.close()
 